@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# NOTE: compare host or profile before and after a change:
+"""python bench_rootfs.py --json before.json
+python bench_rootfs.py --json after.json --compare before.json
+python bench_rootfs.py --target archive -s coreutils
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+
+import bin2lxc
+from bin2chroot import ChrootBuilder
+from bin2lxc import LxcBuilder
+from buildprof import Profiler
+from depindex import DEFAULT_INDEX
+from elfdeps import Resolver
+from fscopy import COPY_MODES
+
+TARGETS = ('lxc', 'chroot', 'archive')
+"""Values for --target: build of bin2lxc or bin2chroot,
+archive streams the bin2chroot layout into a tar file"""
+
+static_binaries = ('ldconfig', 'ldconfig.real', 'busybox', 'sln')
+
+coreutils = (
+    'cat', 'chmod', 'chown', 'cp', 'cut', 'date', 'dd', 'df', 'du',
+    'echo', 'env', 'false', 'head', 'id', 'ln', 'ls', 'mkdir', 'mv',
+    'rm', 'rmdir', 'sleep', 'sort', 'stat', 'tail', 'touch', 'tr',
+    'true', 'uname', 'uniq', 'wc',
+)
+
+large_trees = ('/usr/lib/firefox', '/usr/share/locale', '/usr/share/zoneinfo')
+
+
+def synthetic_tree(root, files=2000, dirs=50, size=64 * 1024, seed=0):
+    """create tree of random files for copy benchmarks."""
+    rnd = random.Random(seed)
+    block = os.urandom(size)
+    for i in range(files):
+        d = os.path.join(root, 'd%03d' % (i % dirs))
+        if not os.path.exists(d):
+            os.makedirs(d)
+        with open(os.path.join(d, 'f%05d' % i), 'wb') as f:
+            f.write(block[:rnd.randint(1, size)])
+    return root
+
+
+def scenarios(args, tmp):
+    """return dict of scenario: (binaries, configs)."""
+    resolver = Resolver()
+    static = [b for b in static_binaries if resolver.which(b)][:1]
+    tree = args.tree or next(
+        (t for t in large_trees if os.path.isdir(t)), None
+    )
+    result = {
+        'static': (static, []),
+        'coreutils': (list(coreutils), []),
+        'gui': (
+            [b for b in bin2lxc.gui_binaries.split(',') if b],
+            [c for c in bin2lxc.gui_configs.split(',') if c],
+        ),
+        'synthetic': ([], [synthetic_tree(
+            os.path.join(tmp, 'synthetic'), args.files
+        )]),
+    }
+    if tree:
+        result['tree'] = ([], [tree])
+    return result
+
+
+def build(binaries, configs, rootfs, args):
+    """build rootfs like args.target and return per phase results.
+
+    A new builder is used for every build, like one run of
+      bin2lxc or bin2chroot: plan() and apply() or write_archive()
+      go through resolving with the dependency index, manifest
+      hashing and batched copies under the builder's profiler.
+
+    """
+    uid, gid = os.getuid(), os.getgid()
+    profiler = Profiler()
+    profiler.start('setup')
+    options = {'binaries': ",".join(binaries), 'configs': ",".join(configs)}
+    if args.target == 'lxc':
+        builder = LxcBuilder(
+            jobs=args.jobs, mode=args.copy_mode, index=args.index
+        )
+    else:
+        builder = ChrootBuilder(
+            jobs=args.jobs, mode=args.copy_mode, index=args.index
+        )
+    builder.warn = lambda message: None
+    try:
+        if args.target == 'lxc':
+            # rootfs is the container directory
+            os.mkdir(rootfs)
+            plan = builder.plan(
+                os.path.basename(rootfs), rootfs + '/rootfs', rootfs,
+                uid=uid, gid=gid, profiler=profiler, **options
+            )
+            errors = builder.apply(plan, profiler=profiler)[0]
+        elif args.target == 'chroot':
+            plan = builder.plan(rootfs, profiler=profiler, **options)
+            errors = builder.apply(plan, profiler=profiler)[0]
+        else:
+            # rootfs is the archive file, nothing else is created on disk
+            plan = builder.plan(rootfs, profiler=profiler, **options)
+            with open(rootfs, 'wb') as out:
+                errors = builder.write_archive(
+                    plan, out, profiler=profiler
+                )[0]
+    finally:
+        builder.close()
+    phases = profiler.report()['phases']
+    return {
+        'phases': dict((p['name'], p) for p in phases),
+        'errors': len(errors),
+        'total': sum(p['wall'] for p in phases),
+    }
+
+
+def run(args):
+    tmp = tempfile.mkdtemp(prefix='bench_rootfs-', dir=args.tmpdir)
+    report = {
+        'host': {
+            'node': platform.node(),
+            'kernel': platform.release(),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'options': {
+            'jobs': args.jobs, 'copy_mode': args.copy_mode,
+            'repeat': args.repeat, 'target': args.target,
+            'index': bool(args.index),
+        },
+        'time': time.time(),
+        'scenarios': {},
+    }
+    try:
+        for name, (binaries, configs) in sorted(scenarios(args, tmp).items()):
+            if args.scenario and name not in args.scenario:
+                continue
+            runs = []
+            for i in range(args.repeat):
+                rootfs = os.path.join(tmp, 'rootfs-%s-%d' % (name, i))
+                runs.append(build(binaries, configs, rootfs, args))
+                if os.path.isdir(rootfs):
+                    shutil.rmtree(rootfs)
+                elif os.path.exists(rootfs):
+                    os.unlink(rootfs)
+            # best run is the least noisy one
+            report['scenarios'][name] = min(runs, key=lambda r: r['total'])
+    finally:
+        shutil.rmtree(tmp)
+    return report
+
+
+def show(report, old=None):
+    for name, result in sorted(report['scenarios'].items()):
+        line = "%-10s total %8.3fs" % (name, result['total'])
+        if old and name in old['scenarios']:
+            line += "  (%+.1f%%)" % (
+                100.0 * (result['total'] / old['scenarios'][name]['total'] - 1)
+            )
+        if result['errors']:
+            line += "  %d errors" % result['errors']
+        print(line)
+        for phase, p in result['phases'].items():
+            ops = " ".join(
+                "%s=%d" % (k, v) for k, v in sorted(p['ops'].items())
+            )
+            print("  %-9s %8.3fs %6d files %8.1f files/s %8.1f MB/s "
+                  "spawns=%d %s" % (
+                      phase, p['wall'], p['files'], p['files_per_s'],
+                      p['mb_per_s'], p['spawns'], ops
+                  ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark rootfs builds of bin2lxc and bin2chroot'
+    )
+    parser.add_argument(
+        '-s', '--scenario',
+        action='append', dest='scenario',
+        choices=('static', 'coreutils', 'gui', 'synthetic', 'tree'),
+        help='run only these scenarios'
+    )
+    parser.add_argument(
+        '-t', '--target',
+        action='store', dest='target',
+        choices=TARGETS, default='lxc',
+        help='what to build: rootfs of bin2lxc or bin2chroot, \
+        or bin2chroot --archive tar stream'
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        action='store', dest='jobs',
+        type=int, default=1,
+        help='number of parallel copies'
+    )
+    parser.add_argument(
+        '--copy-mode',
+        action='store', dest='copy_mode',
+        choices=COPY_MODES, default='copy',
+        help='how to copy files'
+    )
+    parser.add_argument(
+        '-r', '--repeat',
+        action='store', dest='repeat',
+        type=int, default=3,
+        help='runs per scenario, the best one is reported'
+    )
+    parser.add_argument(
+        '--files',
+        action='store', dest='files',
+        type=int, default=2000,
+        help='files in synthetic tree'
+    )
+    parser.add_argument(
+        '--tree',
+        action='store', dest='tree',
+        help='large tree to copy, e.g. /usr/lib/firefox'
+    )
+    parser.add_argument(
+        '--index',
+        action='store', dest='index',
+        default=DEFAULT_INDEX,
+        help='host dependency index database'
+    )
+    parser.add_argument(
+        '--no-index',
+        action='store_const', dest='index', const=None,
+        help='do not use host dependency index'
+    )
+    parser.add_argument(
+        '--tmpdir',
+        action='store', dest='tmpdir',
+        help='where to build, should be on the filesystem under test'
+    )
+    parser.add_argument(
+        '--json',
+        action='store', dest='json',
+        help='write results as json to file (- for stdout)'
+    )
+    parser.add_argument(
+        '--compare',
+        action='store', dest='compare',
+        help='json results of a previous run to compare with'
+    )
+    args = parser.parse_args()
+
+    old = None
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+    report = run(args)
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        print("")
+    else:
+        show(report, old)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=1, sort_keys=True)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# NOTE: compare launch backends of userns.launch():
+"""python bench_userns.py -n 200 -b clone3 -b pool
+python bench_userns.py -n 200 -p -m --json after.json --compare before.json
+python bench_userns.py -n 50 -b startup --budget 60
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+import userns
+from userns_pool import NamespacePool
+
+
+def launch_latency(launch, wait, ready, argv):
+    """seconds from the start of launch until the child has exec'ed.
+
+    The child inherits the write end of a close-on-exec pipe,
+      a successful exec closes it and we see end of file.
+
+    """
+    ready()
+    r, w = os.pipe()
+    os.set_inheritable(w, False)
+    start = time.perf_counter()
+    pid = launch(argv)
+    os.close(w)
+    os.read(r, 1)
+    latency = time.perf_counter() - start
+    os.close(r)
+    status = wait(pid)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise OSError("%s exited with status %s" % (argv[0], status))
+    return latency
+
+
+def startup_latency(argv):
+    """seconds from starting `python userns_child_exec.py ... echo`
+    until echo writes, i.e. interpreter start, imports, argument
+    parsing and the launch; argv are the namespace options."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'userns_child_exec.py')
+    r, w = os.pipe()
+    start = time.perf_counter()
+    p = subprocess.Popen(
+        [sys.executable, script] + argv + ['--', 'echo', 'x'], stdout=w
+    )
+    os.close(w)
+    os.read(r, 1)
+    latency = time.perf_counter() - start
+    with os.fdopen(r, 'rb') as f:
+        f.read()
+    if p.wait() != 0:
+        raise OSError("userns_child_exec.py exited with %d" % p.returncode)
+    return latency
+
+
+def launcher(backend, flags, uid_map, gid_map, pool_size):
+    """return (launch, wait, ready, close) functions of backend.
+
+    'pool' spawns from a NamespacePool, which is refilled
+      before every launch, so warm launches are measured.
+
+    """
+    if backend != 'pool':
+        def launch(argv):
+            return userns.launch(argv, flags, uid_map, gid_map, backend)
+        return (launch, lambda pid: os.waitpid(pid, 0)[1],
+                lambda: None, lambda: None)
+    pool = NamespacePool(pool_size, flags, uid_map, gid_map)
+    return pool.spawn, pool.wait, pool.fill, pool.close
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def run(args):
+    flags = userns.CLONE_NEWUSER
+    for enabled, flag in ((args.newpid, userns.CLONE_NEWPID),
+                          (args.newns, userns.CLONE_NEWNS),
+                          (args.newnet, userns.CLONE_NEWNET)):
+        if enabled:
+            flags |= flag
+    uid_map = "0 %d 1" % os.getuid()
+    gid_map = "0 %d 1" % os.getgid()
+    report = {
+        'host': {
+            'node': platform.node(),
+            'kernel': platform.release(),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'options': {'count': args.count, 'flags': flags, 'argv': args.argv},
+        'time': time.time(),
+        'backends': {},
+    }
+    for backend in args.backend or ('clone', 'fork', 'clone3', 'pool'):
+        if backend == 'startup':
+            options = ['-U', '-z']
+            for enabled, option in ((args.newpid, '-p'), (args.newns, '-m'),
+                                    (args.newnet, '-n')):
+                if enabled:
+                    options.append(option)
+            try:
+                runs = [startup_latency(options)
+                        for i in range(min(args.count, 10) + args.count)]
+            except OSError as e:
+                print("%s: %s" % (backend, e))
+                continue
+            runs = runs[min(args.count, 10):]
+            report['backends'][backend] = {
+                'min': min(runs),
+                'median': percentile(runs, 50),
+                'p95': percentile(runs, 95),
+                'max': max(runs),
+            }
+            continue
+        launch, wait, ready, close = launcher(
+            backend, flags, uid_map, gid_map, args.pool_size
+        )
+        try:
+            # warm up caches and the page tables of the parent
+            for i in range(min(args.count, 10)):
+                launch_latency(launch, wait, ready, args.argv)
+            runs = [
+                launch_latency(launch, wait, ready, args.argv)
+                for i in range(args.count)
+            ]
+        except OSError as e:
+            print("%s: %s" % (backend, e))
+            continue
+        finally:
+            close()
+        report['backends'][backend] = {
+            'min': min(runs),
+            'median': percentile(runs, 50),
+            'p95': percentile(runs, 95),
+            'max': max(runs),
+        }
+    return report
+
+
+def show(report, old=None):
+    for backend, r in sorted(report['backends'].items()):
+        line = "%-7s min %8.1fus median %8.1fus p95 %8.1fus max %8.1fus" % (
+            backend, r['min'] * 1e6, r['median'] * 1e6,
+            r['p95'] * 1e6, r['max'] * 1e6
+        )
+        if old and backend in old['backends']:
+            line += "  (%+.1f%%)" % (
+                100.0 * (r['median'] / old['backends'][backend]['median'] - 1)
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark clone to exec latency of \
+        userns.launch() backends'
+    )
+    parser.add_argument(
+        'argv',
+        nargs='*', default=['/bin/true'],
+        help='command executed by every child'
+    )
+    parser.add_argument(
+        '-b', '--backend',
+        action='append', dest='backend',
+        choices=userns.BACKENDS + ('pool', 'startup'),
+        help='run only these backends, startup runs \
+        userns_child_exec.py itself'
+    )
+    parser.add_argument(
+        '-n', '--count',
+        action='store', dest='count',
+        type=int, default=100,
+        help='launches per backend'
+    )
+    parser.add_argument(
+        '-N', '--pool-size',
+        action='store', dest='pool_size',
+        type=int, default=4,
+        help='warm namespace sets of the pool backend'
+    )
+    parser.add_argument(
+        '-p', '--pid',
+        action='store_true', dest='newpid',
+        help='new PID namespace too'
+    )
+    parser.add_argument(
+        '-m', '--mount',
+        action='store_true', dest='newns',
+        help='new mount namespace too'
+    )
+    parser.add_argument(
+        '--net',
+        action='store_true', dest='newnet',
+        help='new network namespace too'
+    )
+    parser.add_argument(
+        '--json',
+        action='store', dest='json',
+        help='save report to this file'
+    )
+    parser.add_argument(
+        '--compare',
+        action='store', dest='compare',
+        help='report saved by --json to compare with'
+    )
+    parser.add_argument(
+        '--budget',
+        action='store', dest='budget',
+        type=float,
+        help='fail if median of startup is over this many milliseconds'
+    )
+    args = parser.parse_args()
+
+    old = None
+    if args.compare:
+        if not os.path.exists(args.compare):
+            print("%s does not exists!" % args.compare)
+            sys.exit(1)
+        with open(args.compare) as f:
+            old = json.load(f)
+
+    report = run(args)
+    show(report, old)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    if args.budget is not None:
+        startup = report['backends'].get('startup')
+        if startup is None:
+            print("startup was not measured")
+            sys.exit(1)
+        if startup['median'] * 1e3 > args.budget:
+            print("startup median %.1fms is over budget of %.1fms" % (
+                startup['median'] * 1e3, args.budget
+            ))
+            sys.exit(1)
@@ -28,11 +28,16 @@ SOFTWARE.
 
 import os
 import sys
-import shutil
 import argparse
-from subprocess import Popen, PIPE
 
-ldd = Popen(['which', 'ldd'], stdout=PIPE, stderr=PIPE).communicate()[0].strip()
+from buildplan import archive
+from buildprof import Profiler
+from depindex import DEFAULT_INDEX
+from fscopy import COPY_MODES
+from manifest import manifest_path
+from rootfs_archive import COMPRESSORS, FORMATS, ArchiveWriter
+from rootfs_builder import RootfsBuilder
+from rootfs_verify import drifted, format_result
 
 if os.path.splitdrive(sys.executable)[0]:
     root = os.path.splitdrive(sys.executable)[0]
@@ -75,70 +80,154 @@ nodes = [
 ]
 
 
-def copy(src, dst):
-    if os.path.isfile(src):
-        if not os.path.exists(os.path.dirname(dst)):
-            os.makedirs(os.path.dirname(dst))
-        shutil.copy2(src, dst)
-    elif os.path.isdir(src):
-        if not os.path.exists(os.path.dirname(dst)):
-            os.makedirs(os.path.dirname(dst))
-        shutil.copytree(src, dst)
+dev_nodes = [(os.path.join('dev', n[0]),) + n[1:] for n in nodes]
+
+
+class ChrootBuilder(RootfsBuilder):
+    """build chroot trees, as directory or archive."""
+
+    structure = rootfs_structure
+    nodes = dev_nodes
+
+    def target(self, src):
+        return '/' + src[len(root):]
+
+    def plan(self, rootfs, binaries="", configs="", profiler=None):
+        """plan chroot, the target is not touched until apply."""
+        if profiler is not None:
+            profiler.start('resolve')
+        plan = self.new_plan(rootfs)
+        files, configs, exclude, redundant = self.resolve(binaries, configs)
+        plan.summary['redundant'] += redundant
+        self.add_copies(plan, files, configs, exclude)
+        return plan
+
+    def write_archive(self, plan, out, format='tar', compress='none', profiler=None):
+        """stream planned layout into archive without creating it on disk.
+
+        Stripped files and saved bytes go to plan.summary.
+        Return (errors, files, bytes).
+
+        """
+        if profiler is not None:
+            profiler.start('archive')
+        writer = ArchiveWriter(out, format, compress, strip=self.strip)
+        archive(plan, writer)
+        errors = plan.errors + writer.close()
+        plan.summary['stripped'] = writer.stripped
+        plan.summary['saved'] = writer.saved
+        if profiler is not None:
+            profiler.add(writer.files, writer.bytes)
+        return errors, writer.files, writer.bytes
+
+    def build(self, rootfs, profiler=None, **options):
+        """plan and apply chroot, return (plan, errors, stale, unchanged)."""
+        plan = self.plan(rootfs, profiler=profiler, **options)
+        return (plan,) + self.apply(plan, os.path.abspath(rootfs), profiler)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='This utility create chroot rootfs and сopy binaries with required libs to it')
-    parser.add_argument('rootfs', action='store', help='chroot rootfs')
+    parser.add_argument('rootfs', action='store', nargs='?', help='chroot rootfs')
     parser.add_argument('-b', '--binaries', action='store', dest='binaries', help='binaries for copying')
-    parser.add_argument('-c', '--configs', action='store', dest='configs', default="", help='binaries configs for copying')
+    parser.add_argument('-c', '--configs', action='store', dest='configs', default="", help='binaries configs for copying, glob and {a,b} patterns are expanded, !pattern excludes')
+    parser.add_argument('-j', '--jobs', action='store', dest='jobs', type=int, default=1, help='number of parallel copies')
+    parser.add_argument('--copy-mode', action='store', dest='copy_mode', choices=COPY_MODES, default='copy', help='how to copy files: auto tries reflink, copy_file_range and copy per filesystem')
+    parser.add_argument('--store', action='store', dest='store', help='keep files once in this store directory and hardlink (or reflink) them into rootfs')
+    parser.add_argument('--strip', action='store_true', dest='strip', help='copy ELF files without debug sections and symbol table, host files are not changed')
+    parser.add_argument('--index', action='store', dest='index', default=DEFAULT_INDEX, help='host dependency index database')
+    parser.add_argument('--no-index', action='store_const', dest='index', const=None, help='do not use host dependency index')
+    parser.add_argument('--profile', action='store_true', dest='profile', help='account time, files, bytes and operations per phase')
+    parser.add_argument('--profile-format', action='store', dest='profile_format', choices=('text', 'json'), default='text', help='--profile report as text block or json line')
+    parser.add_argument('--profile-log', action='store', dest='profile_log', help='append --profile report to this file instead of ROOTFS.profile')
+    parser.add_argument('--plan', action='store', dest='plan', help='save build plan to this file, see buildplan.py')
+    parser.add_argument('--plan-only', action='store_true', dest='plan_only', help='print planned operations and bytes, do not touch rootfs')
+    parser.add_argument('--archive', action='store', dest='archive', help='write rootfs to this archive (- for stdout) instead of directory')
+    parser.add_argument('--format', action='store', dest='format', choices=FORMATS, default='tar', help='archive format')
+    parser.add_argument('--compress', action='store', dest='compress', choices=COMPRESSORS, default='none', help='archive compression')
+    parser.add_argument('--verify', action='store_true', dest='verify', help='compare built rootfs with host files and list changed, missing and extra files')
     args = parser.parse_args()
 
     rootfs = args.rootfs
-    binaries = args.binaries
-    configs = args.configs
 
-    if os.getuid() != 0:
+    if not rootfs and not args.archive:
+        parser.error("rootfs or --archive is required")
+
+    if args.verify:
+        if not rootfs or not os.path.exists(rootfs):
+            print("%s does not exists!" % rootfs)
+            sys.exit(1)
+        builder = ChrootBuilder(jobs=args.jobs, index=None)
+        result = builder.verify(rootfs)
+        builder.close()
+        print(format_result(result))
+        sys.exit(1 if drifted(result) else 0)
+
+    if args.archive == '-':
+        # archive goes to stdout, messages to stderr
+        out = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+        sys.stdout = sys.stderr
+    elif args.archive:
+        out = open(args.archive, 'wb')
+    elif os.getuid() != 0 and not args.plan_only:
         print("you are not root")
         sys.exit(1)
 
-    if os.path.exists(rootfs):
+    profiler = Profiler() if args.profile else None
+    profile_log = args.profile_log or (
+        (rootfs or args.archive if args.archive != '-' else 'bin2chroot')
+        .rstrip('/') + '.profile'
+        )
+
+    builder = ChrootBuilder(jobs=args.jobs, mode=args.copy_mode, store=args.store, index=args.index, strip=args.strip)
+    plan = builder.plan(rootfs, args.binaries or "", args.configs, profiler=profiler)
+    if args.plan:
+        plan.save(args.plan)
+    if args.plan_only:
+        print("%s: %s" % (rootfs or args.archive, plan.format_totals()))
+        for src, dst, error in plan.errors:
+            print("can not copy %s to %s: %s" % (src, dst, error))
+        builder.close()
+        sys.exit(0)
+
+    if args.archive:
+        errors, files, size = builder.write_archive(plan, out, args.format, args.compress, profiler)
+        out.close()
+        builder.close()
+        for src, dst, error in errors:
+            print("can not archive %s: %s" % (src, error))
+        print("%d paths archived, %d files, %d bytes, %d redundant copies avoided" % (
+            plan.summary['paths'], files, size, plan.summary['redundant']
+            ))
+        if args.strip:
+            print("%d ELF files stripped, %d bytes saved" % (plan.summary['stripped'], plan.summary['saved']))
+        if profiler is not None:
+            profiler.write(profile_log, args.profile_format, archive=args.archive, errors=len(errors))
+        sys.exit(1 if errors else 0)
+
+    # rootfs with manifest was built by us and only gets refreshed
+    if os.path.exists(rootfs) and not os.path.exists(manifest_path(rootfs)):
         q = "Directory %s exist. Do you want to copy binaries into it? " % rootfs
         y = ("y", "Y", "yes", "Yes")
         try:
-            if not str(raw_input(q)) in y:
+            if not str(input(q)) in y:
                 sys.exit(1)
         except:
             sys.exit(1)
-    else:
-        os.mkdir(rootfs)
-
-    for d in rootfs_structure:
-        di = os.path.join(rootfs, d)
-        if not os.path.exists(di):
-            os.mkdir(di)
-
-    for node in nodes:
-        name = os.path.join(os.path.join(rootfs, 'dev'), node[0])
-        mode = node[1]
-        if not os.path.exists(name):
-            os.mknod(name, mode, dev)
-
-    if binaries:
-        for b in binaries.split(","):
-            b = Popen(['which', b], stdout=PIPE, stderr=PIPE).communicate()[0].strip()
-            bnew = os.path.join(rootfs, b[len(root):])
-            copy(b, bnew)
-            stdout = Popen([ldd, b], stdout=PIPE, stderr=PIPE).communicate()[0].strip()
-            for l in stdout.split('\n'):
-                if "=" in l and len(l.split()) > 3:
-                    b = l.split()[2]
-                elif "=" not in l:
-                    b = l.split()[0]
-                else:
-                    continue
-                bnew = os.path.join(rootfs, b[len(root):])
-                copy(b, bnew)
-
-    if configs:
-        for c in configs.split(','):
-            copy(c, os.path.join(rootfs, c[len(root):]))
+
+    errors, stale, unchanged = builder.apply(plan, os.path.abspath(rootfs), profiler)
+    builder.close()
+    for src, dst, error in errors:
+        print("can not copy %s to %s: %s" % (src, dst, error))
+    print("%d paths copied, %d redundant copies avoided" % (
+        plan.summary['paths'], plan.summary['redundant']
+        ))
+    print("%d files up to date, %d stale files removed" % (
+        unchanged, len(stale)
+        ))
+    if args.strip:
+        print("%d ELF files stripped, %d bytes saved" % (plan.summary['stripped'], plan.summary['saved']))
+    if profiler is not None:
+        profiler.write(profile_log, args.profile_format, rootfs=rootfs, errors=len(errors))
+    if errors:
+        sys.exit(1)
@@ -58,18 +58,24 @@ wget http://www.skype.com/go/getskype-linux-beta-dynamic -O - | tar -xj -C .loca
 """
 
 # NOTE: use strace and chroot to debug the problem
+# or let --trace record what the program really opens:
+"""lxc-create -t bin2lxc -n skype -- \
+-b /usr/bin/skype --trace "/usr/bin/skype" \
+--network --gui --dbus --exec "/usr/bin/skype"
+"""
 
 import os
 import sys
-import shutil
 import argparse
 import platform
-from subprocess import Popen, PIPE
+import shlex
 
-ldd = Popen(
-    ['which', 'ldd'],
-    stdout=PIPE, stderr=PIPE
-).communicate()[0].strip()
+from buildprof import Profiler
+from depindex import DEFAULT_INDEX
+from fscopy import COPY_MODES, covered
+from rootfs_builder import RootfsBuilder
+from rootfs_trace import minimal, trace as trace_command
+from rootfs_verify import drifted, format_result
 
 rootfs_structure = [
     '/bin',
@@ -149,6 +155,11 @@ links = [
     ('/etc/resolv.conf', '/run/resolvconf/resolv.conf'),
 ]
 
+skeleton_files = [
+    ('/etc/passwd', 'root:x:0:0:root:/root:/bin/sh', 0o644),
+    ('/etc/group', 'root:x:0:root', 0o644),
+]
+
 config = """
 
 # Distribution configuration
@@ -236,6 +247,13 @@ gui_configs = "/etc/ld.so.conf.d,\
 /usr/share/fonts/,\
 /usr/share/fontconfig,"
 
+# binaries and configs added by --dbus, --network and --gui
+profiles = {
+    'dbus': (dbus_binaries, dbus_configs),
+    'network': (network_binaries, network_configs),
+    'gui': (gui_binaries, gui_configs),
+}
+
 run_script = """#!/bin/sh
 CONTAINER={name}
 CMD_LINE="{execute}"
@@ -262,13 +280,33 @@ env XAUTHORITY=/root/.Xauthority DISPLAY=$DISPLAY \
 PULSE_SERVER=$PULSE_SOCKET USER=root HOME=/root $CMD_LINE
 
 if [ "$STARTED" = "true" ]; then
-    lxc-stop -n $CONTAINER -t 10
+{report}    lxc-stop -n $CONTAINER -t 10
 fi
 
 rm -f {rootfs}/root/.Xauthority
 
 """
 
+cgroup_entry = """lxc.cgroup2.{key} = {value}
+"""
+
+# usage of the container cgroup, printed before run script stops it
+cgroup_report = """    for f in cpu.stat memory.peak io.stat; do
+        echo "$f: $(lxc-cgroup -n $CONTAINER $f 2>/dev/null | tr '\\n' ' ')" >&2
+    done
+"""
+
+# host directories that may be shared with container read-only,
+# the rest of rootfs gets generated files and stays private
+shareable_dirs = ('/bin', '/lib', '/lib32', '/lib64', '/libx32', '/opt', '/usr')
+
+bind_entry = """lxc.mount.entry = {src} {dst} none ro,bind,create=dir 0 0
+"""
+
+overlay_entry = """lxc.mount.entry = overlay {dst} overlay \
+lowerdir={src},upperdir={upper},workdir={work},create=dir 0 0
+"""
+
 icon_path = "{home}/.local/share/applications/lxc-{name}.desktop"
 
 icon = """[Desktop Entry]
@@ -278,29 +316,189 @@ Type=Application
 """
 
 
-def copy(src, dst):
-    """copy file or directory.
+def split_shared(paths, mounted=()):
+    """split paths into host directories to mount and paths to copy.
 
-    Copy file or directory with metadata
-      and permission bits.
+    Files under shareable_dirs are shared through their directory,
+      config directories as they are; directories below another
+      shared or already mounted one are dropped.
+    Return (dirs, copied).
 
     """
-    if os.path.isfile(src):
-        if not os.path.exists(os.path.dirname(dst)):
-            os.makedirs(os.path.dirname(dst))
-        shutil.copy2(src, dst)
-    elif os.path.isdir(src):
-        if not os.path.exists(os.path.dirname(dst)):
-            os.makedirs(os.path.dirname(dst))
-        if not os.path.exists(dst):
-            os.makedirs(dst)
-        for item in os.listdir(src):
-            s = os.path.join(src, item)
-            d = os.path.join(dst, item)
-            if os.path.isdir(s):
-                copy(s, d)
+    dirs = set()
+    copied = []
+    for p in paths:
+        if not covered(p, shareable_dirs):
+            copied.append(p)
+        elif os.path.isdir(p):
+            dirs.add(p)
+        else:
+            dirs.add(os.path.dirname(p))
+    mounted = set(mounted)
+    dirs = [
+        d for d in sorted(dirs)
+        if d not in mounted and not covered(d, dirs | mounted)
+    ]
+    return dirs, copied
+
+
+class LxcBuilder(RootfsBuilder):
+    """build lxc containers: rootfs, container config and scripts."""
+
+    structure = rootfs_structure
+    nodes = nodes
+    links = links
+    files = skeleton_files
+
+    def plan(self, name, rootfs, path, binaries="", configs="",
+             uid=-1, gid=-1, network=False, gui=False, dbus=False,
+             lib=False, share='copy', execute="/bin/bash", trace=(),
+             cgroup=None, accounting=False, profiler=None):
+        """plan container, the target is not touched until apply.
+
+        cgroup is a dict of cgroup v2 limits like {'memory.max': '1G'},
+          accounting makes the run script of --gui print
+          cpu, memory and io usage when it stops the container.
+
+        """
+        if profiler is not None:
+            profiler.start('resolve')
+        plan = self.new_plan(rootfs, uid, gid)
+        profile_names = []
+
+        # basic container config
+        container_config = config.format(
+            arch=platform.processor(), rootfs=rootfs, name=name
+            )
+
+        if lib:
+            container_config += lib_config
+
+        if cgroup:
+            container_config += "\n"
+            for key, value in sorted(cgroup.items()):
+                container_config += cgroup_entry.format(key=key, value=value)
+
+        if dbus:
+            profile_names.append('dbus')
+            execute = "dbus-launch " + execute
+
+        init = ""
+        if network:
+            profile_names.append('network')
+            plan.entries += [
+                # dhcp
+                ('dir', '/var/lib/dhcp', 0o755),
+                ('file', '/etc/fstab', 0o644, ""),
+                ('file', '/etc/dhclient.conf', 0o644, dhconf),
+                # dns
+                ('file', '/run/resolvconf/resolv.conf', 0o644,
+                 'nameserver 8.8.8.8\nnameserver 8.8.4.4\n'),
+            ]
+            init = network_init
+
+        if gui:
+            profile_names.append('gui')
+            # modify container config
+            new_config = []
+            for l in container_config.splitlines():
+                if "lxc.id_map" not in l:
+                    new_config.append(l.rstrip())
+            new_config += gui_config.format(path=path).splitlines()
+            container_config = "\n".join(new_config)
+            # setup pulse audio
+            plan.add_host_file(
+                path + "/setup-pulse.sh",
+                gui_pulse_script.format(rootfs=rootfs), 0o755
+                )
+            plan.entries += [
+                ('dir', '/root/.pulse', 0o755),
+                ('file', '/root/.pulse/client.conf', 0o644, "disable-shm=yes"),
+            ]
+            # run script
+            plan.add_host_file(
+                path + '/start-' + name,
+                run_script.format(
+                    name=name, execute=execute, rootfs=rootfs,
+                    report=cgroup_report if accounting else ""
+                    ),
+                0o755
+                )
+            plan.add_host_file(
+                icon_path.format(home=os.path.expanduser("~"), name=name),
+                icon.format(name=name, path=path), 0o755
+                )
+
+        if execute:
+            # /sbin/init, after network setup if any
+            if not gui:
+                init += "exec " + execute
             else:
-                shutil.copy2(s, d)
+                init += "exec /bin/bash"
+        if init:
+            plan.entries.append(('file', '/sbin/init', 0o755, init))
+
+        for command in trace:
+            try:
+                accessed, executed, status = trace_command(shlex.split(command))
+            except OSError as e:
+                self.warn("can not trace %s: %s" % (command, e))
+                continue
+            traced_binaries, traced_configs = minimal(
+                accessed, executed, self.resolver
+                )
+            binaries = ",".join([binaries] + traced_binaries)
+            configs = ",".join([configs] + traced_configs)
+            self.warn("%s traced: %d binaries, %d configs, exit %s" % (
+                command, len(traced_binaries), len(traced_configs), status
+                ))
+
+        # profiles are resolved once per host and cached
+        files, config_paths, exclude, redundant = self.resolve(
+            binaries, configs,
+            [(p,) + profiles[p] for p in profile_names]
+            )
+        plan.summary['redundant'] += redundant
+
+        # share host directories instead of copying them
+        if share != 'copy':
+            mounts, copied = split_shared(
+                files + config_paths,
+                ['/lib', '/usr/lib'] if lib else []
+                )
+            plan.shared = [
+                p for p in files + config_paths if p not in copied
+                ]
+            plan.summary['mounts'] = len(mounts)
+            files = [p for p in files if p in copied]
+            config_paths = [p for p in config_paths if p in copied]
+            container_config += "\n"
+            for d in mounts:
+                if share == 'bind':
+                    container_config += bind_entry.format(
+                        src=d, dst=d.lstrip('/')
+                        )
+                    continue
+                upper = path + '/overlay/upper' + d
+                work = path + '/overlay/work' + d
+                plan.add_host_dir(upper)
+                plan.add_host_dir(work)
+                container_config += overlay_entry.format(
+                    src=d, dst=d.lstrip('/'), upper=upper, work=work
+                    )
+        plan.add_host_file(path + "/config", container_config, owned=False)
+
+        self.add_copies(plan, files, config_paths, exclude)
+        return plan
+
+    def build(self, name, rootfs, path, profiler=None, **options):
+        """plan and apply container, see plan() for options.
+
+        Return (plan, errors, stale, unchanged).
+
+        """
+        plan = self.plan(name, rootfs, path, profiler=profiler, **options)
+        return (plan,) + self.apply(plan, name, profiler)
 
 
 if __name__ == "__main__":
@@ -342,7 +540,8 @@ if __name__ == "__main__":
     parser.add_argument(
         '-c', '--configs',
         action='store', dest='configs',
-        default="", help='binaries configs for copying'
+        default="", help='binaries configs for copying, \
+        glob and {a,b} patterns are expanded, !pattern excludes'
     )
     parser.add_argument(
         '-l', '--lib',
@@ -367,6 +566,111 @@ if __name__ == "__main__":
         action='store_true', dest='gui',
         help='add access to video and audio'
     )
+    parser.add_argument(
+        '-j', '--jobs',
+        action='store', dest='jobs',
+        type=int, default=1,
+        help='number of parallel copies'
+    )
+    parser.add_argument(
+        '--copy-mode',
+        action='store', dest='copy_mode',
+        choices=COPY_MODES, default='copy',
+        help='how to copy files: auto tries reflink, \
+        copy_file_range and copy per filesystem'
+    )
+    parser.add_argument(
+        '--store',
+        action='store', dest='store',
+        help='keep files once in this store directory \
+        and hardlink (or reflink) them into rootfs'
+    )
+    parser.add_argument(
+        '--strip',
+        action='store_true', dest='strip',
+        help='copy ELF files without debug sections and symbol table, \
+        host files are not changed'
+    )
+    parser.add_argument(
+        '--share',
+        action='store', dest='share',
+        choices=('copy', 'bind', 'overlay'), default='copy',
+        help='mount library and config directories from host \
+        read-only (bind) or as overlayfs lower layers \
+        instead of copying them'
+    )
+    parser.add_argument(
+        '--index',
+        action='store', dest='index',
+        default=DEFAULT_INDEX,
+        help='host dependency index database'
+    )
+    parser.add_argument(
+        '--no-index',
+        action='store_const', dest='index', const=None,
+        help='do not use host dependency index'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true', dest='profile',
+        help='account time, files, bytes and operations per phase'
+    )
+    parser.add_argument(
+        '--profile-format',
+        action='store', dest='profile_format',
+        choices=('text', 'json'), default='text',
+        help='--profile report as text block or json line'
+    )
+    parser.add_argument(
+        '--profile-log',
+        action='store', dest='profile_log',
+        help='append --profile report to this file \
+        instead of PATH/build-profile.log'
+    )
+    parser.add_argument(
+        '--trace',
+        action='append', dest='trace',
+        help='run programm with args (as given string) once \
+        and copy only binaries and configs it used'
+    )
+    parser.add_argument(
+        '--plan',
+        action='store', dest='plan',
+        help='save build plan to this file, see buildplan.py'
+    )
+    parser.add_argument(
+        '--plan-only',
+        action='store_true', dest='plan_only',
+        help='print planned operations and bytes, \
+        do not touch rootfs and container'
+    )
+    parser.add_argument(
+        '--verify',
+        action='store_true', dest='verify',
+        help='compare built rootfs with host files \
+        and list changed, missing and extra files'
+    )
+    parser.add_argument(
+        '--cpu-max',
+        action='store', dest='cpu_max',
+        help='cgroup v2 cpu.max of container, like "50000 100000"'
+    )
+    parser.add_argument(
+        '--memory-max',
+        action='store', dest='memory_max',
+        help='cgroup v2 memory.max of container, like 512M'
+    )
+    parser.add_argument(
+        '--io-max',
+        action='store', dest='io_max',
+        help='cgroup v2 io.max of container, like "8:0 wbps=1048576"'
+    )
+    parser.add_argument(
+        '--accounting',
+        action='store_true', dest='accounting',
+        help='start script of --gui prints cpu, memory and io usage \
+        of container when it stops it'
+    )
     parser.add_argument(
         '--exec',
         action='store', dest='execute',
@@ -379,8 +683,16 @@ if __name__ == "__main__":
     rootfs = args.rootfs
     path = args.path
     name = args.name
-    binaries = args.binaries or ""
-    configs = args.configs or ""
+
+    if args.verify:
+        if not rootfs:
+            print("not enough arguments")
+            sys.exit(1)
+        builder = LxcBuilder(jobs=args.jobs, index=None)
+        result = builder.verify(rootfs)
+        builder.close()
+        print(format_result(result))
+        sys.exit(1 if drifted(result) else 0)
     uid = int(args.uid) or os.getuid()
     gid = int(args.gid) or os.getgid()
 
@@ -388,168 +700,56 @@ if __name__ == "__main__":
         print("not enough arguments")
         sys.exit(1)
 
-    # rootfs dir
-    if not os.path.exists(rootfs):
-        os.mkdir(rootfs)
-    os.chown(rootfs, uid, gid)
-
-    # structure dirs
-    for d in rootfs_structure:
-        di = rootfs + d
-        if not os.path.exists(di):
-            os.mkdir(di)
-        os.chown(di, uid, gid)
-
-    # files
-    for node in nodes:
-        pth = rootfs + node[0]
-        mode = node[1]
-        dev = os.makedev(node[2], node[3])
-        if not os.path.exists(pth):
-            os.mknod(pth, mode, dev)
-        os.chown(pth, uid, gid)
-    # /etc/passwd
-    with open(rootfs + '/etc/passwd', 'w') as f:
-         f.write('root:x:0:0:root:/root:/bin/sh')
-    os.chown(rootfs + '/etc/passwd', uid, gid)
-    # /etc/group
-    with open(rootfs + '/etc/group', 'w') as f:
-        f.write('root:x:0:root')
-    os.chown(rootfs + '/etc/group', uid, gid)
-
-    # links
-    for l in links:
-        pth = rootfs + l[0]
-        os.symlink(l[1], pth)
-
-
-    # basic container config
-    container_config_path = path + "/config"
-    with open(container_config_path, "w+") as f:
-        f.write(config.format(
-            arch=platform.processor(), rootfs=rootfs, name=name
+    cgroup = {}
+    for key, value in (('cpu.max', args.cpu_max),
+                       ('memory.max', args.memory_max),
+                       ('io.max', args.io_max)):
+        if value:
+            cgroup[key] = value
+
+    profiler = Profiler() if args.profile else None
+    builder = LxcBuilder(
+        jobs=args.jobs, mode=args.copy_mode, store=args.store,
+        index=args.index, strip=args.strip
+        )
+    plan = builder.plan(
+        name, rootfs, path, args.binaries or "", args.configs or "",
+        uid, gid, network=args.network, gui=args.gui, dbus=args.dbus,
+        lib=args.lib, share=args.share, execute=args.execute,
+        trace=args.trace or [], cgroup=cgroup,
+        accounting=args.accounting, profiler=profiler
+        )
+
+    if args.plan:
+        plan.save(args.plan)
+    if args.plan_only:
+        print("%s: %s" % (rootfs, plan.format_totals()))
+        for src, dst, error in plan.errors:
+            print("can not copy %s to %s: %s" % (src, dst, error))
+        builder.close()
+        sys.exit(0)
+
+    errors, stale, unchanged = builder.apply(plan, name, profiler)
+    builder.close()
+    for src, dst, error in errors:
+        print("can not copy %s to %s: %s" % (src, dst, error))
+    print("%d paths copied, %d redundant copies avoided" % (
+        plan.summary['paths'], plan.summary['redundant']
+        ))
+    print("%d files up to date, %d stale files removed" % (
+        unchanged, len(stale)
+        ))
+    if plan.shared:
+        print("%d host directories shared" % plan.summary['mounts'])
+    if args.strip:
+        print("%d ELF files stripped, %d bytes saved" % (
+            plan.summary['stripped'], plan.summary['saved']
             ))
-
-    if args.lib:
-        with open(container_config_path, "a") as f:
-            f.write(lib_config)
-
-    if args.dbus:
-        binaries = dbus_binaries + binaries
-        configs = dbus_configs + configs
-        args.execute = "dbus-launch " + args.execute
-
-    if args.network:
-        binaries = network_binaries + binaries
-        configs = network_configs + configs
-        # dhcp
-        if not os.path.exists(rootfs + "/var/lib/dhcp/"):
-            os.mkdir(rootfs + "/var/lib/dhcp/")
-        if not os.path.exists(rootfs + "/etc/fstab"):
-            with open(rootfs + "/etc/fstab", 'w') as f:
-                f.write("")
-        dhconf_path = rootfs + '/etc/dhclient.conf'
-        with open(dhconf_path, 'w') as f:
-            f.write(dhconf)
-        os.chown(dhconf_path, uid, gid)
-        # /sbin/init
-        init_path = rootfs + '/sbin/init'
-        with open(init_path, 'w+') as f:
-            f.write(network_init)
-        st = os.stat(init_path)
-        # +x=73
-        os.chmod(init_path, st.st_mode | 73)
-        os.chown(init_path, uid, gid)
-        # dns
-        resolfconf_path = rootfs + '/run/resolvconf/resolv.conf'
-        with open(resolfconf_path, 'w') as f:
-            f.write('nameserver 8.8.8.8\nnameserver 8.8.4.4\n')
-        os.chown(resolfconf_path, uid, gid)
-
-    if args.gui:
-        binaries = gui_binaries + binaries
-        configs = gui_configs + configs
-        # modify container config
-        with open(container_config_path, "r") as f:
-            old_config = f.readlines()
-            new_config = []
-            for l in old_config:
-                if "lxc.id_map" not in l:
-                    new_config.append(l.rstrip())
-            gui_config = gui_config.format(path=path)
-            new_config += gui_config.splitlines()
-        with open(container_config_path, "w") as f:
-            f.write("\n".join(new_config))
-        # setup pulse audio
-        pulse_script_path = path + "/setup-pulse.sh"
-        with open(pulse_script_path, "a") as f:
-            f.write(gui_pulse_script.format(rootfs=rootfs))
-        # +x=73
-        os.chmod(pulse_script_path, st.st_mode | 73)
-        os.chown(pulse_script_path, uid, gid)
-        pulse_dir_path = rootfs + '/root/.pulse'
-        if not os.path.exists(pulse_dir_path):
-            os.mkdir(pulse_dir_path)
-        os.chown(pulse_dir_path, uid, gid)
-        pulse_config_path = pulse_dir_path + '/client.conf'
-        with open(pulse_config_path, 'w') as f:
-            f.write("disable-shm=yes")
-        os.chown(pulse_config_path, uid, gid)
-        # run script
-        run_script_path = path + '/start-' + name
-        with open(run_script_path, 'w') as f:
-            f.write(run_script.format(
-                name=name, execute=args.execute,
-                rootfs=rootfs
-                ))
-        # +x
-        os.chmod(run_script_path, st.st_mode | 73)
-        os.chown(run_script_path, uid, gid)
-        icon_path = icon_path.format(home=os.path.expanduser("~"), name=name)
-        with open(icon_path, 'w') as f:
-            f.write(icon.format(name=name, path=path))
-        # +x=73
-        os.chmod(icon_path, st.st_mode | 73)
-        os.chown(icon_path, uid, gid)
-
-    if args.execute:
-        init_path = rootfs + '/sbin/init'
-        with open(init_path, 'a') as f:
-            if not args.gui:
-                f.write("exec " + args.execute)
-            else:
-                f.write("exec /bin/bash")
-
-    if binaries:
-        for binary in binaries.split(","):
-            p = Popen(['which', binary], stdout=PIPE, stderr=PIPE)
-            binary_path = p.communicate()[0].strip()
-            if not binary_path or not os.path.exists(binary_path):
-                print("%s does not exists!" % binary)
-                continue
-            new_binary_path = rootfs + binary_path
-            copy(binary_path, new_binary_path)
-            os.chown(new_binary_path, uid, gid)
-            # libs
-            p = Popen([ldd, binary_path], stdout=PIPE, stderr=PIPE)
-            stdout = p.communicate()[0].strip()
-            for l in stdout.split('\n'):
-                if 'lib' in l:
-                    if "=" in l and len(l.split()) > 3:
-                        library_path = l.split()[2]
-                    elif "=" not in l:
-                        library_path = l.split()[0]
-                    else:
-                        continue
-                    new_library_path = rootfs + library_path
-                    copy(library_path, new_library_path)
-                    os.chown(new_library_path, uid, gid)
-
-    if configs:
-        for config_path in configs.split(','):
-            if config_path and not os.path.exists(config_path):
-                print("%s does not exists!" % config_path)
-                continue
-            new_config_path = rootfs + config_path
-            copy(config_path, new_config_path)
-            os.chown(new_config_path, uid, gid)
+    if profiler is not None:
+        profiler.write(
+            args.profile_log or path + '/build-profile.log',
+            args.profile_format,
+            name=name, rootfs=rootfs, errors=len(errors)
+            )
+    if errors:
+        sys.exit(1)
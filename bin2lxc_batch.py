@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# NOTE: containers.json (or .toml, or .yaml with PyYAML installed):
+"""{
+ "defaults": {"network": true, "uid": 100000, "gid": 100000},
+ "containers": [
+  {"name": "web1", "binaries": ["nginx"], "configs": ["/etc/nginx"]},
+  {"name": "skype", "binaries": "skype", "gui": true, "dbus": true}
+ ]
+}
+python bin2lxc_batch.py -p 4 -j 8 --store /var/lib/lxc/.store containers.json"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from bin2lxc import LxcBuilder
+from depindex import DEFAULT_INDEX
+from fscopy import COPY_MODES
+from rootfs_verify import drifted
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+LXC_PATH = "/var/lib/lxc"
+
+# container keys and their defaults, see LxcBuilder.plan
+options = {
+    'binaries': "",
+    'configs': "",
+    'network': False,
+    'gui': False,
+    'dbus': False,
+    'lib': False,
+    'share': 'copy',
+    'execute': "/bin/bash",
+    'trace': [],
+    'cgroup': {},
+    'accounting': False,
+}
+
+
+def load(path):
+    """read container definitions from json, toml or yaml file."""
+    ext = os.path.splitext(path)[1]
+    if ext in ('.yaml', '.yml'):
+        if yaml is None:
+            raise ValueError("PyYAML is required for %s" % path)
+        with open(path) as f:
+            return yaml.safe_load(f)
+    if ext == '.toml':
+        if tomllib is None:
+            raise ValueError("tomli is required for %s" % path)
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+
+def definitions(data, lxcpath=LXC_PATH):
+    """normalize loaded data into list of container definitions.
+
+    data is a list of containers or a dict with 'containers'
+      and optional 'defaults' for all of them.
+    Lists of binaries and configs are joined like -b and -c.
+
+    """
+    defaults = {}
+    if isinstance(data, dict):
+        defaults = data.get('defaults', {})
+        data = data.get('containers', [])
+    result = []
+    names = set()
+    for item in data:
+        c = dict(options)
+        c.update(defaults)
+        c.update(item)
+        name = c.get('name')
+        if not name:
+            raise ValueError("container without name: %r" % (item,))
+        if name in names:
+            raise ValueError("container %s is defined twice" % name)
+        names.add(name)
+        unknown = set(c) - set(options) - set(
+            ['name', 'path', 'rootfs', 'uid', 'gid']
+        )
+        if unknown:
+            raise ValueError("%s: unknown keys %s" % (
+                name, ", ".join(sorted(unknown))
+            ))
+        for key in ('binaries', 'configs'):
+            if isinstance(c[key], (list, tuple)):
+                c[key] = ",".join(c[key])
+        if isinstance(c['trace'], str):
+            c['trace'] = [c['trace']]
+        c.setdefault('path', os.path.join(lxcpath, name))
+        c.setdefault('rootfs', os.path.join(c['path'], 'rootfs'))
+        c.setdefault('uid', os.getuid())
+        c.setdefault('gid', os.getgid())
+        result.append(c)
+    return result
+
+
+class BatchBuilder(LxcBuilder):
+    """LxcBuilder which tells what container a warning is about."""
+
+    current = None
+
+    def warn(self, message):
+        print("%s: %s" % (self.current, message))
+
+
+def verify(builder, definitions):
+    """verify rootfs of every container, return result dicts."""
+    results = []
+    for c in definitions:
+        start = time.monotonic()
+        r = {'name': c['name'], 'rootfs': c['rootfs']}
+        if not os.path.isdir(c['rootfs']):
+            r.update({'ok': False, 'error': "%s does not exists!" % c['rootfs']})
+        else:
+            r.update(builder.verify(c['rootfs']))
+            r['ok'] = not drifted(r)
+        r['verify'] = time.monotonic() - start
+        results.append(r)
+    return results
+
+
+def build(builder, definitions, parallel=1, plan_only=False):
+    """plan containers one by one, then apply plans in parallel.
+
+    Plans share resolution through the builder, applies share
+      its copy pool, hash cache and store.
+    Return list of per container result dicts.
+
+    """
+    results = []
+    plans = []
+    for c in definitions:
+        r = {'name': c['name'], 'rootfs': c['rootfs'], 'ok': False}
+        results.append(r)
+        start = time.monotonic()
+        builder.current = c['name']
+        try:
+            plan = builder.plan(
+                c['name'], c['rootfs'], c['path'],
+                uid=c['uid'], gid=c['gid'],
+                **dict((k, c[k]) for k in options)
+            )
+        except (IOError, OSError, ValueError) as e:
+            r['error'] = str(e)
+            continue
+        totals = plan.totals()
+        r.update({
+            'files': totals['copies'],
+            'bytes': totals['bytes'],
+            'plan': time.monotonic() - start,
+        })
+        if plan_only:
+            r['ok'] = not plan.errors
+            r['errors'] = len(plan.errors)
+            continue
+        plans.append((r, c, plan))
+
+    def apply(item):
+        r, c, plan = item
+        start = time.monotonic()
+        try:
+            if not os.path.isdir(c['path']):
+                os.makedirs(c['path'])
+            errors, stale, unchanged = builder.apply(plan, c['name'])
+        except (IOError, OSError) as e:
+            r['error'] = str(e)
+            return
+        finally:
+            r['apply'] = time.monotonic() - start
+        for src, dst, error in errors:
+            print("%s: can not copy %s to %s: %s" % (c['name'], src, dst, error))
+        r.update({
+            'ok': not errors,
+            'errors': len(errors),
+            'copied': r['files'] - unchanged,
+            'unchanged': unchanged,
+            'stale': len(stale),
+            'stripped': plan.summary['stripped'],
+            'saved': plan.summary['saved'],
+        })
+
+    with ThreadPoolExecutor(max_workers=max(parallel, 1)) as pool:
+        for future in [pool.submit(apply, item) for item in plans]:
+            future.result()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='This utility create many lxc containers \
+        from file with their definitions'
+    )
+    parser.add_argument(
+        'definitions',
+        help='json, toml or yaml file with containers'
+    )
+    parser.add_argument(
+        '-P', '--lxcpath',
+        action='store', dest='lxcpath',
+        default=LXC_PATH,
+        help='directory of containers without path'
+    )
+    parser.add_argument(
+        '-p', '--parallel',
+        action='store', dest='parallel',
+        type=int, default=4,
+        help='number of containers applied at once'
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        action='store', dest='jobs',
+        type=int, default=8,
+        help='number of parallel copies shared by all containers'
+    )
+    parser.add_argument(
+        '--copy-mode',
+        action='store', dest='copy_mode',
+        choices=COPY_MODES, default='copy',
+        help='how to copy files'
+    )
+    parser.add_argument(
+        '--store',
+        action='store', dest='store',
+        help='keep files once in this store directory \
+        and hardlink (or reflink) them into every rootfs'
+    )
+    parser.add_argument(
+        '--strip',
+        action='store_true', dest='strip',
+        help='copy ELF files without debug sections and symbol table'
+    )
+    parser.add_argument(
+        '--index',
+        action='store', dest='index',
+        default=DEFAULT_INDEX,
+        help='host dependency index database'
+    )
+    parser.add_argument(
+        '--no-index',
+        action='store_const', dest='index', const=None,
+        help='do not use host dependency index'
+    )
+    parser.add_argument(
+        '--plan-only',
+        action='store_true', dest='plan_only',
+        help='print planned files and bytes, do not touch containers'
+    )
+    parser.add_argument(
+        '--verify',
+        action='store_true', dest='verify',
+        help='compare built containers with host files, do not build'
+    )
+    parser.add_argument(
+        '--json',
+        action='store', dest='json',
+        help='write per container report to this file'
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(args.definitions):
+        print("%s does not exists!" % args.definitions)
+        sys.exit(1)
+    try:
+        containers = definitions(load(args.definitions), args.lxcpath)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    start = time.monotonic()
+    builder = BatchBuilder(
+        jobs=args.jobs, mode=args.copy_mode, store=args.store,
+        index=args.index, strip=args.strip
+        )
+    try:
+        if args.verify:
+            results = verify(builder, containers)
+        else:
+            results = build(builder, containers, args.parallel, args.plan_only)
+    finally:
+        builder.close()
+    wall = time.monotonic() - start
+
+    for r in results:
+        if 'error' in r:
+            print("%-20s failed: %s" % (r['name'], r['error']))
+            continue
+        if args.verify:
+            for key in ('changed', 'missing', 'extra'):
+                for p in r[key]:
+                    print("%s: %s %s" % (r['name'], key, p))
+            print("%-20s %-7s %7.3fs %6d files %d changed %d missing %d extra" % (
+                r['name'], 'ok' if r['ok'] else 'drifted', r['verify'],
+                r['checked'], len(r['changed']), len(r['missing']),
+                len(r['extra'])
+                ))
+            continue
+        print("%-20s %-6s %7.3fs %6d files %12d bytes %6s copied %d errors" % (
+            r['name'], 'ok' if r['ok'] else 'failed',
+            r['plan'] + r.get('apply', 0.0), r['files'], r['bytes'],
+            r.get('copied', '-'), r['errors']
+            ))
+    failed = len([r for r in results if not r['ok']])
+    print("%d containers, %d %s, %.3fs" % (
+        len(results), failed, 'drifted' if args.verify else 'failed', wall
+        ))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(
+                {'wall': wall, 'containers': results},
+                f, indent=1, sort_keys=True
+            )
+    if failed:
+        sys.exit(1)
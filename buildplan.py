@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# NOTE: review or apply a plan saved by --plan:
+"""python bin2chroot.py /srv/chroot -b ls,bash --plan chroot.plan --plan-only
+python buildplan.py show chroot.plan
+python buildplan.py apply -j 8 chroot.plan"""
+
+import os
+import sys
+import json
+import argparse
+
+import skeleton
+from filestore import FileStore
+from fscopy import COPY_MODES, Copier, excluded, walk
+from manifest import Manifest
+
+VERSION = 1
+
+# copies smaller than this are batched, up to BATCH_FILES in a job
+BATCH_BYTES = 1024 * 1024
+BATCH_FILES = 64
+
+
+class Plan(object):
+    """complete description of a rootfs build.
+
+    Nothing is touched while the plan is made, so it can be
+      reviewed, saved and applied later or elsewhere.
+    entries are skeleton entries (see skeleton.spec) with
+      rootfs paths, dirs, links and copies are expanded
+      copied trees: (src, path), (target, path) and
+      (src, path, size) with rootfs paths like '/usr/bin/ls'.
+    host are generated files outside rootfs, like container
+      config and scripts: ('dir', path, mode, owned)
+      and ('file', path, mode, data, owned).
+    Everything in rootfs and owned host files belong
+      to uid:gid, -1 keeps the owner.
+    shared are host paths mounted instead of copied,
+      summary counts resolved paths and avoided copies.
+
+    """
+
+    def __init__(self, rootfs, uid=-1, gid=-1):
+        self.rootfs = rootfs
+        self.uid = uid
+        self.gid = gid
+        self.entries = []
+        self.host = []
+        self.dirs = []
+        self.links = []
+        self.copies = []
+        self.errors = []
+        self.shared = []
+        self.summary = {'paths': 0, 'redundant': 0}
+
+    def add_copy(self, src, path, exclude=()):
+        """plan copy of host file or directory tree to rootfs path."""
+        if exclude and excluded(src, exclude):
+            return
+        try:
+            if os.path.isfile(src):
+                self.copies.append((src, path, os.path.getsize(src)))
+            elif os.path.isdir(src):
+                def onerror(p, e):
+                    self.errors.append((p, path + p[len(src):], str(e)))
+                for p, kind, target in walk(src, exclude, onerror):
+                    name = path + p[len(src):]
+                    if kind == 'dir':
+                        self.dirs.append((p, name))
+                    elif kind == 'link':
+                        self.links.append((target, name))
+                    else:
+                        self.copies.append((p, name, os.path.getsize(p)))
+        except (IOError, OSError) as e:
+            self.errors.append((src, path, str(e)))
+
+    def generated(self):
+        """rootfs paths of files written from the plan."""
+        return sorted(
+            '/' + e[1].strip('/') for e in self.entries if e[0] == 'file'
+        )
+
+    def add_host_file(self, path, data, mode=0o644, owned=True):
+        self.host.append(('file', path, mode, data, owned))
+
+    def add_host_dir(self, path, mode=0o755, owned=True):
+        self.host.append(('dir', path, mode, owned))
+
+    def totals(self):
+        """count operations and bytes of the plan."""
+        kinds = [e[0] for e in self.entries]
+        t = {
+            'dirs': kinds.count('dir') + len(self.dirs),
+            'nodes': kinds.count('node'),
+            'links': kinds.count('link') + len(self.links),
+            'files': kinds.count('file'),
+            'copies': len(self.copies),
+            'bytes': sum(c[2] for c in self.copies),
+            'host': len(self.host),
+            'errors': len(self.errors),
+        }
+        t['chowns'] = 0
+        if self.uid != -1 or self.gid != -1:
+            t['chowns'] = len([e for e in self.host if e[-1]]) + \
+                len(self.entries) + len(self.dirs) + \
+                len(self.links) + len(self.copies)
+        return t
+
+    def format_totals(self):
+        return "%(dirs)d dirs, %(nodes)d nodes, %(links)d links, " \
+            "%(files)d generated files, %(host)d host files, " \
+            "%(copies)d copies of %(bytes)d bytes, %(chowns)d chowns" % \
+            self.totals()
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({
+                'version': VERSION,
+                'rootfs': self.rootfs,
+                'uid': self.uid,
+                'gid': self.gid,
+                'entries': self.entries,
+                'host': self.host,
+                'dirs': self.dirs,
+                'links': self.links,
+                'copies': self.copies,
+                'errors': self.errors,
+                'shared': self.shared,
+                'summary': self.summary,
+            }, f, indent=1)
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != VERSION:
+            raise ValueError("%s: unsupported plan version" % path)
+        plan = cls(data['rootfs'], data['uid'], data['gid'])
+        for key in ('entries', 'host', 'dirs', 'links', 'copies', 'errors'):
+            setattr(plan, key, [tuple(i) for i in data[key]])
+        plan.shared = data['shared']
+        plan.summary = data['summary']
+        return plan
+
+
+def batches(copies, rootfs, count=BATCH_FILES, size=BATCH_BYTES):
+    """group planned copies into jobs, biggest first.
+
+    Big files go alone, so they spread over the workers,
+      small ones are grouped by count and total size.
+
+    """
+    group = []
+    total = 0
+    for src, path, n in sorted(copies, key=lambda c: -c[2]):
+        if n >= size:
+            yield [(src, rootfs + path)]
+            continue
+        group.append((src, rootfs + path))
+        total += n
+        if len(group) >= count or total >= size:
+            yield group
+            group = []
+            total = 0
+    if group:
+        yield group
+
+
+def apply_host(entries, uid=-1, gid=-1):
+    """create generated files and dirs outside rootfs."""
+    chown = uid != -1 or gid != -1
+    for entry in entries:
+        kind, path, mode = entry[:3]
+        if kind == 'dir':
+            if not os.path.isdir(path):
+                os.makedirs(path, mode)
+        else:
+            parent = os.path.dirname(path)
+            if parent and not os.path.isdir(parent):
+                os.makedirs(parent)
+            with open(path, 'w') as f:
+                f.write(entry[3])
+            os.chmod(path, mode)
+        if chown and entry[-1]:
+            os.chown(path, uid, gid)
+
+
+def apply(plan, copier, profiler=None):
+    """execute plan with copier.
+
+    Skeleton goes first in one pass, then host files,
+      then copied trees: directories and links are created
+      here and files are copied by the copier pool in batches.
+    Return list of (src, dst, error) like Copier.wait().
+
+    """
+    if profiler is not None:
+        profiler.start('skeleton')
+    skeleton.apply(plan.rootfs, plan.entries, plan.uid, plan.gid)
+    if profiler is not None:
+        profiler.start('config')
+    apply_host(plan.host, plan.uid, plan.gid)
+    if profiler is not None:
+        profiler.start('copy')
+    for src, path in plan.dirs:
+        try:
+            copier.mkdir(src, plan.rootfs + path)
+        except (IOError, OSError) as e:
+            copier.errors.append((src, plan.rootfs + path, e))
+    for target, path in plan.links:
+        try:
+            copier.symlink(target, plan.rootfs + path)
+        except (IOError, OSError) as e:
+            copier.errors.append((target, plan.rootfs + path, e))
+    for pairs in batches(plan.copies, plan.rootfs):
+        copier.copyfiles(pairs)
+    return copier.wait()
+
+
+def archive(plan, writer):
+    """write rootfs part of plan into ArchiveWriter."""
+    for entry in plan.entries:
+        kind, path = entry[:2]
+        if kind == 'dir':
+            writer.add_dir(path, entry[2])
+        elif kind == 'node':
+            writer.add_node(
+                path, entry[2], os.major(entry[3]), os.minor(entry[3])
+                )
+        elif kind == 'link':
+            writer.add_symlink(path, entry[2])
+        else:
+            writer.add_data(path, entry[3], entry[2])
+    for src, path in plan.dirs:
+        try:
+            st = os.stat(src)
+            writer.add_dir(path, st.st_mode, st.st_mtime)
+        except (IOError, OSError) as e:
+            writer.errors.append((src, path, e))
+    for target, path in plan.links:
+        writer.add_symlink(path, target)
+    for src, path, size in plan.copies:
+        try:
+            writer.add_file(src, path)
+        except (IOError, OSError) as e:
+            writer.errors.append((src, path, e))
+    return writer.errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Show or apply rootfs build plan \
+        saved by bin2lxc or bin2chroot --plan'
+    )
+    parser.add_argument(
+        'command',
+        choices=('show', 'apply'),
+        help='show: print plan totals, apply: build rootfs from plan'
+    )
+    parser.add_argument(
+        'plan',
+        help='plan file'
+    )
+    parser.add_argument(
+        '-v', '--verbose',
+        action='store_true', dest='verbose',
+        help='list planned copies'
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        action='store', dest='jobs',
+        type=int, default=1,
+        help='number of parallel copies'
+    )
+    parser.add_argument(
+        '--copy-mode',
+        action='store', dest='copy_mode',
+        choices=COPY_MODES, default='copy',
+        help='how to copy files'
+    )
+    parser.add_argument(
+        '--store',
+        action='store', dest='store',
+        help='place files through this store directory'
+    )
+    args = parser.parse_intermixed_args()
+
+    if not os.path.exists(args.plan):
+        print("%s does not exists!" % args.plan)
+        sys.exit(1)
+    plan = Plan.load(args.plan)
+
+    if args.command == 'show':
+        print("%s: %s" % (plan.rootfs, plan.format_totals()))
+        if args.verbose:
+            for src, path, size in plan.copies:
+                print("%s\t%s\t%d" % (src, path, size))
+        for src, dst, error in plan.errors:
+            print("can not copy %s to %s: %s" % (src, dst, error))
+        sys.exit(0)
+
+    store = None
+    if args.store:
+        store = FileStore(args.store, reflink=args.copy_mode == 'reflink')
+    manifest = Manifest(plan.rootfs)
+    copier = Copier(
+        jobs=args.jobs, mode=args.copy_mode, store=store, manifest=manifest,
+        uid=None if plan.uid == -1 else plan.uid,
+        gid=None if plan.gid == -1 else plan.gid
+        )
+    errors = apply(plan, copier)
+    copier.close()
+    for src, dst, error in errors:
+        print("can not copy %s to %s: %s" % (src, dst, error))
+    stale = manifest.remove_stale()
+    manifest.generated = plan.generated()
+    manifest.save()
+    print("%d files copied, %d up to date, %d stale files removed" % (
+        len(plan.copies) - manifest.unchanged, manifest.unchanged, len(stale)
+        ))
+    if errors:
+        sys.exit(1)
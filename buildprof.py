@@ -0,0 +1,177 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import sys
+import json
+import time
+import heapq
+import threading
+
+# audit events counted per phase, see sys.addaudithook
+audited = {
+    'open': 'open',
+    'os.mkdir': 'mkdir',
+    'os.chown': 'chown',
+    'os.chmod': 'chmod',
+    'os.link': 'link',
+    'os.symlink': 'symlink',
+    'os.rename': 'rename',
+    'os.remove': 'unlink',
+    'os.listdir': 'listdir',
+    'os.scandir': 'scandir',
+    'shutil.copyfile': 'copyfile',
+    'os.truncate': 'truncate',
+}
+spawn_events = (
+    'subprocess.Popen', 'os.fork', 'os.forkpty', 'os.exec',
+    'os.posix_spawn', 'os.spawn', 'os.system', 'os.startfile',
+)
+
+_active = []
+_hooked = False
+
+
+def _audit(event, args):
+    if not _active:
+        return
+    phase = _active[-1].current
+    if phase is None:
+        return
+    if event in audited:
+        key = audited[event]
+        phase['ops'][key] = phase['ops'].get(key, 0) + 1
+    elif event in spawn_events:
+        phase['spawns'] += 1
+
+
+class Profiler(object):
+    """per phase timing, file, byte and operation accounting.
+
+    Phases follow each other: start() ends the previous one.
+    Operations and process spawns are counted through audit
+      hooks, also in copy threads; copies are reported by Copier
+      through copied(), the top slowest ones are kept.
+
+    """
+
+    def __init__(self, top=10):
+        global _hooked
+        self.top = top
+        self.phases = []
+        self.current = None
+        self.copies = []
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        if not _hooked:
+            sys.addaudithook(_audit)
+            _hooked = True
+        _active.append(self)
+
+    def start(self, name):
+        self.stop()
+        self.current = {
+            'name': name, 'wall': 0.0, 'files': 0, 'bytes': 0,
+            'spawns': 0, 'ops': {}, '_start': time.monotonic(),
+        }
+
+    def stop(self):
+        phase = self.current
+        if phase is None:
+            return
+        self.current = None
+        phase['wall'] = time.monotonic() - phase.pop('_start')
+        wall = phase['wall']
+        phase['files_per_s'] = phase['files'] / wall if wall else 0.0
+        phase['mb_per_s'] = phase['bytes'] / wall / 2 ** 20 if wall else 0.0
+        self.phases.append(phase)
+
+    def add(self, files=0, size=0):
+        """account files and bytes to the current phase."""
+        with self._lock:
+            if self.current is not None:
+                self.current['files'] += files
+                self.current['bytes'] += size
+
+    def copied(self, src, dst, seconds, size):
+        """account one copy made by Copier."""
+        item = (seconds, src, dst, size)
+        with self._lock:
+            if self.current is not None:
+                self.current['files'] += 1
+                self.current['bytes'] += size
+            if len(self.copies) < self.top:
+                heapq.heappush(self.copies, item)
+            elif item > self.copies[0]:
+                heapq.heapreplace(self.copies, item)
+
+    def close(self):
+        self.stop()
+        if self in _active:
+            _active.remove(self)
+
+    def report(self):
+        self.close()
+        return {
+            'time': time.time(),
+            'wall': time.monotonic() - self._start,
+            'phases': self.phases,
+            'slowest': [
+                {'seconds': s, 'src': src, 'dst': dst, 'bytes': size}
+                for s, src, dst, size in sorted(self.copies, reverse=True)
+            ],
+        }
+
+    def format(self, fmt='text', **extra):
+        """return report as a json line or as text block."""
+        report = self.report()
+        report.update(extra)
+        if fmt == 'json':
+            return json.dumps(report, sort_keys=True) + '\n'
+        lines = ["%s %s" % (
+            time.strftime('%Y-%m-%d %H:%M:%S',
+                          time.localtime(report['time'])),
+            " ".join("%s=%s" % kv for kv in sorted(extra.items()))
+        )]
+        for p in report['phases']:
+            lines.append(
+                "  %-10s %8.3fs %6d files %12d bytes %8.1f MB/s "
+                "spawns=%d %s" % (
+                    p['name'], p['wall'], p['files'], p['bytes'],
+                    p['mb_per_s'], p['spawns'],
+                    " ".join("%s=%d" % kv for kv in sorted(p['ops'].items()))
+                ))
+        lines.append("  %-10s %8.3fs" % ('total', report['wall']))
+        for c in report['slowest']:
+            lines.append("  slow %8.4fs %12d bytes %s" % (
+                c['seconds'], c['bytes'], c['src']
+            ))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path, fmt='text', **extra):
+        """append report to log file."""
+        with open(path, 'a') as f:
+            f.write(self.format(fmt, **extra))
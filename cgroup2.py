@@ -0,0 +1,244 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# NOTE: run command in its own cgroup with limits, print what it used:
+"""python userns_child_exec.py -U -z --cgroup build --memory-max 1G \
+    --cpu-max "50000 100000" make
+
+cg = Cgroup.create('build', limits={'memory.max': '1G'})
+pid = userns.launch(['make'], flags, cgroup=cg)
+os.waitpid(pid, 0)
+print(format_stats(cg.stats()))
+cg.remove()"""
+
+import os
+import time
+import errno
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+# limit files and controllers which provide them
+controllers = {
+    'cpu.max': 'cpu',
+    'memory.max': 'memory',
+    'io.max': 'io',
+}
+
+# controllers enabled for accounting, with or without limits:
+# cpu.stat has usage without cpu, memory.peak and io.stat need them
+accounting = ('cpu', 'memory', 'io')
+
+
+def mountpoint(mounts='/proc/self/mounts'):
+    """where cgroup2 is mounted, CGROUP_ROOT if it is not found."""
+    try:
+        with open(mounts) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[2] == 'cgroup2':
+                    return fields[1]
+    except IOError:
+        pass
+    return CGROUP_ROOT
+
+
+def current(pid='self'):
+    """cgroup2 path of pid below the root of the hierarchy."""
+    with open('/proc/%s/cgroup' % pid) as f:
+        for line in f:
+            if line.startswith('0::'):
+                return line[3:].strip()
+    return '/'
+
+
+def read_flat(path):
+    """'key value' lines of a file like cpu.stat."""
+    result = {}
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2:
+                result[fields[0]] = int(fields[1])
+    return result
+
+
+def read_nested(path):
+    """'key a=1 b=2' lines of a file like io.stat."""
+    result = {}
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if fields:
+                result[fields[0]] = dict(
+                    (k, int(v)) for k, v in
+                    (item.split('=', 1) for item in fields[1:])
+                )
+    return result
+
+
+def enable(path, names, optional=()):
+    """enable controllers for children of cgroup path.
+
+    optional controllers are enabled where they are available
+      and can be enabled, others are skipped silently.
+
+    """
+    with open(os.path.join(path, 'cgroup.controllers')) as f:
+        available = f.read().split()
+    with open(os.path.join(path, 'cgroup.subtree_control')) as f:
+        enabled = f.read().split()
+    for name in sorted(set(names).union(optional) - set(enabled)):
+        required = name in names
+        if name not in available:
+            if not required:
+                continue
+            raise OSError(
+                errno.ENOTSUP,
+                "controller %s is not available in %s" % (name, path)
+            )
+        try:
+            with open(os.path.join(path, 'cgroup.subtree_control'), 'w') as f:
+                f.write('+' + name)
+        except IOError as e:
+            if not required:
+                continue
+            if e.errno == errno.EBUSY:
+                # no internal processes rule
+                raise OSError(
+                    e.errno, "can not enable %s in %s, it has processes, "
+                    "use a parent cgroup without them" % (name, path)
+                )
+            raise
+
+
+class Cgroup(object):
+    """cgroup v2 leaf of one child: limits, placement, accounting.
+
+    Everything is done by reading and writing files under path,
+      so any directory with the same files can stand in for
+      cgroupfs, e.g. in tests.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def create(cls, name, parent=None, root=None, limits=None):
+        """make cgroup name below parent and write limits.
+
+        parent is relative to root, the cgroup2 mount point,
+          our own cgroup by default; limits is a dict like
+          {'memory.max': '512M', 'cpu.max': '50000 100000'}.
+        Controllers of limits must be enabled, the accounting
+          ones are enabled where the parent allows it.
+
+        """
+        if root is None:
+            root = mountpoint()
+        if parent is None:
+            parent = current()
+        parent = os.path.join(root, parent.lstrip('/')).rstrip('/')
+        limits = limits or {}
+        enable(
+            parent, [controllers[k] for k in limits if k in controllers],
+            accounting
+        )
+        cgroup = cls(os.path.join(parent, name))
+        os.mkdir(cgroup.path)
+        try:
+            for key, value in sorted(limits.items()):
+                cgroup.write(key, value)
+        except BaseException:
+            cgroup.remove()
+            raise
+        return cgroup
+
+    def write(self, key, value):
+        with open(os.path.join(self.path, key), 'w') as f:
+            f.write(str(value))
+
+    def add(self, pid=0):
+        """move pid into the cgroup, 0 is the calling process."""
+        self.write('cgroup.procs', pid)
+
+    def open(self):
+        """descriptor of the cgroup for clone3 CLONE_INTO_CGROUP."""
+        return os.open(self.path, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+
+    def stats(self):
+        """dict of 'cpu' (cpu.stat), 'memory_peak' (bytes or None)
+        and 'io' (io.stat per device); files which the enabled
+        controllers do not provide are left empty."""
+        result = {'cpu': {}, 'memory_peak': None, 'io': {}}
+        for key, name, read in (('cpu', 'cpu.stat', read_flat),
+                                ('io', 'io.stat', read_nested)):
+            try:
+                result[key] = read(os.path.join(self.path, name))
+            except IOError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+        try:
+            with open(os.path.join(self.path, 'memory.peak')) as f:
+                result['memory_peak'] = int(f.read())
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        return result
+
+    def remove(self, timeout=1.0):
+        """remove the cgroup once its processes are gone."""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                os.rmdir(self.path)
+                return
+            except OSError as e:
+                if e.errno == errno.ENOENT:
+                    return
+                # exited processes leave the cgroup asynchronously
+                if e.errno != errno.EBUSY or time.time() > deadline:
+                    raise
+            time.sleep(0.01)
+
+
+def format_stats(stats):
+    """one line of what the cgroup used."""
+    parts = []
+    cpu = stats['cpu']
+    if 'usage_usec' in cpu:
+        parts.append("cpu %.3fs (user %.3fs, system %.3fs)" % (
+            cpu['usage_usec'] / 1e6, cpu.get('user_usec', 0) / 1e6,
+            cpu.get('system_usec', 0) / 1e6
+        ))
+    if stats['memory_peak'] is not None:
+        parts.append("memory peak %d bytes" % stats['memory_peak'])
+    if stats['io']:
+        parts.append("io read %d bytes, written %d bytes" % (
+            sum(d.get('rbytes', 0) for d in stats['io'].values()),
+            sum(d.get('wbytes', 0) for d in stats['io'].values())
+        ))
+    return ", ".join(parts) or "no accounting available"
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# NOTE: which containers have to be rebuilt after openssl upgrade:
+"""python depindex.py rdeps libssl.so.3"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+
+from elfdeps import LD_SO_CACHE, Resolver
+from filestore import file_hash
+
+DEFAULT_INDEX = os.path.expanduser("~/.cache/bin2lxc/index.sqlite")
+
+schema = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dev INTEGER,
+    ino INTEGER,
+    mtime INTEGER,
+    deps TEXT,
+    missing TEXT
+);
+CREATE TABLE IF NOT EXISTS containers (
+    name TEXT PRIMARY KEY,
+    rootfs TEXT,
+    updated INTEGER
+);
+CREATE TABLE IF NOT EXISTS container_files (
+    container TEXT,
+    dst TEXT,
+    src TEXT,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    name TEXT PRIMARY KEY,
+    key TEXT,
+    closure TEXT
+);
+CREATE INDEX IF NOT EXISTS container_files_name ON container_files (name);
+CREATE INDEX IF NOT EXISTS container_files_src ON container_files (src);
+CREATE INDEX IF NOT EXISTS container_files_container
+    ON container_files (container);
+"""
+
+
+def signature(path):
+    """(dev, ino, mtime) of path or None."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_dev, st.st_ino, st.st_mtime_ns]
+
+
+def resolve_profile(binaries, configs, resolver, hashes=True):
+    """resolve comma separated binaries and configs of a profile.
+
+    Return dict with resolved 'binaries', their closure in 'files',
+      existing 'configs', 'not_found' binaries and configs,
+      'missing' libraries and 'members': every file, directory
+      and PATH entry the result depends on, with signature,
+      size and (if hashes) sha256.
+
+    """
+    r = Resolver(
+        path=os.pathsep.join(resolver.path),
+        ld_cache=resolver.ld_cache, index=resolver.index
+    )
+    closure = {'binaries': [], 'configs': [], 'not_found': []}
+    for name in binaries.split(','):
+        if not name:
+            continue
+        p = r.which(name)
+        if p:
+            closure['binaries'].append(p)
+        else:
+            closure['not_found'].append(name)
+    closure['files'] = r.closure(closure['binaries'])[0]
+    closure['missing'] = sorted(r.missing)
+    for c in configs.split(','):
+        if not c:
+            continue
+        if os.path.exists(c):
+            closure['configs'].append(os.path.normpath(c))
+        else:
+            closure['not_found'].append(c)
+
+    members = []
+
+    def member(path, is_file):
+        st = os.stat(path)
+        members.append({
+            'path': path,
+            'sig': [st.st_dev, st.st_ino, st.st_mtime_ns],
+            'size': st.st_size if is_file else 0,
+            'sha256': file_hash(path) if is_file and hashes else None,
+        })
+
+    # new binaries in PATH change the result too
+    for d in r.path:
+        if os.path.isdir(d):
+            member(d, False)
+    for f in closure['files']:
+        member(f, True)
+    for c in closure['configs']:
+        if not os.path.isdir(c):
+            member(c, True)
+            continue
+        for top, dirs, files in os.walk(c):
+            member(top, False)
+            for f in files:
+                f = os.path.join(top, f)
+                if os.path.isfile(f):
+                    member(f, True)
+    closure['members'] = members
+    closure['bytes'] = sum(m['size'] for m in members)
+    return closure
+
+
+class DependencyIndex(object):
+    """persistent index of host ELF files and built containers.
+
+    Every file maps to its resolved dependency closure;
+      an entry is valid while (dev, ino, mtime) of the file
+      and of every dependency are the same, and the whole
+      index is dropped when /etc/ld.so.cache changes.
+    Containers record which host files they got,
+      so reverse queries tell what to rebuild.
+    The connection may be used from several threads,
+      one at a time.
+
+    """
+
+    def __init__(self, path=DEFAULT_INDEX, ld_cache=LD_SO_CACHE):
+        self.path = path
+        d = os.path.dirname(path)
+        if d and not os.path.exists(d):
+            os.makedirs(d)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(schema)
+        self.hits = 0
+        self.misses = 0
+        self._check_ld_cache(ld_cache)
+
+    def _check_ld_cache(self, ld_cache):
+        sig = json.dumps(signature(ld_cache))
+        row = self.db.execute(
+            "SELECT value FROM meta WHERE key = 'ld_cache'"
+        ).fetchone()
+        if row is None or row[0] != sig:
+            with self.db:
+                self.db.execute("DELETE FROM files")
+                self.db.execute("DELETE FROM profiles")
+                self.db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('ld_cache', ?)",
+                    (sig,)
+                )
+
+    def lookup(self, path):
+        """return (deps, missing) or None if there is no valid entry."""
+        row = self.db.execute(
+            "SELECT dev, ino, mtime, deps, missing FROM files WHERE path = ?",
+            (path,)
+        ).fetchone()
+        if row is None or list(row[:3]) != signature(path):
+            self.misses += 1
+            return None
+        deps = json.loads(row[3])
+        for dep, sig in deps:
+            if sig != signature(dep):
+                self.misses += 1
+                return None
+        self.hits += 1
+        return [dep for dep, sig in deps], set(json.loads(row[4]))
+
+    def store(self, path, deps, missing):
+        sig = signature(path)
+        if sig is None:
+            return
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                [path] + sig + [
+                    json.dumps([(dep, signature(dep)) for dep in deps]),
+                    json.dumps(sorted(missing)),
+                ]
+            )
+
+    def profile(self, name, binaries, configs, resolver):
+        """return closure of profile from cache or resolve it.
+
+        Cached closure is valid while the profile definition
+          and PATH are the same and no member has changed.
+
+        """
+        key = hashlib.sha256(json.dumps(
+            [binaries, configs, resolver.path]
+        ).encode()).hexdigest()
+        row = self.db.execute(
+            "SELECT key, closure FROM profiles WHERE name = ?", (name,)
+        ).fetchone()
+        if row is not None and row[0] == key:
+            closure = json.loads(row[1])
+            if all(signature(m['path']) == m['sig']
+                   for m in closure['members']):
+                self.hits += 1
+                return closure
+        self.misses += 1
+        closure = resolve_profile(binaries, configs, resolver)
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?)",
+                (name, key, json.dumps(closure))
+            )
+        return closure
+
+    def profiles(self):
+        """return dict of cached profile closures."""
+        return dict(
+            (name, json.loads(closure)) for name, closure in
+            self.db.execute("SELECT name, closure FROM profiles ORDER BY name")
+        )
+
+    def record_container(self, name, rootfs, files):
+        """remember host files of container as (dst, src) pairs."""
+        with self.db:
+            self.db.execute(
+                "DELETE FROM container_files WHERE container = ?", (name,)
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO containers VALUES (?, ?, ?)",
+                (name, rootfs, int(time.time()))
+            )
+            self.db.executemany(
+                "INSERT INTO container_files VALUES (?, ?, ?, ?)",
+                [(name, dst, src, os.path.basename(src))
+                 for dst, src in files]
+            )
+
+    def containers(self):
+        """return list of (name, rootfs, updated, files)."""
+        return self.db.execute(
+            "SELECT c.name, c.rootfs, c.updated, count(f.dst) "
+            "FROM containers c "
+            "LEFT JOIN container_files f ON f.container = c.name "
+            "GROUP BY c.name ORDER BY c.name"
+        ).fetchall()
+
+    def rdeps(self, name):
+        """return list of (container, rootfs, src) which include
+        a host file with this path or file name."""
+        return self.db.execute(
+            "SELECT c.name, c.rootfs, f.src "
+            "FROM container_files f JOIN containers c ON f.container = c.name "
+            "WHERE f.name = ? OR f.src = ? ORDER BY c.name, f.src",
+            (name, name)
+        ).fetchall()
+
+    def close(self):
+        self.db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Query the host dependency index of bin2lxc'
+    )
+    parser.add_argument(
+        '--index',
+        action='store', dest='index',
+        default=DEFAULT_INDEX,
+        help='index database'
+    )
+    parser.add_argument(
+        'command',
+        choices=('rdeps', 'containers', 'profiles'),
+        help='rdeps: containers which include given files, \
+        containers: list built containers, \
+        profiles: show cached profile closures'
+    )
+    parser.add_argument(
+        'names',
+        nargs='*',
+        help='file names or host paths for rdeps, profile names'
+    )
+    parser.add_argument(
+        '-v', '--verbose',
+        action='store_true', dest='verbose',
+        help='list files of profiles'
+    )
+    args = parser.parse_intermixed_args()
+
+    if not os.path.exists(args.index):
+        print("%s does not exists!" % args.index)
+        sys.exit(1)
+    index = DependencyIndex(args.index)
+
+    if args.command == 'containers':
+        for name, rootfs, updated, count in index.containers():
+            print("%s\t%s\t%s\t%d files" % (
+                name, rootfs,
+                time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(updated)),
+                count
+                ))
+    elif args.command == 'profiles':
+        for name, closure in index.profiles().items():
+            if args.names and name not in args.names:
+                continue
+            files = [m for m in closure['members'] if m['sha256']]
+            print("%s\t%d binaries\t%d files\t%d bytes" % (
+                name, len(closure['binaries']), len(files), closure['bytes']
+                ))
+            if args.verbose:
+                for m in sorted(files, key=lambda m: -m['size']):
+                    print("\t%d\t%s\t%s" % (m['size'], m['sha256'], m['path']))
+    else:
+        for n in args.names:
+            for name, rootfs, src in index.rdeps(n):
+                print("%s\t%s\t%s" % (name, rootfs, src))
@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# NOTE: resolve libraries like ldd does, but without running
+# the dynamic loader of the binary:
+"""python elfdeps.py ls bash /usr/lib/firefox/firefox"""
+
+import os
+import sys
+import struct
+import platform
+from collections import namedtuple
+
+LD_SO_CACHE = "/etc/ld.so.cache"
+
+# elf.h
+PT_LOAD = 1
+PT_DYNAMIC = 2
+PT_INTERP = 3
+
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+
+# e_machine: multiarch triplet
+multiarch = {
+    3: 'i386-linux-gnu',
+    40: 'arm-linux-gnueabihf',
+    62: 'x86_64-linux-gnu',
+    183: 'aarch64-linux-gnu',
+}
+
+ElfInfo = namedtuple(
+    'ElfInfo',
+    ['elfclass', 'machine', 'interp', 'needed', 'rpath', 'runpath']
+)
+
+
+def read_elf(path):
+    """read dynamic linking info from ELF file.
+
+    Return ElfInfo or None if path is not an ELF file.
+    Only program headers are used, so stripped binaries
+      without section headers are fine.
+
+    """
+    try:
+        f = open(path, 'rb')
+    except (IOError, OSError):
+        return None
+    with f:
+        ident = f.read(16)
+        if len(ident) < 16 or ident[:4] != b'\x7fELF':
+            return None
+        elfclass = ident[4]
+        endian = '<' if ident[5] == 1 else '>'
+        if elfclass == ELFCLASS64:
+            ehdr = endian + 'HHIQQQIHHHHHH'
+            phdr = endian + 'IIQQQQQQ'
+            dyn = endian + 'qQ'
+        elif elfclass == ELFCLASS32:
+            ehdr = endian + 'HHIIIIIHHHHHH'
+            phdr = endian + 'IIIIIIII'
+            dyn = endian + 'iI'
+        else:
+            return None
+        header = f.read(struct.calcsize(ehdr))
+        if len(header) < struct.calcsize(ehdr):
+            return None
+        (e_type, e_machine, e_version, e_entry, e_phoff, e_shoff, e_flags,
+         e_ehsize, e_phentsize, e_phnum, e_shentsize, e_shnum,
+         e_shstrndx) = struct.unpack(ehdr, header)
+
+        loads = []
+        dynamic = None
+        interp = None
+        f.seek(e_phoff)
+        data = f.read(e_phentsize * e_phnum)
+        for i in range(e_phnum):
+            entry = data[i * e_phentsize:(i + 1) * e_phentsize]
+            if len(entry) < struct.calcsize(phdr):
+                break
+            fields = struct.unpack(phdr, entry[:struct.calcsize(phdr)])
+            if elfclass == ELFCLASS64:
+                p_type, _, p_offset, p_vaddr, _, p_filesz = fields[:6]
+            else:
+                p_type, p_offset, p_vaddr, _, p_filesz = fields[:5]
+            if p_type == PT_LOAD:
+                loads.append((p_vaddr, p_filesz, p_offset))
+            elif p_type == PT_DYNAMIC:
+                dynamic = (p_offset, p_filesz)
+            elif p_type == PT_INTERP:
+                pos = f.tell()
+                f.seek(p_offset)
+                interp = f.read(p_filesz).split(b'\0')[0].decode()
+                f.seek(pos)
+
+        needed = []
+        rpath = []
+        runpath = []
+        if dynamic:
+            f.seek(dynamic[0])
+            data = f.read(dynamic[1])
+            size = struct.calcsize(dyn)
+            strtab = None
+            tags = []
+            for i in range(len(data) // size):
+                tag, val = struct.unpack(dyn, data[i * size:(i + 1) * size])
+                if tag == DT_NULL:
+                    break
+                if tag == DT_STRTAB:
+                    strtab = val
+                elif tag in (DT_NEEDED, DT_RPATH, DT_RUNPATH):
+                    tags.append((tag, val))
+            # DT_STRTAB is a virtual address, map it back to the file
+            offset = None
+            for vaddr, filesz, foffset in loads:
+                if strtab is not None and vaddr <= strtab < vaddr + filesz:
+                    offset = strtab - vaddr + foffset
+                    break
+            if offset is not None:
+                for tag, val in tags:
+                    f.seek(offset + val)
+                    s = b''
+                    while b'\0' not in s:
+                        chunk = f.read(256)
+                        if not chunk:
+                            break
+                        s += chunk
+                    s = s.split(b'\0')[0].decode('utf-8', 'replace')
+                    if tag == DT_NEEDED:
+                        needed.append(s)
+                    elif tag == DT_RPATH:
+                        rpath += [p for p in s.split(':') if p]
+                    else:
+                        runpath += [p for p in s.split(':') if p]
+
+    return ElfInfo(elfclass, e_machine, interp, needed, rpath, runpath)
+
+
+def read_ld_cache(path=LD_SO_CACHE):
+    """read /etc/ld.so.cache.
+
+    Return dict of library name: list of paths
+      in the order ld.so would try them.
+    Both the old "ld.so-1.7.0" header and the new
+      "glibc-ld.so.cache1.1" format are understood.
+
+    """
+    libs = {}
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return libs
+
+    magic = b'glibc-ld.so.cache1.1'
+    start = data.find(magic)
+    if start != -1:
+        nlibs, len_strings = struct.unpack_from('=II', data, start + 20)
+        entry, first = 24, start + 48
+        fmt = '=iIIIQ'
+        base = start
+    elif data.startswith(b'ld.so-1.7.0'):
+        nlibs = struct.unpack_from('=I', data, 12)[0]
+        entry, first = 12, 16
+        fmt = '=iII'
+        base = first + nlibs * entry
+    else:
+        return libs
+
+    for i in range(nlibs):
+        fields = struct.unpack_from(fmt, data, first + i * entry)
+        key, value = fields[1] + base, fields[2] + base
+        name = data[key:data.index(b'\0', key)].decode()
+        lib = data[value:data.index(b'\0', value)].decode()
+        libs.setdefault(name, []).append(lib)
+    return libs
+
+
+class Resolver(object):
+    """resolve binaries and their libraries.
+
+    Walk PATH like `which` and read DT_NEEDED, RPATH, RUNPATH
+      and PT_INTERP from ELF headers like ld.so does,
+      so nothing from the host is executed.
+    Results are cached, so one Resolver may be used
+      for a lot of binaries; with a DependencyIndex
+      they are kept between runs too.
+
+    """
+
+    def __init__(self, path=None, ld_cache=LD_SO_CACHE, index=None):
+        if path is None:
+            path = os.environ.get('PATH', os.defpath)
+        self.path = [p for p in path.split(os.pathsep) if p]
+        self.ld_cache = ld_cache
+        self.index = index
+        self.missing = set()
+        self._libs = None
+        self._elf = {}
+        self._deps = {}
+
+    def which(self, name):
+        """find binary like `which` do."""
+        if not name:
+            return None
+        if '/' in name:
+            if os.path.isfile(name):
+                return name
+            return None
+        for d in self.path:
+            p = os.path.join(d, name)
+            if os.path.isfile(p) and os.access(p, os.X_OK):
+                return p
+        return None
+
+    def elf(self, path):
+        """cached read_elf."""
+        if path not in self._elf:
+            self._elf[path] = read_elf(path)
+        return self._elf[path]
+
+    def _compatible(self, path, info):
+        lib = self.elf(path)
+        return (lib is not None and lib.elfclass == info.elfclass
+                and lib.machine == info.machine)
+
+    def _expand(self, d, origin, info):
+        lib = 'lib64' if info.elfclass == ELFCLASS64 else 'lib'
+        for k, v in (('ORIGIN', origin), ('LIB', lib),
+                     ('PLATFORM', platform.machine())):
+            d = d.replace('${%s}' % k, v).replace('$' + k, v)
+        return d
+
+    def _default_dirs(self, info):
+        dirs = []
+        triplet = multiarch.get(info.machine)
+        if triplet:
+            dirs += ['/lib/' + triplet, '/usr/lib/' + triplet]
+        if info.elfclass == ELFCLASS64:
+            dirs += ['/lib64', '/usr/lib64']
+        return dirs + ['/lib', '/usr/lib']
+
+    def find_library(self, name, path, info, rpath=()):
+        """find library like ld.so do.
+
+        Search order is DT_RPATH (when there is no DT_RUNPATH),
+          DT_RUNPATH, ld.so.cache and default directories.
+
+        """
+        if '/' in name:
+            return name if os.path.exists(name) else None
+        origin = os.path.dirname(os.path.realpath(path))
+        dirs = []
+        if not info.runpath:
+            dirs += list(info.rpath) + list(rpath)
+        dirs += info.runpath
+        for d in dirs:
+            p = os.path.join(self._expand(d, origin, info), name)
+            if os.path.exists(p) and self._compatible(p, info):
+                return p
+        if self._libs is None:
+            self._libs = read_ld_cache(self.ld_cache)
+        for p in self._libs.get(name, []):
+            if os.path.exists(p) and self._compatible(p, info):
+                return p
+        for d in self._default_dirs(info):
+            p = os.path.join(d, name)
+            if os.path.exists(p) and self._compatible(p, info):
+                return p
+        return None
+
+    def dependencies(self, path):
+        """return transitive closure of libraries for binary.
+
+        Interpreter goes last like in ldd output.
+        Not found libraries are collected in self.missing.
+
+        """
+        if path in self._deps:
+            return self._deps[path]
+        cached = None
+        if self.index is not None:
+            cached = self.index.lookup(path)
+        if cached is not None:
+            deps, missing = cached
+        else:
+            deps, missing = self._resolve(path)
+            if self.index is not None:
+                self.index.store(path, deps, missing)
+        self.missing.update(missing)
+        self._deps[path] = deps
+        return deps
+
+    def _resolve(self, path):
+        info = self.elf(path)
+        missing = set()
+        if info is None:
+            return [], missing
+        deps = []
+        seen = set()
+        # the interpreter is already loaded and satisfies its soname
+        names = set()
+        if info.interp:
+            names.add(os.path.basename(info.interp))
+        queue = [(path, info, [])]
+        while queue:
+            obj, obj_info, rpath = queue.pop(0)
+            inherited = [] if obj_info.runpath else obj_info.rpath + rpath
+            for name in obj_info.needed:
+                if name in names:
+                    continue
+                lib = self.find_library(name, obj, obj_info, rpath)
+                if lib is None:
+                    missing.add(name)
+                    continue
+                names.add(name)
+                if lib in seen:
+                    continue
+                seen.add(lib)
+                deps.append(lib)
+                lib_info = self.elf(lib)
+                if lib_info is not None:
+                    queue.append((lib, lib_info, inherited))
+        if info.interp and info.interp not in seen:
+            deps.append(info.interp)
+        return deps, missing
+
+    def closure(self, paths):
+        """return union of binaries and their libraries.
+
+        Every file is listed once, in the order it was met.
+        Return (files, redundant) where redundant is how many
+          times an already listed file was requested again.
+
+        """
+        files = []
+        seen = set()
+        redundant = 0
+        for path in paths:
+            for p in [path] + self.dependencies(path):
+                if p in seen:
+                    redundant += 1
+                    continue
+                seen.add(p)
+                files.append(p)
+        return files, redundant
+
+
+if __name__ == "__main__":
+    resolver = Resolver()
+    for name in sys.argv[1:]:
+        binary_path = resolver.which(name)
+        if not binary_path:
+            print("%s does not exists!" % name)
+            continue
+        print(binary_path)
+        for library_path in resolver.dependencies(binary_path):
+            print("\t" + library_path)
+    for name in sorted(resolver.missing):
+        print("%s => not found" % name)
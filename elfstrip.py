@@ -0,0 +1,266 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# NOTE: copy ELF file without debug sections and symbol table,
+# the host file is only read:
+"""from elfstrip import strip_file
+saved = strip_file('/usr/lib/libLLVM.so.1', '/srv/chroot/usr/lib/libLLVM.so.1')"""
+
+import os
+import shutil
+import struct
+import tempfile
+
+# elf.h
+ET_EXEC = 2
+ET_DYN = 3
+
+SHT_RELA = 4
+SHT_NOBITS = 8
+SHT_REL = 9
+
+SHF_ALLOC = 0x2
+SHF_INFO_LINK = 0x40
+
+SHN_LORESERVE = 0xff00
+
+# elfclass: (ehdr, phdr, shdr formats, phdr offset and filesz fields)
+formats = {
+    1: ('HHIIIIIHHHHHH', 'IIIIIIII', 'IIIIIIIIII', 1, 4),
+    2: ('HHIQQQIHHHHHH', 'IIQQQQQQ', 'IIQQQQIIQQ', 2, 5),
+}
+
+
+def removable(name):
+    """debug info and the static symbol table."""
+    return name.startswith(('.debug_', '.zdebug_')) or \
+        name in ('.symtab', '.strtab')
+
+
+def layout(f):
+    """plan copy of ELF file without its debug sections.
+
+    See _layout(); truncated headers are not stripped either.
+
+    """
+    try:
+        return _layout(f)
+    except struct.error:
+        return None
+
+
+def _layout(f):
+    """plan copy of ELF file without its debug sections.
+
+    Only non-allocated sections placed after everything
+      that is loaded are removed; the loaded part is copied
+      byte for byte, kept sections behind it are moved up
+      and a new section header table is written at the end.
+    Return (pieces, size) where pieces are (offset, length)
+      ranges of the file or bytes, or None when the file
+      is not an executable or shared library,
+      or nothing can be removed safely.
+
+    """
+    f.seek(0)
+    ident = f.read(16)
+    if len(ident) < 16 or ident[:4] != b'\x7fELF':
+        return None
+    if ident[4] not in formats or ident[5] not in (1, 2):
+        return None
+    order = '<' if ident[5] == 1 else '>'
+    efmt, pfmt, sfmt, p_offset, p_filesz = formats[ident[4]]
+    efmt, pfmt, sfmt = order + efmt, order + pfmt, order + sfmt
+    ehdr = list(struct.unpack(efmt, f.read(struct.calcsize(efmt))))
+    (e_type, _, _, _, phoff, shoff, _, ehsize,
+     phentsize, phnum, shentsize, shnum, shstrndx) = ehdr
+    if e_type not in (ET_EXEC, ET_DYN):
+        return None
+    if not shoff or not shnum or shstrndx >= SHN_LORESERVE or \
+            shentsize != struct.calcsize(sfmt):
+        return None
+    f.seek(shoff)
+    raw = f.read(shnum * shentsize)
+    if len(raw) != shnum * shentsize:
+        return None
+    sections = [
+        list(struct.unpack_from(sfmt, raw, i * shentsize))
+        for i in range(shnum)
+    ]
+    f.seek(sections[shstrndx][4])
+    strtab = f.read(sections[shstrndx][5])
+
+    def name(s):
+        return strtab[s[0]:strtab.find(b'\0', s[0])].decode('ascii', 'replace')
+
+    # everything loaded or allocated stays where it is
+    end = max(ehsize, phoff + phnum * phentsize)
+    f.seek(phoff)
+    for _ in range(phnum):
+        p = struct.unpack(pfmt, f.read(phentsize)[:struct.calcsize(pfmt)])
+        end = max(end, p[p_offset] + p[p_filesz])
+    for s in sections:
+        if s[2] & SHF_ALLOC and s[1] != SHT_NOBITS:
+            end = max(end, s[4] + s[5])
+
+    removed = set()
+    for i, s in enumerate(sections):
+        if i and not s[2] & SHF_ALLOC and removable(name(s)):
+            if s[1] != SHT_NOBITS and s[4] < end:
+                return None
+            removed.add(i)
+    if not removed:
+        return None
+    index = {}
+    for i in range(shnum):
+        if i not in removed:
+            index[i] = len(index)
+    for i in index:
+        s = sections[i]
+        if s[6] in removed:
+            return None
+        if (s[1] in (SHT_REL, SHT_RELA) or s[2] & SHF_INFO_LINK) and \
+                s[7] in removed:
+            return None
+
+    # kept sections behind the loaded part move up
+    size = end
+    pieces = [(0, end)]
+    for i in sorted(index, key=lambda i: sections[i][4]):
+        s = sections[i]
+        if not i or s[4] < end:
+            continue
+        if s[1] == SHT_NOBITS:
+            s[4] = size
+            continue
+        pad = -size % max(s[8], 1)
+        if pad:
+            pieces.append(b'\0' * pad)
+            size += pad
+        pieces.append((s[4], s[5]))
+        s[4] = size
+        size += s[5]
+    pad = -size % (8 if ident[4] == 2 else 4)
+    if pad:
+        pieces.append(b'\0' * pad)
+        size += pad
+
+    table = []
+    for i in sorted(index):
+        s = sections[i]
+        s[6] = index.get(s[6], 0)
+        if s[1] in (SHT_REL, SHT_RELA) or s[2] & SHF_INFO_LINK:
+            s[7] = index.get(s[7], 0)
+        table.append(struct.pack(sfmt, *s))
+    ehdr[5] = size
+    ehdr[11] = len(index)
+    ehdr[12] = index[shstrndx]
+    header = ident + struct.pack(efmt, *ehdr)
+    pieces[0] = header
+    pieces.insert(1, (len(header), end - len(header)))
+    pieces.append(b''.join(table))
+    return pieces, size + len(table) * shentsize
+
+
+def write(pieces, sfd, dfd):
+    """write planned pieces of sfd to dfd at its current position."""
+    for piece in pieces:
+        if isinstance(piece, bytes):
+            view = memoryview(piece)
+            while view:
+                view = view[os.write(dfd, view):]
+            continue
+        offset, left = piece
+        while left > 0:
+            n = os.sendfile(dfd, sfd, offset, left)
+            if n == 0:
+                raise IOError("file shrank while stripping")
+            offset += n
+            left -= n
+
+
+def strip_file(src, dst):
+    """copy src to dst without debug sections and keep metadata.
+
+    The copy is written next to dst and renamed over it,
+      so a dst hardlinked to the host or to a store object
+      is never written through.
+    Return number of bytes saved, or None if src can not
+      be stripped; then dst is not touched.
+      Errors of reading and writing are raised.
+
+    """
+    with open(src, 'rb') as f:
+        plan = layout(f)
+        if plan is None:
+            return None
+        pieces, size = plan
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(dst) or '.',
+            prefix='.%s.' % os.path.basename(dst)
+        )
+        try:
+            try:
+                write(pieces, f.fileno(), fd)
+            finally:
+                os.close(fd)
+            saved = os.fstat(f.fileno()).st_size - size
+            shutil.copystat(src, tmp)
+            os.replace(tmp, dst)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+    return saved
+
+
+class StrippedReader(object):
+    """file object reading planned pieces, for archives."""
+
+    def __init__(self, f, pieces):
+        self._f = f
+        self._pieces = list(pieces)
+        self._buf = b''
+
+    def read(self, n=-1):
+        while (n < 0 or len(self._buf) < n) and self._pieces:
+            piece = self._pieces.pop(0)
+            if isinstance(piece, bytes):
+                self._buf += piece
+                continue
+            offset, length = piece
+            step = min(length, 1024 * 1024)
+            self._f.seek(offset)
+            self._buf += self._f.read(step)
+            if length > step:
+                self._pieces.insert(0, (offset + step, length - step))
+        if n < 0:
+            n = len(self._buf)
+        data, self._buf = self._buf[:n], self._buf[n:]
+        return data
+
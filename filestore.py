@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# NOTE: keep libraries of many containers once on the host:
+"""lxc-create -t bin2lxc -n skype -- -b skype --gui --store /var/lib/lxc/.store
+python filestore.py stats /var/lib/lxc/.store
+"""
+
+import os
+import sys
+import mmap
+import stat
+import errno
+import hashlib
+import argparse
+import tempfile
+import threading
+
+from fscopy import copy_file, link_file
+
+BLOCK_SIZE = 1024 * 1024
+
+
+def file_hash(path):
+    """return sha256 hex digest of file content.
+
+    Files are mapped instead of read, so no copies are made
+      and hashlib works on the pages without the GIL;
+      empty and unmappable files are read.
+
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                h.update(m)
+            return h.hexdigest()
+        except (ValueError, OSError):
+            pass
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class HashCache(object):
+    """file_hash results shared by stores and manifests.
+
+    Entries are keyed by inode and change time of the file,
+      so they stay valid while the file is not changed
+      and one cache can serve many builds.
+
+    """
+
+    def __init__(self):
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def hash(self, src, st=None):
+        if st is None:
+            st = os.stat(src)
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(key)
+        if digest is None:
+            digest = file_hash(src)
+            with self._lock:
+                self._hashes[key] = digest
+        return digest
+
+
+class FileStore(object):
+    """content addressed store of files shared by rootfs trees.
+
+    Every unique file is kept once as objects/<xx>/<sha256>-<mode>
+      and placed into rootfs trees as a hardlink,
+      or as a reflink when reflink is True.
+    Hardlinked entries share the inode, so objects keep
+      the owner of the host file and are never chowned:
+      one container can not change files of another one.
+    Objects are never opened for writing, entries are replaced
+      by copy_file and link_file instead, and add() checks
+      the content of an object before it is reused.
+    The store has to be on the same filesystem as rootfs trees,
+      otherwise entries are copied from it.
+
+    """
+
+    def __init__(self, root, reflink=False, hashes=None):
+        self.root = root
+        self.reflink = reflink
+        self.hashes = hashes or HashCache()
+        objects = os.path.join(root, 'objects')
+        if not os.path.exists(objects):
+            os.makedirs(objects)
+
+    def hash(self, src, st):
+        """cached file_hash, valid while the file is not changed."""
+        return self.hashes.hash(src, st)
+
+    def object_path(self, digest, mode):
+        return os.path.join(
+            self.root, 'objects', digest[:2],
+            '%s-%o' % (digest, stat.S_IMODE(mode))
+        )
+
+    def add(self, src):
+        """put file into the store and return path of its object.
+
+        An existing object is used only if it still has the content
+          its name promises; one that was written through
+          is replaced with a fresh copy of src.
+
+        """
+        st = os.stat(src)
+        digest = self.hash(src, st)
+        obj = self.object_path(digest, st.st_mode)
+        try:
+            if self.hash(obj, os.stat(obj)) == digest:
+                return obj
+            broken = True
+        except FileNotFoundError:
+            broken = False
+        d = os.path.dirname(obj)
+        if not os.path.exists(d):
+            try:
+                os.mkdir(d)
+            except FileExistsError:
+                pass
+        fd, tmp = tempfile.mkstemp(dir=d, prefix='.tmp-')
+        os.close(fd)
+        try:
+            copy_file(src, tmp, 'auto')
+            if broken:
+                os.rename(tmp, obj)
+                return obj
+            # link does not replace existing object
+            # if another thread was faster
+            try:
+                os.link(tmp, obj)
+            except FileExistsError:
+                pass
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        return obj
+
+    def link(self, src, dst):
+        """place src into rootfs as dst through the store.
+
+        dst is always replaced, objects are only read.
+
+        """
+        obj = self.add(src)
+        if self.reflink:
+            copy_file(obj, dst, 'auto')
+            return obj
+        try:
+            link_file(obj, dst)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            copy_file(obj, dst, 'auto')
+        return obj
+
+    def objects(self):
+        objects = os.path.join(self.root, 'objects')
+        for d in sorted(os.listdir(objects)):
+            for name in sorted(os.listdir(os.path.join(objects, d))):
+                if not name.startswith('.'):
+                    yield os.path.join(objects, d, name)
+
+    def stats(self):
+        """return dict with dedup statistics.
+
+        Every hardlink besides the object itself is a rootfs entry,
+          reflinked entries are not visible here.
+
+        """
+        result = {
+            'objects': 0, 'unused': 0, 'entries': 0,
+            'bytes': 0, 'logical_bytes': 0,
+        }
+        for obj in self.objects():
+            st = os.lstat(obj)
+            refs = st.st_nlink - 1
+            result['objects'] += 1
+            result['entries'] += refs
+            result['bytes'] += st.st_size
+            result['logical_bytes'] += st.st_size * refs
+            if not refs:
+                result['unused'] += 1
+        result['saved_bytes'] = max(
+            result['logical_bytes'] - result['bytes'], 0
+        )
+        result['ratio'] = (
+            float(result['logical_bytes']) / result['bytes']
+            if result['bytes'] else 0.0
+        )
+        return result
+
+    def gc(self):
+        """remove objects which are not used by any rootfs."""
+        removed = 0
+        for obj in self.objects():
+            if os.lstat(obj).st_nlink == 1:
+                os.unlink(obj)
+                removed += 1
+        return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Show dedup statistics of a bin2lxc file store \
+        or remove objects that no rootfs uses'
+    )
+    parser.add_argument(
+        'command',
+        choices=('stats', 'gc'),
+        help='what to do'
+    )
+    parser.add_argument(
+        'store',
+        action='store',
+        help='store directory'
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(os.path.join(args.store, 'objects')):
+        print("%s is not a store!" % args.store)
+        sys.exit(1)
+    store = FileStore(args.store)
+
+    if args.command == 'gc':
+        print("%d objects removed" % store.gc())
+    else:
+        s = store.stats()
+        print("objects:      %d (%d unused)" % (s['objects'], s['unused']))
+        print("entries:      %d" % s['entries'])
+        print("stored bytes: %d" % s['bytes'])
+        print("rootfs bytes: %d" % s['logical_bytes'])
+        print("saved bytes:  %d" % s['saved_bytes'])
+        print("dedup ratio:  %.2f" % s['ratio'])
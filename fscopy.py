@@ -0,0 +1,535 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import os
+import re
+import glob
+import time
+import errno
+import fcntl
+import shutil
+import fnmatch
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from elfstrip import strip_file
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+COPY_MODES = ('copy', 'reflink', 'copy_file_range', 'hardlink', 'auto')
+"""Values for --copy-mode"""
+
+AUTO_MODES = ('reflink', 'copy_file_range', 'copy')
+"""Modes tried by 'auto', fastest first"""
+
+# errors meaning that the filesystem can not do it
+UNSUPPORTED = (
+    errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV,
+    errno.EINVAL, errno.ENOSYS, errno.EBADF,
+)
+
+
+# glob characters in -c entries
+MAGIC = re.compile(r'[*?[]')
+
+
+def split_list(value):
+    """split comma separated list, keeping {a,b} patterns together."""
+    items = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(value):
+        if c == '{':
+            depth += 1
+        elif c == '}' and depth:
+            depth -= 1
+        elif c == ',' and not depth:
+            items.append(value[start:i])
+            start = i + 1
+    items.append(value[start:])
+    return [i for i in items if i]
+
+
+def expand_braces(pattern):
+    """expand shell braces: a{b,c}d is abd and acd."""
+    m = re.search(r'\{([^{}]*)\}', pattern)
+    if m is None:
+        return [pattern]
+    result = []
+    for alt in m.group(1).split(','):
+        result += expand_braces(pattern[:m.start()] + alt + pattern[m.end():])
+    return result
+
+
+def select(configs):
+    """expand config patterns.
+
+    Entries may use glob and {a,b} patterns,
+      entries starting with ! exclude matching paths
+      from copying of the others.
+    Patterns matching nothing are returned as is,
+      so they are reported like missing paths.
+    Return (paths, exclude).
+
+    """
+    paths = []
+    exclude = []
+    for c in configs:
+        if c.startswith('!'):
+            exclude += [os.path.normpath(e) for e in expand_braces(c[1:])]
+            continue
+        for p in expand_braces(c):
+            if MAGIC.search(p):
+                paths += sorted(glob.glob(p)) or [p]
+            else:
+                paths.append(p)
+    paths = [p for p in paths if not excluded(p, exclude)]
+    return paths, exclude
+
+
+def excluded(path, exclude):
+    """check path against exclude patterns from select()."""
+    for pattern in exclude:
+        if fnmatch.fnmatchcase(path, pattern):
+            return True
+    return False
+
+
+def walk(top, exclude=(), onerror=None, _real=None, _seen=None):
+    """walk directory tree with scandir.
+
+    Yield (path, kind, target) with kind 'dir', 'file' or 'link'
+      for top and everything below it, parents first.
+    Entry types come from scandir, so no stat is needed
+      for plain files and directories.
+    Symlinks pointing inside the tree are kept as links,
+      others are followed, so the copy does not dangle;
+      links back into a directory already walked are kept
+      too, so cycles end and nothing is copied twice.
+    Errors are passed to onerror(path, error) and skipped.
+
+    """
+    real = _real or os.path.realpath(top)
+    if _seen is None:
+        _seen = set()
+    yield top, 'dir', None
+    try:
+        st = os.stat(top)
+        _seen.add((st.st_dev, st.st_ino))
+        entries = sorted(os.scandir(top), key=lambda e: e.name)
+    except OSError as e:
+        if onerror is not None:
+            onerror(top, e)
+        return
+    for entry in entries:
+        path = entry.path
+        if exclude and excluded(path, exclude):
+            continue
+        try:
+            if entry.is_symlink():
+                resolved = os.path.realpath(path)
+                if resolved == real or resolved.startswith(real + '/') or \
+                        not os.path.exists(path):
+                    yield path, 'link', os.readlink(path)
+                elif os.path.isdir(path):
+                    st = os.stat(path)
+                    if (st.st_dev, st.st_ino) in _seen:
+                        yield path, 'link', os.readlink(path)
+                        continue
+                    for item in walk(path, exclude, onerror, resolved, _seen):
+                        yield item
+                elif os.path.isfile(path):
+                    yield path, 'file', None
+            elif entry.is_dir(follow_symlinks=False):
+                for item in walk(path, exclude, onerror, real, _seen):
+                    yield item
+            elif entry.is_file(follow_symlinks=False):
+                yield path, 'file', None
+        except OSError as e:
+            if onerror is not None:
+                onerror(path, e)
+
+
+def covered(path, dirs):
+    """check that one of dirs is a parent of path."""
+    parent = os.path.dirname(path)
+    while True:
+        if parent in dirs:
+            return True
+        if parent == os.path.dirname(parent):
+            return False
+        parent = os.path.dirname(parent)
+
+
+def unique(files, configs):
+    """drop paths that would be copied more than once.
+
+    Configs may be files or whole directories; everything
+      below a directory config is copied with it,
+      so such files and configs are dropped.
+    Return (files, configs, redundant) where redundant
+      is the number of dropped paths.
+
+    """
+    configs = [os.path.normpath(c) for c in configs if c]
+    dirs = set(c for c in configs if os.path.isdir(c))
+    redundant = 0
+
+    new_configs = []
+    seen = set()
+    for c in configs:
+        if c in seen or covered(c, dirs):
+            redundant += 1
+            continue
+        seen.add(c)
+        new_configs.append(c)
+
+    new_files = []
+    for f in files:
+        if f in seen or covered(f, dirs):
+            redundant += 1
+            continue
+        new_files.append(f)
+
+    return new_files, new_configs, redundant
+
+
+def _copy_data(sfd, dfd, size, copy_range=False):
+    """copy data between file descriptors and keep holes.
+
+    Only data extents reported by SEEK_DATA/SEEK_HOLE are copied,
+      the tail is set by ftruncate, so sparse files stay sparse.
+
+    """
+    pos = 0
+    while pos < size:
+        try:
+            start = os.lseek(sfd, pos, os.SEEK_DATA)
+            end = os.lseek(sfd, start, os.SEEK_HOLE)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # only a hole is left
+                break
+            if e.errno != errno.EINVAL:
+                raise
+            start, end = pos, size
+        while start < end:
+            if copy_range:
+                n = os.copy_file_range(
+                    sfd, dfd, end - start,
+                    offset_src=start, offset_dst=start
+                )
+            else:
+                os.lseek(dfd, start, os.SEEK_SET)
+                n = os.sendfile(dfd, sfd, start, end - start)
+            if n == 0:
+                # file was truncated while copying
+                end = start
+                break
+            start += n
+        pos = end
+    os.ftruncate(dfd, size)
+
+
+def copy_file(src, dst, mode='copy', cache=None):
+    """copy file data and metadata like shutil.copy2.
+
+    mode is 'copy', 'reflink' or 'copy_file_range';
+      'auto' tries AUTO_MODES in turn and, if cache dict
+      is given, remembers what works per pair of filesystems.
+    Data goes to a new file next to dst, which then replaces it,
+      so a dst hardlinked to the host or to a store object
+      is never written through.
+    Return the mode that was used.
+
+    """
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(dst) or '.',
+        prefix='.%s.' % os.path.basename(dst)
+    )
+    try:
+        with os.fdopen(fd, 'wb') as fdst, open(src, 'rb') as fsrc:
+            sfd = fsrc.fileno()
+            dfd = fdst.fileno()
+            st = os.fstat(sfd)
+            modes = (mode,)
+            if mode == 'auto':
+                key = (st.st_dev, os.fstat(dfd).st_dev)
+                if cache is not None and key in cache:
+                    modes = AUTO_MODES[AUTO_MODES.index(cache[key]):]
+                else:
+                    modes = AUTO_MODES
+            for m in modes:
+                try:
+                    if m == 'reflink':
+                        fcntl.ioctl(dfd, FICLONE, sfd)
+                    else:
+                        _copy_data(
+                            sfd, dfd, st.st_size, m == 'copy_file_range'
+                        )
+                    break
+                except OSError as e:
+                    if m == modes[-1] or e.errno not in UNSUPPORTED:
+                        raise
+                    os.ftruncate(dfd, 0)
+            if mode == 'auto' and cache is not None:
+                cache[key] = m
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return m
+
+
+def link_file(src, dst):
+    """hardlink src to dst, replacing dst."""
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        os.unlink(dst)
+        os.link(src, dst)
+
+
+class Copier(object):
+    """copy files and directories with metadata and permission bits.
+
+    Directories are walked and created in the calling thread,
+      files are copied by a pool of `jobs` threads.
+    Everything created is chowned to uid:gid when they are given,
+      by the same thread that creates it.
+    Errors do not stop the copying, they are collected
+      and returned by wait().
+    Files are copied according to mode from COPY_MODES;
+      hardlinks share inodes with the host,
+      so they are never chowned.
+    With a FileStore files are placed through the store instead.
+    With a Manifest up to date files are skipped
+      and copied ones are recorded.
+    With a Profiler every copy is timed.
+    Paths matching exclude patterns are not copied,
+      symlinks inside copied directories are kept.
+    A pool given by the caller is reused and left running,
+      so many builds can share the threads.
+    With strip ELF files are copied without debug sections,
+      stripped and saved count them; stored and hardlinked
+      files share data with the host, so they are not stripped.
+
+    """
+
+    def __init__(self, jobs=1, uid=None, gid=None, mode='copy', store=None,
+                 manifest=None, profile=None, exclude=(), pool=None,
+                 strip=False):
+        self.jobs = jobs
+        self.strip = strip
+        self.stripped = 0
+        self.saved = 0
+        self.exclude = exclude
+        self.mode = mode
+        self.store = store
+        self.manifest = manifest
+        self.profile = profile
+        self.uid = uid
+        self.gid = gid
+        self.errors = []
+        self._dirs = set()
+        self._dirstats = []
+        self._futures = []
+        self._modes = {}
+        self._pool = pool
+        self._own_pool = False
+        self._lock = threading.Lock()
+        if pool is None and jobs > 1:
+            self._pool = ThreadPoolExecutor(max_workers=jobs)
+            self._own_pool = True
+
+    def chown(self, path):
+        if self.uid is not None or self.gid is not None:
+            os.lchown(
+                path,
+                -1 if self.uid is None else self.uid,
+                -1 if self.gid is None else self.gid
+            )
+
+    def makedirs(self, path):
+        """create directory and missing parents once."""
+        if path in self._dirs:
+            return
+        missing = []
+        while path not in self._dirs and not os.path.isdir(path):
+            missing.append(path)
+            path = os.path.dirname(path)
+        self._dirs.add(path)
+        for d in reversed(missing):
+            try:
+                os.mkdir(d)
+            except FileExistsError:
+                pass
+            self.chown(d)
+            self._dirs.add(d)
+
+    def mkdir(self, src, dst):
+        """create dst like directory src, its mode is applied by wait()."""
+        self.makedirs(dst)
+        self.chown(dst)
+        self._dirstats.append((src, dst))
+
+    def symlink(self, target, dst):
+        """create symlink, replacing anything else at dst."""
+        try:
+            if os.readlink(dst) == target:
+                return
+            os.unlink(dst)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            os.unlink(dst)
+        os.symlink(target, dst)
+        self.chown(dst)
+        if self.manifest is not None:
+            # links are not tracked, the old file must not go stale
+            self.manifest.discard(dst)
+
+    def copy(self, src, dst):
+        """copy file or directory.
+
+        Copy file or directory with metadata
+          and permission bits.
+
+        """
+        if self.exclude and excluded(src, self.exclude):
+            return
+        try:
+            if os.path.isfile(src):
+                self.makedirs(os.path.dirname(dst))
+                self._submit(src, dst)
+            elif os.path.isdir(src):
+                def onerror(path, e):
+                    self.errors.append((path, dst + path[len(src):], e))
+                for path, kind, target in walk(src, self.exclude, onerror):
+                    d = dst + path[len(src):]
+                    try:
+                        if kind == 'dir':
+                            self.mkdir(path, d)
+                        elif kind == 'link':
+                            self.symlink(target, d)
+                        else:
+                            self._submit(path, d)
+                    except (IOError, OSError) as e:
+                        self.errors.append((path, d, e))
+        except (IOError, OSError) as e:
+            self.errors.append((src, dst, e))
+
+    def _submit(self, src, dst):
+        if self._pool is None:
+            self._copy_file(src, dst)
+        else:
+            self._futures.append(
+                self._pool.submit(self._copy_file, src, dst)
+            )
+
+    def copyfiles(self, pairs):
+        """copy batch of (src, dst) files as one job.
+
+        Small files are cheaper to copy in batches
+          than to hand to the pool one by one.
+
+        """
+        for src, dst in pairs:
+            self.makedirs(os.path.dirname(dst))
+        if self._pool is None:
+            self._copy_batch(pairs)
+        else:
+            self._futures.append(self._pool.submit(self._copy_batch, pairs))
+
+    def _copy_batch(self, pairs):
+        for src, dst in pairs:
+            self._copy_file(src, dst)
+
+    def _copy_file(self, src, dst):
+        try:
+            start = time.monotonic()
+            st = None
+            digest = None
+            if self.manifest is not None:
+                st = os.stat(src)
+                if self.manifest.current(src, dst, st):
+                    return
+            if self.store is not None:
+                obj = self.store.link(src, dst)
+                digest = os.path.basename(obj).split('-')[0]
+            elif self.mode == 'hardlink':
+                link_file(src, dst)
+            else:
+                saved = None
+                if self.strip:
+                    saved = strip_file(src, dst)
+                if saved is None:
+                    copy_file(src, dst, self.mode, self._modes)
+                else:
+                    with self._lock:
+                        self.stripped += 1
+                        self.saved += saved
+                self.chown(dst)
+            if self.manifest is not None:
+                self.manifest.add(src, dst, st, digest)
+            if self.profile is not None:
+                size = (st or os.stat(src)).st_size
+                self.profile.copied(src, dst, time.monotonic() - start, size)
+        except (IOError, OSError, shutil.Error) as e:
+            if self.manifest is not None:
+                self.manifest.discard(dst)
+            self.errors.append((src, dst, e))
+
+    def wait(self):
+        """wait for all copies and return list of (src, dst, error)."""
+        for future in self._futures:
+            future.result()
+        self._futures = []
+        # directory modes go last, so read-only
+        # directories do not block their content
+        for src, dst in reversed(self._dirstats):
+            try:
+                shutil.copystat(src, dst)
+            except (IOError, OSError) as e:
+                self.errors.append((src, dst, e))
+        self._dirstats = []
+        return self.errors
+
+    def close(self):
+        errors = self.wait()
+        if self._own_pool:
+            self._pool.shutdown()
+        self._pool = None
+        return errors
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import os
+import json
+import threading
+
+from filestore import file_hash
+
+VERSION = 1
+
+
+def manifest_path(rootfs):
+    """manifest lives next to rootfs, not inside it."""
+    return rootfs.rstrip('/') + '.manifest'
+
+
+class Manifest(object):
+    """record of files placed into rootfs.
+
+    For every file the source path, size, mtime, inode, mode
+      and sha256 are kept, so the next build copies only
+      changed or missing files and removes stale ones.
+    Changed metadata with the same size falls back
+      to comparing hashes.
+    Size and mtime of the rootfs copy are kept too, a copy
+      modified in rootfs is placed again; when the copy differs
+      from its source (stripped) its own sha256 is kept.
+    variant names how files were transformed while copying
+      (like 'strip'), when it changes everything is copied again.
+    generated are rootfs paths of files written from the plan,
+      like /sbin/init, which have no host source.
+
+    """
+
+    def __init__(self, rootfs, path=None, hashes=None, variant=None):
+        self.rootfs = rootfs.rstrip('/')
+        self.hashes = hashes
+        self.variant = variant
+        self.changed = False
+        self.path = path or manifest_path(rootfs)
+        self.files = {}
+        self.generated = []
+        self.seen = set()
+        self.unchanged = 0
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('version') == VERSION:
+                self.files = data['files']
+                self.generated = data.get('generated', [])
+                self.changed = data.get('variant') != variant
+
+    def key(self, dst):
+        return dst[len(self.rootfs):]
+
+    def current(self, src, dst, st):
+        """check that dst is an up to date copy of src."""
+        key = self.key(dst)
+        with self._lock:
+            self.seen.add(key)
+            e = self.files.get(key)
+        if e is None or self.changed or e['src'] != src or \
+                e['mode'] != st.st_mode:
+            return False
+        try:
+            dst_st = os.lstat(dst)
+        except FileNotFoundError:
+            return False
+        if (e.get('dst_size'), e.get('dst_mtime')) != (
+                dst_st.st_size, dst_st.st_mtime_ns):
+            return False
+        if (e['size'], e['mtime'], e['ino'], e['dev']) != (
+                st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev):
+            if e['size'] != st.st_size or e['sha256'] != self.hash(src, st):
+                return False
+            # touched or reinstalled with the same content
+            self.add(src, dst, st, e['sha256'], e.get('dst_sha256'))
+        with self._lock:
+            self.unchanged += 1
+        return True
+
+    def add(self, src, dst, st=None, digest=None, dst_digest=None):
+        """record that src was placed into rootfs as dst."""
+        if st is None:
+            st = os.stat(src)
+        if digest is None:
+            digest = self.hash(src, st)
+        dst_st = os.lstat(dst)
+        e = {
+            'src': src,
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns,
+            'ino': st.st_ino,
+            'dev': st.st_dev,
+            'mode': st.st_mode,
+            'sha256': digest,
+            'dst_size': dst_st.st_size,
+            'dst_mtime': dst_st.st_mtime_ns,
+        }
+        if dst_st.st_size != st.st_size:
+            e['dst_sha256'] = dst_digest or file_hash(dst)
+        key = self.key(dst)
+        with self._lock:
+            self.seen.add(key)
+            self.files[key] = e
+
+    def hash(self, src, st):
+        if self.hashes is not None:
+            return self.hashes.hash(src, st)
+        return file_hash(src)
+
+    def discard(self, dst):
+        """forget dst, so the next build copies it again."""
+        with self._lock:
+            self.files.pop(self.key(dst), None)
+
+    def remove_stale(self):
+        """remove files which were not placed by this build."""
+        removed = []
+        for key in sorted(set(self.files) - self.seen):
+            try:
+                os.unlink(self.rootfs + key)
+            except FileNotFoundError:
+                pass
+            del self.files[key]
+            removed.append(key)
+        return removed
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(
+                {'version': VERSION, 'rootfs': self.rootfs,
+                 'variant': self.variant, 'files': self.files,
+                 'generated': self.generated},
+                f, indent=1, sort_keys=True
+            )
+        os.rename(tmp, self.path)
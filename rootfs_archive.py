@@ -0,0 +1,286 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# NOTE: ship chroot to another node without building it on disk:
+"""python bin2chroot.py -b bash,ls --archive - --compress xz | \
+ssh node 'mkdir /srv/chroot && tar -xJ -C /srv/chroot'
+"""
+
+import io
+import os
+import bz2
+import gzip
+import lzma
+import stat
+import tarfile
+
+from elfstrip import StrippedReader, layout
+from fscopy import excluded, walk
+
+FORMATS = ('tar', 'cpio')
+COMPRESSORS = ('none', 'gz', 'bz2', 'xz')
+
+BLOCK_SIZE = 1024 * 1024
+
+
+def compressed(fileobj, compress):
+    """wrap writable stream with streaming compressor."""
+    if compress == 'gz':
+        return gzip.GzipFile(fileobj=fileobj, mode='wb')
+    if compress == 'bz2':
+        return bz2.BZ2File(fileobj, 'wb')
+    if compress == 'xz':
+        return lzma.LZMAFile(fileobj, 'wb')
+    return fileobj
+
+
+class PaddedReader(object):
+    """read exactly size bytes of fileobj.
+
+    The header with the size is already written, so a file
+      which shrinks or fails to read is padded with zeros to
+      keep the stream valid; the problem is kept in error.
+
+    """
+
+    def __init__(self, fileobj, size, name):
+        self.fileobj = fileobj
+        self.left = size
+        self.name = name
+        self.error = None
+
+    def read(self, n=-1):
+        if n < 0 or n > self.left:
+            n = self.left
+        data = b''
+        if self.error is None:
+            try:
+                data = self.fileobj.read(n)
+            except (IOError, OSError) as e:
+                self.error = e
+            if len(data) < n and self.error is None:
+                self.error = IOError(
+                    "%s: file shrank while archiving" % self.name
+                )
+        data += b'\0' * (n - len(data))
+        self.left -= n
+        return data
+
+
+class ArchiveWriter(object):
+    """write rootfs as a tar or cpio (newc) stream.
+
+    Nothing is created on disk: directories, device nodes
+      and links become archive headers and files are read
+      from the host straight into the stream,
+      so no root privileges are needed.
+    Paths are rootfs paths like '/usr/bin/ls'; missing parent
+      directories are added automatically.
+    Everything is owned by uid:gid in the archive.
+    Paths matching exclude patterns are left out.
+    With strip ELF files are added without debug sections.
+    A file which can not be read to the end is padded with
+      zeros and reported as error, the archive stays valid.
+
+    """
+
+    def __init__(self, fileobj, format='tar', compress='none', uid=0, gid=0,
+                 exclude=(), strip=False):
+        self.format = format
+        self.exclude = exclude
+        self.strip = strip
+        self.stripped = 0
+        self.saved = 0
+        self.uid = uid
+        self.gid = gid
+        self.files = 0
+        self.bytes = 0
+        self.errors = []
+        self._raw = fileobj
+        self._out = compressed(fileobj, compress)
+        self._dirs = set([''])
+        self._ino = 0
+        self._tar = None
+        if format == 'tar':
+            self._tar = tarfile.open(
+                fileobj=self._out, mode='w|', format=tarfile.GNU_FORMAT
+            )
+
+    def _name(self, path):
+        return os.path.normpath(path).lstrip('/')
+
+    def _parents(self, name):
+        parent = os.path.dirname(name)
+        if parent not in self._dirs:
+            self._parents(parent)
+            self._add(parent, stat.S_IFDIR | 0o755)
+            self._dirs.add(parent)
+
+    def _add(self, name, mode, size=0, mtime=0, fileobj=None,
+             target='', rdev=(0, 0)):
+        reader = None
+        if fileobj is not None:
+            reader = fileobj = PaddedReader(fileobj, size, name)
+        self._add_entry(name, mode, size, mtime, fileobj, target, rdev)
+        if reader is not None and reader.error is not None:
+            raise reader.error
+
+    def _add_entry(self, name, mode, size, mtime, fileobj, target, rdev):
+        if self._tar is not None:
+            info = tarfile.TarInfo(name)
+            info.mode = stat.S_IMODE(mode)
+            info.uid = self.uid
+            info.gid = self.gid
+            info.mtime = mtime
+            if stat.S_ISDIR(mode):
+                info.type = tarfile.DIRTYPE
+            elif stat.S_ISLNK(mode):
+                info.type = tarfile.SYMTYPE
+                info.linkname = target
+            elif stat.S_ISCHR(mode) or stat.S_ISBLK(mode):
+                info.type = (tarfile.CHRTYPE if stat.S_ISCHR(mode)
+                             else tarfile.BLKTYPE)
+                info.devmajor, info.devminor = rdev
+            else:
+                info.size = size
+            self._tar.addfile(info, fileobj)
+            return
+        # cpio newc
+        data = b''
+        if stat.S_ISLNK(mode):
+            data = target.encode()
+            size = len(data)
+        self._ino += 1
+        name = name.encode() + b'\0'
+        header = b'070701' + b''.join(b'%08X' % v for v in (
+            self._ino, mode, self.uid, self.gid,
+            2 if stat.S_ISDIR(mode) else 1,
+            int(mtime), size, 0, 0, rdev[0], rdev[1], len(name), 0,
+        ))
+        self._write(header + name + self._pad(len(header) + len(name)))
+        if data:
+            self._write(data)
+        elif fileobj is not None:
+            left = size
+            while left > 0:
+                block = fileobj.read(min(BLOCK_SIZE, left))
+                self._write(block)
+                left -= len(block)
+        self._write(self._pad(size))
+
+    def _pad(self, size):
+        return b'\0' * (-size % 4)
+
+    def _write(self, data):
+        self._out.write(data)
+
+    def add_dir(self, path, mode=0o755, mtime=0):
+        name = self._name(path)
+        if name in self._dirs:
+            return
+        self._parents(name)
+        self._add(name, stat.S_IFDIR | stat.S_IMODE(mode), mtime=mtime)
+        self._dirs.add(name)
+
+    def add_node(self, path, mode, major, minor):
+        name = self._name(path)
+        self._parents(name)
+        self._add(name, mode, rdev=(major, minor))
+
+    def add_symlink(self, path, target):
+        name = self._name(path)
+        self._parents(name)
+        self._add(name, stat.S_IFLNK | 0o777, target=target)
+
+    def add_data(self, path, data, mode=0o644):
+        """add file with given content."""
+        if not isinstance(data, bytes):
+            data = data.encode()
+        name = self._name(path)
+        self._parents(name)
+        self._add(name, stat.S_IFREG | mode, len(data), fileobj=io.BytesIO(data))
+        self.files += 1
+        self.bytes += len(data)
+
+    def add_file(self, src, path):
+        """add host file src as path, following symlinks like copy do."""
+        name = self._name(path)
+        self._parents(name)
+        with open(src, 'rb') as f:
+            st = os.fstat(f.fileno())
+            size = st.st_size
+            fileobj = f
+            pieces = layout(f) if self.strip else None
+            if pieces is not None:
+                pieces, size = pieces
+                fileobj = StrippedReader(f, pieces)
+            f.seek(0)
+            self._add(
+                name, stat.S_IFREG | stat.S_IMODE(st.st_mode),
+                size, st.st_mtime, fileobj=fileobj
+            )
+        if pieces is not None:
+            self.stripped += 1
+            self.saved += st.st_size - size
+        self.files += 1
+        self.bytes += size
+
+    def add(self, src, path):
+        """add host file or directory tree, collecting errors."""
+        if self.exclude and excluded(src, self.exclude):
+            return
+        try:
+            if os.path.isfile(src):
+                self.add_file(src, path)
+            elif os.path.isdir(src):
+                def onerror(p, e):
+                    self.errors.append((p, path + p[len(src):], e))
+                for p, kind, target in walk(src, self.exclude, onerror):
+                    name = path + p[len(src):]
+                    try:
+                        if kind == 'dir':
+                            st = os.stat(p)
+                            self.add_dir(name, st.st_mode, st.st_mtime)
+                        elif kind == 'link':
+                            self.add_symlink(name, target)
+                        else:
+                            self.add_file(p, name)
+                    except (IOError, OSError) as e:
+                        self.errors.append((p, name, e))
+        except (IOError, OSError) as e:
+            self.errors.append((src, path, e))
+
+    def close(self):
+        if self._tar is not None:
+            self._tar.close()
+        else:
+            self._add('TRAILER!!!', 0)
+        if self._out is not self._raw:
+            self._out.close()
+        self._raw.flush()
+        return self.errors
+
@@ -0,0 +1,232 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# NOTE: build many containers in one process:
+"""from bin2lxc import LxcBuilder
+builder = LxcBuilder(jobs=8, store='/var/lib/lxc/.store')
+for name in names:
+    path = '/var/lib/lxc/' + name
+    builder.build(name, path + '/rootfs', path, binaries='ls,bash')
+builder.close()"""
+
+
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import skeleton
+from buildplan import Plan, apply
+from depindex import DEFAULT_INDEX, DependencyIndex, resolve_profile
+from elfdeps import Resolver
+from filestore import FileStore, HashCache
+from fscopy import Copier, select, split_list, unique
+from manifest import Manifest
+from rootfs_verify import Verifier
+
+
+class RootfsBuilder(object):
+    """build rootfs trees from host binaries, many in one process.
+
+    State that does not depend on a single build is kept
+      between builds: the resolver with its ELF and ld.so.cache
+      data, the dependency index, profile closures, file hashes,
+      the file store and the copy thread pool.
+    Subclasses give skeleton tables (structure, nodes, links,
+      files as in skeleton.spec) and add their own
+      configuration to the plan.
+    Problems that do not stop the build are passed to warn().
+    Plans are made one at a time, while apply() may run
+      for several plans in parallel threads.
+    With strip ELF files are copied without debug sections.
+
+    """
+
+    structure = []
+    nodes = []
+    links = []
+    files = []
+
+    def __init__(self, jobs=1, mode='copy', store=None, index=DEFAULT_INDEX,
+                 strip=False):
+        self.jobs = jobs
+        self.mode = mode
+        self.strip = strip
+        self.hashes = HashCache()
+        self.store = None
+        if store:
+            self.store = FileStore(
+                store, reflink=mode == 'reflink', hashes=self.hashes
+            )
+        self.index = None
+        if index:
+            try:
+                self.index = DependencyIndex(index)
+            except (OSError, sqlite3.Error) as e:
+                self.warn("can not open index %s: %s" % (index, e))
+        self.resolver = Resolver(index=self.index)
+        self.pool = None
+        if jobs > 1:
+            self.pool = ThreadPoolExecutor(max_workers=jobs)
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def warn(self, message):
+        print(message)
+
+    def profile(self, name, binaries, configs):
+        """closure of a profile, cached in the index or in memory."""
+        if self.index is not None:
+            return self.index.profile(name, binaries, configs, self.resolver)
+        if name not in self._profiles:
+            self._profiles[name] = resolve_profile(
+                binaries, configs, self.resolver, hashes=False
+            )
+        return self._profiles[name]
+
+    def resolve(self, binaries="", configs="", profiles=()):
+        """resolve everything first, so every file is copied once.
+
+        binaries and configs are comma separated like -b and -c,
+          profiles is list of (name, binaries, configs).
+        Return (files, configs, exclude, redundant).
+
+        """
+        resolver = self.resolver
+        resolver.missing = set()
+        profile_files = []
+        profile_configs = []
+        for name, profile_binaries, profile_config in profiles:
+            closure = self.profile(name, profile_binaries, profile_config)
+            for path in closure['not_found']:
+                self.warn("%s does not exists!" % path)
+            resolver.missing.update(closure['missing'])
+            profile_files += closure['files']
+            profile_configs += closure['configs']
+        binary_paths = []
+        for binary in binaries.split(","):
+            if not binary:
+                continue
+            binary_path = resolver.which(binary)
+            if not binary_path:
+                self.warn("%s does not exists!" % binary)
+                continue
+            binary_paths.append(binary_path)
+        files, redundant = resolver.closure(binary_paths)
+        seen = set(files)
+        for path in profile_files:
+            if path in seen:
+                redundant += 1
+                continue
+            seen.add(path)
+            files.append(path)
+        for library in sorted(resolver.missing):
+            self.warn("%s not found!" % library)
+
+        config_paths = []
+        config_list, exclude = select(split_list(configs))
+        for path in config_list:
+            if not os.path.exists(path):
+                self.warn("%s does not exists!" % path)
+                continue
+            config_paths.append(path)
+        files, config_paths, skipped = unique(
+            files, profile_configs + config_paths
+        )
+        return files, config_paths, exclude, redundant + skipped
+
+    def target(self, src):
+        """rootfs path of host file."""
+        return src
+
+    def new_plan(self, rootfs, uid=-1, gid=-1):
+        """plan with the rootfs skeleton."""
+        plan = Plan(rootfs, uid, gid)
+        plan.entries += skeleton.spec(
+            self.structure, self.nodes, self.links, self.files
+        )
+        return plan
+
+    def add_copies(self, plan, files, configs, exclude=()):
+        for path in files + configs:
+            plan.add_copy(path, self.target(path), exclude)
+        plan.summary['paths'] += len(files) + len(configs)
+
+    def apply(self, plan, name=None, profiler=None):
+        """apply plan, copying only files changed since the last build.
+
+        With a name the container is recorded in the index.
+        Stripped files and saved bytes go to plan.summary.
+        Return (errors, stale, unchanged).
+
+        """
+        manifest = Manifest(
+            plan.rootfs, hashes=self.hashes,
+            variant='strip' if self.strip else None
+        )
+        copier = Copier(
+            jobs=self.jobs, mode=self.mode, store=self.store,
+            manifest=manifest, profile=profiler, pool=self.pool,
+            strip=self.strip,
+            uid=None if plan.uid == -1 else plan.uid,
+            gid=None if plan.gid == -1 else plan.gid
+        )
+        errors = plan.errors + apply(plan, copier, profiler)
+        copier.close()
+        plan.summary['stripped'] = copier.stripped
+        plan.summary['saved'] = copier.saved
+        if profiler is not None:
+            profiler.start('finish')
+        stale = manifest.remove_stale()
+        manifest.generated = plan.generated()
+        manifest.save()
+        if self.index is not None and name:
+            with self._lock:
+                self.index.record_container(name, plan.rootfs, [
+                    (dst, e['src']) for dst, e in manifest.files.items()
+                ] + [(p, p) for p in plan.shared])
+        return errors, stale, manifest.unchanged
+
+    def verify(self, rootfs):
+        """compare rootfs with the host files it was built from.
+
+        Skeleton files and files the last build generated,
+          as recorded in its manifest, are skipped;
+          hashes and threads are shared with builds.
+        Return dict like Verifier.verify().
+
+        """
+        skip = [n[0] for n in self.nodes] + [f[0] for f in self.files]
+        verifier = Verifier(self.jobs, self.pool, self.hashes, skip)
+        return verifier.verify(rootfs)
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# NOTE: run the program once and print the files it really used
+# as bin2lxc/bin2chroot arguments:
+"""python rootfs_trace.py -- skype
+python rootfs_trace.py --json -o skype.json -- /usr/lib/firefox/firefox"""
+
+# NOTE: needs linux >= 5.3 for PTRACE_GET_SYSCALL_INFO
+
+import os
+import sys
+import json
+import ctypes
+import signal
+import struct
+import argparse
+import platform
+
+from elfdeps import Resolver, read_elf
+
+# sys/ptrace.h
+PTRACE_TRACEME = 0
+PTRACE_CONT = 7
+PTRACE_SYSCALL = 24
+PTRACE_SETOPTIONS = 0x4200
+PTRACE_GET_SYSCALL_INFO = 0x420e
+
+PTRACE_O_TRACESYSGOOD = 0x01
+PTRACE_O_TRACEFORK = 0x02
+PTRACE_O_TRACEVFORK = 0x04
+PTRACE_O_TRACECLONE = 0x08
+PTRACE_O_TRACEEXEC = 0x10
+PTRACE_O_TRACESECCOMP = 0x80
+PTRACE_O_EXITKILL = 0x100000
+
+PTRACE_EVENT_SECCOMP = 7
+
+PTRACE_SYSCALL_INFO_ENTRY = 1
+PTRACE_SYSCALL_INFO_EXIT = 2
+PTRACE_SYSCALL_INFO_SECCOMP = 3
+
+# linux/seccomp.h, linux/filter.h
+PR_SET_NO_NEW_PRIVS = 38
+SECCOMP_SET_MODE_FILTER = 1
+SECCOMP_RET_ALLOW = 0x7fff0000
+SECCOMP_RET_TRACE = 0x7ff00000
+BPF_LD_W_ABS = 0x20
+BPF_JEQ_K = 0x15
+BPF_RET_K = 0x06
+
+__WALL = 0x40000000
+AT_FDCWD = -100
+
+# machine: (audit arch, seccomp syscall,
+#   {syscall: (dirfd argument or None, path argument)})
+syscalls = {
+    'x86_64': (0xc000003e, 317, {
+        2: (None, 0),    # open
+        4: (None, 0),    # stat
+        6: (None, 0),    # lstat
+        21: (None, 0),   # access
+        59: (None, 0),   # execve
+        89: (None, 0),   # readlink
+        257: (0, 1),     # openat
+        262: (0, 1),     # newfstatat
+        267: (0, 1),     # readlinkat
+        269: (0, 1),     # faccessat
+        322: (0, 1),     # execveat
+        332: (0, 1),     # statx
+        437: (0, 1),     # openat2
+        439: (0, 1),     # faccessat2
+    }),
+    'aarch64': (0xc00000b7, 277, {
+        48: (0, 1),      # faccessat
+        56: (0, 1),      # openat
+        78: (0, 1),      # readlinkat
+        79: (0, 1),      # newfstatat
+        221: (None, 0),  # execve
+        281: (0, 1),     # execveat
+        291: (0, 1),     # statx
+        437: (0, 1),     # openat2
+        439: (0, 1),     # faccessat2
+    }),
+}
+execs = {
+    'x86_64': (59, 322),
+    'aarch64': (221, 281),
+}
+# open syscalls: {syscall: (flags argument, in struct open_how)}
+opens = {
+    'x86_64': {2: (1, False), 257: (2, False), 437: (2, True)},
+    'aarch64': {56: (2, False), 437: (2, True)},
+}
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_TRUNC
+
+# never part of a rootfs, lxc mounts or creates them
+virtual_dirs = ('/proc', '/sys', '/dev', '/run', '/tmp', '/var/tmp')
+# user data, never copied into a container
+private_dirs = ('/home', '/root')
+
+libc = ctypes.CDLL(None, use_errno=True)
+libc.ptrace.argtypes = [
+    ctypes.c_long, ctypes.c_long, ctypes.c_void_p, ctypes.c_void_p
+]
+libc.ptrace.restype = ctypes.c_long
+
+
+def ptrace(request, pid=0, addr=0, data=0):
+    """call ptrace(2), raise OSError on failure."""
+    ret = libc.ptrace(request, pid, addr, data)
+    if ret == -1:
+        e = ctypes.get_errno()
+        raise OSError(e, os.strerror(e))
+    return ret
+
+
+def seccomp_filter(arch, numbers):
+    """install seccomp filter that stops tracer only on numbers.
+
+    Everything else runs without leaving the kernel.
+    Return False if filter can not be installed.
+
+    """
+    ret_allow = struct.pack('HBBI', BPF_RET_K, 0, 0, SECCOMP_RET_ALLOW)
+    prog = [
+        struct.pack('HBBI', BPF_LD_W_ABS, 0, 0, 4),
+        struct.pack('HBBI', BPF_JEQ_K, 1, 0, arch),
+        ret_allow,
+        struct.pack('HBBI', BPF_LD_W_ABS, 0, 0, 0),
+    ]
+    numbers = sorted(numbers)
+    for i, nr in enumerate(numbers):
+        prog.append(struct.pack('HBBI', BPF_JEQ_K, len(numbers) - i, 0, nr))
+    prog.append(ret_allow)
+    prog.append(struct.pack('HBBI', BPF_RET_K, 0, 0, SECCOMP_RET_TRACE))
+    code = ctypes.create_string_buffer(b''.join(prog))
+    fprog = struct.pack('HxxxxxxQ', len(prog), ctypes.addressof(code))
+    fprog = ctypes.create_string_buffer(fprog)
+    if libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) != 0:
+        return False
+    nr = syscalls[platform.machine()][1]
+    return libc.syscall(nr, SECCOMP_SET_MODE_FILTER, 0, fprog) == 0
+
+
+def syscall_info(pid):
+    """return (op, arch, nr or rval, args) of stopped tracee."""
+    buf = ctypes.create_string_buffer(88)
+    ptrace(PTRACE_GET_SYSCALL_INFO, pid, len(buf), ctypes.addressof(buf))
+    op, arch = struct.unpack_from('B3xI', buf.raw)
+    if op == PTRACE_SYSCALL_INFO_EXIT:
+        return op, arch, struct.unpack_from('q', buf.raw, 24)[0], ()
+    values = struct.unpack_from('7Q', buf.raw, 24)
+    return op, arch, values[0], values[1:]
+
+
+def read_string(pid, addr, limit=4096):
+    """read NUL terminated string from tracee memory."""
+    data = b''
+    with open('/proc/%d/mem' % pid, 'rb', 0) as mem:
+        while len(data) < limit:
+            chunk = os.pread(mem.fileno(), 256, addr + len(data))
+            if not chunk:
+                break
+            end = chunk.find(b'\0')
+            if end >= 0:
+                return data + chunk[:end]
+            data += chunk
+    return data
+
+
+def read_flags(pid, addr):
+    """read flags of struct open_how from tracee memory."""
+    with open('/proc/%d/mem' % pid, 'rb', 0) as mem:
+        return struct.unpack('Q', os.pread(mem.fileno(), 8, addr))[0]
+
+
+def absolute(pid, dirfd, path):
+    """resolve path relative to tracee cwd or dirfd."""
+    if os.path.isabs(path):
+        return os.path.normpath(path)
+    if dirfd is None or dirfd == AT_FDCWD:
+        base = '/proc/%d/cwd' % pid
+    else:
+        base = '/proc/%d/fd/%d' % (pid, dirfd)
+    return os.path.normpath(os.path.join(os.readlink(base), path))
+
+
+def trace(argv, seccomp=True):
+    """run argv under ptrace and record files it accessed.
+
+    Every path successfully opened, stat'ed, read as link or
+      executed by the program and its children is recorded,
+      dlopen'ed libraries included.
+    Paths opened for writing are left out, even if they were
+      read before: they hold data of the program, not of host.
+    With seccomp filter only interesting syscalls stop the program,
+      otherwise it stops on every syscall and runs much slower.
+    Return (accessed, executed, exit status).
+
+    """
+    machine = platform.machine()
+    if machine not in syscalls:
+        raise OSError("tracing is not supported on %s" % machine)
+    arch, _, table = syscalls[machine]
+    open_flags = opens[machine]
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ptrace(PTRACE_TRACEME)
+            if seccomp:
+                seccomp_filter(arch, table)
+            os.kill(os.getpid(), signal.SIGSTOP)
+            os.execvp(argv[0], argv)
+        except OSError as e:
+            sys.stderr.write("can not run %s: %s\n" % (argv[0], e))
+        os._exit(127)
+    os.waitpid(pid, __WALL)
+    filtered = seccomp and _seccomp_enabled(pid)
+    options = (
+        PTRACE_O_TRACESYSGOOD | PTRACE_O_TRACEFORK | PTRACE_O_TRACEVFORK |
+        PTRACE_O_TRACECLONE | PTRACE_O_TRACEEXEC | PTRACE_O_EXITKILL
+        )
+    if seccomp:
+        options |= PTRACE_O_TRACESECCOMP
+    ptrace(PTRACE_SETOPTIONS, pid, 0, options)
+    resume = PTRACE_SYSCALL
+    if filtered:
+        resume = PTRACE_CONT
+    accessed = set()
+    executed = set()
+    written = set()
+    pending = {}
+    tracees = set([pid])
+    status = None
+    ptrace(resume, pid)
+    while tracees:
+        try:
+            stopped, wstatus = os.waitpid(-1, __WALL)
+        except ChildProcessError:
+            break
+        if os.WIFEXITED(wstatus) or os.WIFSIGNALED(wstatus):
+            tracees.discard(stopped)
+            pending.pop(stopped, None)
+            if stopped == pid:
+                if os.WIFEXITED(wstatus):
+                    status = os.WEXITSTATUS(wstatus)
+                else:
+                    status = -os.WTERMSIG(wstatus)
+            continue
+        if stopped not in tracees:
+            # new child reports its first stop, maybe before parent event
+            tracees.add(stopped)
+        sig = os.WSTOPSIG(wstatus)
+        event = wstatus >> 16
+        deliver = 0
+        if sig == signal.SIGTRAP | 0x80 or event == PTRACE_EVENT_SECCOMP:
+            try:
+                op, call_arch, value, args = syscall_info(stopped)
+                if op == PTRACE_SYSCALL_INFO_EXIT:
+                    call = pending.pop(stopped, None)
+                    if call and value >= 0:
+                        if call[2]:
+                            written.add(call[1])
+                        else:
+                            accessed.add(call[1])
+                        if call[0] in execs[machine]:
+                            executed.add(call[1])
+                elif call_arch == arch and value in table:
+                    dirarg, patharg = table[value]
+                    path = read_string(stopped, args[patharg])
+                    if path:
+                        dirfd = None
+                        if dirarg is not None:
+                            dirfd = ctypes.c_int(args[dirarg]).value
+                        path = absolute(
+                            stopped, dirfd, os.fsdecode(path)
+                            )
+                        writing = False
+                        if value in open_flags:
+                            flagarg, how = open_flags[value]
+                            flags = args[flagarg]
+                            if how:
+                                flags = read_flags(stopped, flags)
+                            writing = bool(flags & WRITE_FLAGS)
+                        pending[stopped] = (value, path, writing)
+            except OSError:
+                # tracee vanished or path is not readable any more
+                pending.pop(stopped, None)
+        elif sig == signal.SIGTRAP and event:
+            pass
+        elif sig == signal.SIGSTOP and stopped != pid:
+            pass
+        else:
+            deliver = sig
+        try:
+            # wait syscall exit stop of recorded call
+            ptrace(
+                PTRACE_SYSCALL if stopped in pending else resume,
+                stopped, 0, deliver
+                )
+        except OSError:
+            tracees.discard(stopped)
+    return accessed - written, executed, status
+
+
+def _seccomp_enabled(pid):
+    """check that tracee runs with seccomp filter."""
+    with open('/proc/%d/status' % pid) as f:
+        for line in f:
+            if line.startswith('Seccomp:'):
+                return line.split()[1] == '2'
+    return False
+
+
+def interpreter(path):
+    """return #! interpreter of script or None."""
+    try:
+        with open(path, 'rb') as f:
+            line = f.readline(256)
+    except (IOError, OSError):
+        return None
+    if not line.startswith(b'#!'):
+        return None
+    words = line[2:].split()
+    return os.fsdecode(words[0]) if words else None
+
+
+def minimal(accessed, executed, resolver=None):
+    """reduce accessed files to binaries and configs for rootfs.
+
+    Executed files become binaries, libraries already pulled by
+      their ELF dependencies are dropped, the rest is returned
+      as configs. Directories and virtual filesystems are skipped,
+      because copying a directory would bring everything again,
+      and so are files of users under private_dirs.
+
+    """
+    resolver = resolver or Resolver()
+    binaries = set()
+    for path in executed:
+        binaries.add(path)
+        interp = interpreter(path)
+        if interp:
+            binaries.add(interp)
+    files, _ = resolver.closure(sorted(binaries))
+    needed = set(os.path.realpath(f) for f in files)
+    configs = []
+    for path in sorted(accessed):
+        if path in binaries or os.path.isdir(path):
+            continue
+        if not os.path.exists(path):
+            continue
+        if any(path == d or path.startswith(d + '/')
+               for d in virtual_dirs + private_dirs):
+            continue
+        if os.path.realpath(path) in needed and read_elf(path):
+            continue
+        configs.append(path)
+    return sorted(binaries), configs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='This utility run program once and print files \
+        it used as bin2lxc and bin2chroot arguments'
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true', dest='json',
+        help='print json with binaries and configs lists'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        action='store', dest='output',
+        help='write result to this file instead of stdout'
+    )
+    parser.add_argument(
+        '--no-seccomp',
+        action='store_false', dest='seccomp',
+        help='stop on every syscall, for setuid programs'
+    )
+    parser.add_argument(
+        'command', nargs=argparse.REMAINDER,
+        help='program and its arguments'
+    )
+    args = parser.parse_args()
+    command = args.command
+    if command and command[0] == '--':
+        command = command[1:]
+    if not command:
+        parser.error("command is required")
+
+    accessed, executed, status = trace(command, seccomp=args.seccomp)
+    binaries, configs = minimal(accessed, executed)
+    if args.json:
+        result = json.dumps({
+            'command': command,
+            'status': status,
+            'binaries': binaries,
+            'configs': configs,
+        }, indent=1, sort_keys=True) + '\n'
+    else:
+        result = "-b %s -c %s\n" % (",".join(binaries), ",".join(configs))
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(result)
+    else:
+        sys.stdout.write(result)
+    sys.stderr.write("%d files accessed, %d binaries, %d configs, exit %s\n" % (
+        len(accessed), len(binaries), len(configs), status
+        ))
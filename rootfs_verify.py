@@ -0,0 +1,187 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# NOTE: find containers drifted from host after upgrade:
+"""python bin2lxc.py -r /var/lib/lxc/skype/rootfs --verify
+python bin2chroot.py /srv/chroot --verify -j 8"""
+
+import os
+import errno
+from concurrent.futures import ThreadPoolExecutor
+
+from filestore import file_hash
+from manifest import Manifest, manifest_path
+
+
+def files(rootfs):
+    """yield rootfs paths of regular files, links are never followed."""
+    stack = ['']
+    while stack:
+        top = stack.pop()
+        try:
+            entries = list(os.scandir(rootfs + top or '/'))
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                continue
+            raise
+        for entry in entries:
+            path = top + '/' + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(path)
+            elif entry.is_file(follow_symlinks=False):
+                yield path, entry.stat(follow_symlinks=False)
+
+
+class Verifier(object):
+    """compare built rootfs with the host files it came from.
+
+    Files recorded in the rootfs manifest are checked against
+      the recorded state of their source: same stat means
+      unchanged, otherwise the size and then the sha256
+      of the host file decide.
+    The rootfs copy itself is checked the same way against
+      its recorded size, mtime and sha256, which is the one
+      of the stripped copy for stripped files.
+    Without a manifest every file is compared with the host
+      file at the same path, by size and mtime first
+      and by content when only mtime differs.
+    Hashing is the slow part, so it runs in `jobs` threads
+      or in the given pool; hashes gives a shared HashCache.
+    Paths in skip and files generated by the build,
+      as recorded in the manifest, are not checked.
+
+    """
+
+    def __init__(self, jobs=1, pool=None, hashes=None, skip=()):
+        self.jobs = jobs
+        self.pool = pool
+        self.hashes = hashes
+        self.skip = set(skip)
+
+    def hash(self, path, st=None):
+        if self.hashes is not None:
+            return self.hashes.hash(path, st)
+        return file_hash(path)
+
+    def verify(self, rootfs):
+        """return dict of 'changed', 'missing', 'extra' path lists
+        and number of 'checked' files.
+
+        missing are recorded files gone from rootfs or from host,
+          extra are rootfs files which came from nowhere.
+
+        """
+        rootfs = rootfs.rstrip('/')
+        recorded = {}
+        skip = self.skip
+        if os.path.exists(manifest_path(rootfs)):
+            manifest = Manifest(rootfs)
+            recorded = manifest.files
+            skip = skip | set(manifest.generated)
+        result = {'checked': 0, 'changed': [], 'missing': [], 'extra': []}
+        compare = []
+        seen = set()
+        for path, dst_st in files(rootfs):
+            seen.add(path)
+            if path in skip:
+                continue
+            result['checked'] += 1
+            e = recorded.get(path)
+            src = e['src'] if e else path
+            try:
+                st = os.stat(src)
+            except OSError:
+                result['missing' if e else 'extra'].append(path)
+                continue
+            if e is not None:
+                # the rootfs copy against what was placed
+                if dst_st.st_size != e.get('dst_size', e['size']):
+                    result['changed'].append(path)
+                    continue
+                if dst_st.st_mtime_ns != e.get('dst_mtime'):
+                    compare.append((
+                        path, None, None,
+                        e.get('dst_sha256', e['sha256']), rootfs + path
+                    ))
+                # its source against what was copied
+                if (e['size'], e['mtime'], e['ino'], e['dev']) == (
+                        st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev):
+                    continue
+                if e['size'] != st.st_size:
+                    result['changed'].append(path)
+                    continue
+                compare.append((path, src, st, e['sha256'], None))
+            elif recorded:
+                # not placed by a build, it does not come from host
+                result['extra'].append(path)
+            else:
+                if dst_st.st_size != st.st_size:
+                    result['changed'].append(path)
+                elif dst_st.st_mtime_ns != st.st_mtime_ns:
+                    compare.append((path, src, st, None, rootfs + path))
+        for path in sorted(set(recorded) - seen - skip):
+            result['missing'].append(path)
+
+        def check(item):
+            path, src, st, digest, dst = item
+            try:
+                if src is None:
+                    return path, file_hash(dst) != digest
+                if digest is None:
+                    digest = file_hash(dst)
+                return path, self.hash(src, st) != digest
+            except (IOError, OSError):
+                return path, True
+
+        if self.pool is not None:
+            checked = self.pool.map(check, compare)
+        elif self.jobs > 1 and len(compare) > 1:
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                checked = list(pool.map(check, compare))
+        else:
+            checked = map(check, compare)
+        result['changed'] = sorted(set(result['changed']).union(
+            path for path, changed in checked if changed
+        ))
+        for key in ('changed', 'missing', 'extra'):
+            result[key].sort()
+        return result
+
+
+def format_result(result):
+    """one line per drifted file and the totals."""
+    lines = []
+    for key in ('changed', 'missing', 'extra'):
+        lines += ["%s %s" % (key, path) for path in result[key]]
+    lines.append("%d files checked, %d changed, %d missing, %d extra" % (
+        result['checked'], len(result['changed']),
+        len(result['missing']), len(result['extra'])
+    ))
+    return "\n".join(lines)
+
+
+def drifted(result):
+    return bool(result['changed'] or result['missing'] or result['extra'])
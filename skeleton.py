@@ -0,0 +1,167 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import os
+import errno
+
+O_DIR = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+
+
+def spec(structure=(), nodes=(), links=(), files=(), mode=0o755):
+    """build skeleton entries from the script tables.
+
+    structure is list of directories, nodes is list of
+      (path, mode, major, minor), links is list of (path, target)
+      and files is list of (path, data, mode).
+    Return list of entries for apply(), in order:
+      ('dir', path, mode), ('node', path, mode, dev),
+      ('link', path, target), ('file', path, mode, data).
+
+    """
+    entries = [('dir', d, mode) for d in structure]
+    entries += [
+        ('node', n[0], n[1], os.makedev(n[2], n[3])) for n in nodes
+    ]
+    entries += [('link', l[0], l[1]) for l in links]
+    entries += [('file', f[0], f[2], f[1]) for f in files]
+    return entries
+
+
+def apply(rootfs, entries, uid=-1, gid=-1):
+    """create skeleton in rootfs in a single pass.
+
+    Everything is created relative to directory descriptors
+      opened with O_NOFOLLOW, so a symlink planted in rootfs
+      can not redirect us to the host. Modes and ownership
+      are set through the new descriptor, without touching
+      the process umask, so builds may run in parallel threads;
+      existing entries are fixed up instead of being stat'ed first.
+    Return number of created entries.
+
+    """
+    created = 0
+    chown = uid != -1 or gid != -1
+    try:
+        os.mkdir(rootfs, 0o755)
+        created += 1
+    except FileExistsError:
+        pass
+    fds = {'': os.open(rootfs, O_DIR)}
+    try:
+        if created:
+            os.fchmod(fds[''], 0o755)
+        if chown:
+            os.fchown(fds[''], uid, gid)
+
+        def dirfd(path):
+            if path not in fds:
+                parent, name = os.path.split(path)
+                fds[path] = os.open(name, O_DIR, dir_fd=dirfd(parent))
+            return fds[path]
+
+        for entry in entries:
+            kind = entry[0]
+            path = entry[1].strip('/')
+            parent, name = os.path.split(path)
+            pfd = dirfd(parent)
+            if kind == 'dir':
+                mode = entry[2]
+                try:
+                    os.mkdir(name, mode, dir_fd=pfd)
+                    created += 1
+                except FileExistsError:
+                    pass
+                fd = dirfd(path)
+                os.fchmod(fd, mode)
+                if chown:
+                    os.fchown(fd, uid, gid)
+            elif kind == 'node':
+                try:
+                    os.mknod(name, entry[2], entry[3], dir_fd=pfd)
+                    created += 1
+                    os.chmod(name, entry[2] & 0o7777, dir_fd=pfd)
+                except FileExistsError:
+                    pass
+                if chown:
+                    os.chown(name, uid, gid, dir_fd=pfd, follow_symlinks=False)
+            elif kind == 'link':
+                target = entry[2]
+                try:
+                    os.symlink(target, name, dir_fd=pfd)
+                    created += 1
+                except FileExistsError:
+                    try:
+                        current = os.readlink(name, dir_fd=pfd)
+                    except OSError as e:
+                        if e.errno != errno.EINVAL:
+                            raise
+                        # a file or directory, not a link
+                        current = None
+                    if current != target:
+                        try:
+                            os.unlink(name, dir_fd=pfd)
+                        except IsADirectoryError:
+                            raise OSError(
+                                errno.EEXIST,
+                                "directory %s is in the way of "
+                                "link to %s" % (entry[1], target)
+                            )
+                        os.symlink(target, name, dir_fd=pfd)
+                if chown:
+                    os.chown(name, uid, gid, dir_fd=pfd, follow_symlinks=False)
+            elif kind == 'file':
+                mode, data = entry[2], entry[3]
+                if not isinstance(data, bytes):
+                    data = data.encode()
+                # the old file may be a hardlink to the host,
+                # so a new one replaces it instead of being truncated
+                tmp = '.%s.tmp' % name
+                try:
+                    os.unlink(tmp, dir_fd=pfd)
+                except FileNotFoundError:
+                    pass
+                fd = os.open(
+                    tmp,
+                    os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                    os.O_NOFOLLOW | os.O_CLOEXEC,
+                    mode, dir_fd=pfd
+                )
+                try:
+                    os.write(fd, data)
+                    os.fchmod(fd, mode)
+                    if chown:
+                        os.fchown(fd, uid, gid)
+                finally:
+                    os.close(fd)
+                os.rename(tmp, name, src_dir_fd=pfd, dst_dir_fd=pfd)
+                created += 1
+            else:
+                raise ValueError("unknown skeleton entry %r" % (entry,))
+    finally:
+        for fd in fds.values():
+            os.close(fd)
+    return created
@@ -0,0 +1,53 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import argparse
+
+import pytest
+
+from bench_rootfs import TARGETS, build
+
+
+@pytest.mark.parametrize('target', TARGETS)
+def test_build_goes_through_builders(tmp_path, target):
+    if target != 'archive' and os.getuid() != 0:
+        pytest.skip("device nodes need root")
+    args = argparse.Namespace(
+        target=target, jobs=2, copy_mode='copy', index=None
+    )
+    result = build(['true'], ['/etc/hostname'], str(tmp_path / 'r'), args)
+    assert result['errors'] == 0
+    phases = result['phases']
+    assert phases['resolve']['ops']
+    if target == 'archive':
+        assert phases['archive']['files'] >= 2
+    else:
+        assert list(phases) == [
+            'setup', 'resolve', 'skeleton', 'config', 'copy', 'finish'
+        ]
+        assert phases['copy']['files'] >= 2
+    assert result['total'] == sum(p['wall'] for p in phases.values())
@@ -0,0 +1,98 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+
+import pytest
+
+import bin2lxc
+from bin2lxc import LxcBuilder, split_shared
+from rootfs_verify import drifted, format_result
+
+
+@pytest.fixture
+def builder():
+    if os.getuid() != 0:
+        pytest.skip("device nodes need root")
+    builder = LxcBuilder(index=None)
+    builder.warn = lambda message: None
+    yield builder
+    builder.close()
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'network': True},
+    {'execute': ''},
+])
+def test_verify_fresh_container(builder, tmp_path, options):
+    path = str(tmp_path / 'c')
+    rootfs = path + '/rootfs'
+    os.makedirs(path)
+    plan, errors, stale, unchanged = builder.build(
+        'c', rootfs, path, binaries='true', **options
+    )
+    assert errors == []
+    result = builder.verify(rootfs)
+    assert not drifted(result), format_result(result)
+    assert result['checked'] > 0
+
+
+def test_verify_reports_drift(builder, tmp_path):
+    path = str(tmp_path / 'c')
+    rootfs = path + '/rootfs'
+    os.makedirs(path)
+    builder.build('c', rootfs, path, binaries='true', network=True)
+    with open(rootfs + '/etc/extra', 'w') as f:
+        f.write('not from host')
+    true = builder.resolver.which('true')
+    os.unlink(rootfs + true)
+    result = builder.verify(rootfs)
+    assert result['extra'] == ['/etc/extra']
+    assert result['missing'] == [true]
+
+
+def test_split_shared(tmp_path, monkeypatch):
+    host = str(tmp_path)
+    for d in ('usr/bin', 'usr/lib/gconv', 'opt/app', 'etc'):
+        os.makedirs(os.path.join(host, d))
+    monkeypatch.setattr(
+        bin2lxc, 'shareable_dirs', (host + '/usr', host + '/opt')
+    )
+    dirs, copied = split_shared([
+        host + '/usr/bin/env',
+        host + '/usr/lib/libc.so.6',
+        host + '/usr/lib/gconv',
+        host + '/opt/app',
+        host + '/etc/hosts',
+    ])
+    assert dirs == [host + '/opt/app', host + '/usr/bin', host + '/usr/lib']
+    assert copied == [host + '/etc/hosts']
+    dirs, copied = split_shared(
+        [host + '/usr/lib/gconv', host + '/usr/bin/env'], [host + '/usr/lib']
+    )
+    assert dirs == [host + '/usr/bin']
+    assert copied == []
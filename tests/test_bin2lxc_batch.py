@@ -0,0 +1,103 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import json
+
+import pytest
+
+from bin2lxc_batch import BatchBuilder, build, definitions, load, verify
+
+DATA = {
+    'defaults': {'network': True, 'uid': 1000},
+    'containers': [
+        {'name': 'web', 'binaries': ['true', 'false'], 'trace': 'true'},
+        {'name': 'box', 'network': False, 'path': '/srv/box'},
+    ],
+}
+
+
+def test_definitions():
+    web, box = definitions(DATA, '/var/lib/lxc')
+    assert web['binaries'] == 'true,false'
+    assert web['trace'] == ['true']
+    assert (web['network'], web['uid'], web['gid']) == (
+        True, 1000, os.getgid()
+    )
+    assert web['rootfs'] == '/var/lib/lxc/web/rootfs'
+    assert (box['network'], box['rootfs']) == (False, '/srv/box/rootfs')
+    assert box['execute'] == '/bin/bash'
+    assert definitions(DATA['containers'])[0]['network'] is False
+
+
+@pytest.mark.parametrize('containers, error', [
+    ([{'binaries': 'true'}], 'without name'),
+    ([{'name': 'a'}, {'name': 'a'}], 'defined twice'),
+    ([{'name': 'a', 'binary': 'true'}], 'unknown keys binary'),
+])
+def test_definitions_errors(containers, error):
+    with pytest.raises(ValueError) as e:
+        definitions(containers)
+    assert error in str(e.value)
+
+
+def test_load(tmp_path):
+    path = str(tmp_path / 'containers.json')
+    with open(path, 'w') as f:
+        json.dump(DATA, f)
+    assert load(path) == DATA
+    path = str(tmp_path / 'containers.toml')
+    with open(path, 'w') as f:
+        f.write('[defaults]\nnetwork = true\n\n'
+                '[[containers]]\nname = "web"\nbinaries = ["true"]\n')
+    assert load(path) == {
+        'defaults': {'network': True},
+        'containers': [{'name': 'web', 'binaries': ['true']}],
+    }
+
+
+def test_build_and_verify(tmp_path):
+    if os.getuid() != 0:
+        pytest.skip("device nodes need root")
+    builder = BatchBuilder(index=None, jobs=2)
+    try:
+        containers = definitions({
+            'defaults': {'binaries': 'true'},
+            'containers': [{'name': 'a'}, {'name': 'b', 'network': True}],
+        }, str(tmp_path))
+        results = build(builder, containers, parallel=2)
+        assert [(r['name'], r['ok'], r['errors']) for r in results] == [
+            ('a', True, 0), ('b', True, 0)
+        ]
+        assert all(r['copied'] == r['files'] for r in results)
+        results = build(builder, containers, parallel=2)
+        assert all(r['unchanged'] == r['files'] for r in results)
+        results = verify(builder, containers + definitions(
+            [{'name': 'missing'}], str(tmp_path)
+        ))
+        assert [r['ok'] for r in results] == [True, True, False]
+    finally:
+        builder.close()
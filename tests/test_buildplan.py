@@ -0,0 +1,115 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+
+import pytest
+
+import skeleton
+from buildplan import Plan, apply, batches
+from fscopy import Copier
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.fixture
+def plan(tmp_path):
+    host = tmp_path / 'host'
+    (host / 'lib' / 'sub').mkdir(parents=True)
+    (host / 'lib' / 'a.so').write_text('a' * 10)
+    (host / 'lib' / 'sub' / 'b.so').write_text('b' * 20)
+    (host / 'lib' / 'skip.log').write_text('skip')
+    os.symlink('a.so', str(host / 'lib' / 'a.so.1'))
+    (host / 'bin').write_text('bin')
+    plan = Plan(str(tmp_path / 'rootfs'))
+    plan.entries = skeleton.spec(
+        structure=['/etc', '/tmp'],
+        links=[('/etc/mtab', '/proc/mounts')],
+        files=[('/etc/hostname', 'box\n', 0o644), ('etc/hosts', '', 0o644)],
+    )
+    plan.add_copy(str(host / 'lib'), '/lib', exclude=['*.log'])
+    plan.add_copy(str(host / 'bin'), '/bin/tool')
+    plan.add_copy(str(host / 'nosuch'), '/nosuch')
+    plan.add_host_file(str(tmp_path / 'conf' / 'config'), 'x = 1\n')
+    return plan
+
+
+def test_plan(plan):
+    assert sorted(p for s, p, n in plan.copies) == [
+        '/bin/tool', '/lib/a.so', '/lib/sub/b.so'
+    ]
+    assert plan.links == [('a.so', '/lib/a.so.1')]
+    assert plan.generated() == ['/etc/hostname', '/etc/hosts']
+    t = plan.totals()
+    assert (t['dirs'], t['links'], t['files'], t['copies'], t['bytes']) == \
+        (4, 2, 2, 3, 33)
+    assert t['chowns'] == 0
+    plan.uid = 1000
+    assert plan.totals()['chowns'] == 12
+
+
+def test_save_load(plan, tmp_path):
+    path = str(tmp_path / 'chroot.plan')
+    plan.save(path)
+    loaded = Plan.load(path)
+    for key in ('rootfs', 'uid', 'gid', 'entries', 'host', 'dirs',
+                'links', 'copies', 'errors', 'shared', 'summary'):
+        assert getattr(loaded, key) == getattr(plan, key)
+    assert loaded.format_totals() == plan.format_totals()
+    with open(path, 'w') as f:
+        f.write('{"version": 0}')
+    with pytest.raises(ValueError):
+        Plan.load(path)
+
+
+def test_batches():
+    copies = [('big%d' % i, '/big%d' % i, 100) for i in range(2)]
+    copies += [('s%d' % i, '/s%d' % i, 1) for i in range(5)]
+    jobs = list(batches(copies, '/r', count=2, size=100))
+    assert jobs[:2] == [[('big0', '/r/big0')], [('big1', '/r/big1')]]
+    assert [len(j) for j in jobs[2:]] == [2, 2, 1]
+    assert sorted(p for j in jobs for s, p in j) == sorted(
+        '/r' + c[1] for c in copies
+    )
+
+
+def test_apply(plan, tmp_path):
+    copier = Copier(jobs=2)
+    try:
+        assert apply(plan, copier) == []
+    finally:
+        copier.close()
+    rootfs = plan.rootfs
+    assert read(rootfs + '/etc/hostname') == 'box\n'
+    assert os.readlink(rootfs + '/etc/mtab') == '/proc/mounts'
+    assert read(rootfs + '/lib/sub/b.so') == 'b' * 20
+    assert read(rootfs + '/bin/tool') == 'bin'
+    assert os.readlink(rootfs + '/lib/a.so.1') == 'a.so'
+    assert not os.path.exists(rootfs + '/lib/skip.log')
+    assert read(str(tmp_path / 'conf' / 'config')) == 'x = 1\n'
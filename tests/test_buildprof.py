@@ -0,0 +1,105 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+from buildprof import Profiler
+from fscopy import Copier
+
+
+def test_phases(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    for i in range(5):
+        (src / ('f%d' % i)).write_bytes(b'x' * (i + 1) * 100)
+    profiler = Profiler(top=3)
+    profiler.start('skeleton')
+    os.mkdir(str(tmp_path / 'rootfs'))
+    profiler.add(files=2, size=10)
+    profiler.start('copy')
+    copier = Copier(jobs=2, profile=profiler)
+    copier.copy(str(src), str(tmp_path / 'rootfs' / 'src'))
+    assert copier.close() == []
+    profiler.start('spawn')
+    subprocess.call(['true'])
+    report = profiler.report()
+    skeleton, copy, spawn = report['phases']
+    assert [p['name'] for p in report['phases']] == [
+        'skeleton', 'copy', 'spawn'
+    ]
+    assert (skeleton['files'], skeleton['bytes']) == (2, 10)
+    assert skeleton['ops']['mkdir'] == 1
+    assert (copy['files'], copy['bytes']) == (5, 1500)
+    assert copy['ops']['open'] >= 5
+    assert spawn['spawns'] >= 1
+    assert len(report['slowest']) == 3
+    seconds = [c['seconds'] for c in report['slowest']]
+    assert seconds == sorted(seconds, reverse=True)
+    assert report['wall'] >= sum(p['wall'] for p in report['phases'])
+
+
+def test_closed(tmp_path):
+    profiler = Profiler()
+    profiler.start('copy')
+    profiler.close()
+    os.mkdir(str(tmp_path / 'd'))
+    profiler.add(files=1)
+    assert profiler.phases[0]['ops'] == {}
+    assert profiler.phases[0]['files'] == 0
+
+
+def test_write(tmp_path):
+    log = str(tmp_path / 'build.log')
+    profiler = Profiler()
+    profiler.start('copy')
+    profiler.copied('/bin/ls', '/r/bin/ls', 0.5, 1024)
+    profiler.write(log, 'json', name='box')
+    profiler = Profiler()
+    profiler.start('copy')
+    profiler.write(log, name='box')
+    with open(log) as f:
+        lines = f.read().splitlines()
+    report = json.loads(lines[0])
+    assert report['name'] == 'box'
+    assert report['slowest'] == [
+        {'seconds': 0.5, 'src': '/bin/ls', 'dst': '/r/bin/ls', 'bytes': 1024}
+    ]
+    assert lines[1].endswith(' name=box')
+    assert lines[2].split()[0] == 'copy'
+    assert lines[-1].split()[0] == 'total'
+
+
+def test_profile_option_keeps_rootfs(tmp_path):
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    rootfs = str(tmp_path / 'chroot')
+    for options in (['--profile'], ['--profile', '--profile-format', 'json']):
+        out = subprocess.check_output([
+            sys.executable, os.path.join(here, 'bin2chroot.py')
+        ] + options + [rootfs, '-b', 'true', '--no-index', '--plan-only'])
+        assert out.decode().startswith(rootfs + ': ')
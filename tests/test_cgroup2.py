@@ -0,0 +1,235 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import errno
+
+import pytest
+
+import cgroup2
+from cgroup2 import Cgroup, enable, format_stats, read_flat, read_nested
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.fixture
+def root(tmp_path):
+    """directory standing in for cgroupfs with a parent cgroup."""
+    parent = tmp_path / 'user.slice'
+    parent.mkdir()
+    write(str(parent / 'cgroup.controllers'), 'cpu memory pids\n')
+    write(str(parent / 'cgroup.subtree_control'), '')
+    return str(tmp_path)
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    """controllers written to cgroup.subtree_control, in order;
+    a directory does not combine writes like cgroupfs does."""
+    written = []
+    real_open = open
+
+    def recording_open(path, *args):
+        f = real_open(path, *args)
+        if path.endswith('subtree_control') and args and args[0] == 'w':
+            real_write = f.write
+
+            def write(data):
+                written.append(data)
+                return real_write(data)
+            f.write = write
+        return f
+
+    monkeypatch.setattr(cgroup2, 'open', recording_open, raising=False)
+    return written
+
+
+def test_mountpoint(tmp_path):
+    mounts = str(tmp_path / 'mounts')
+    write(mounts, 'proc /proc proc rw 0 0\n'
+                  'cgroup2 /sys/fs/cgroup/unified cgroup2 rw 0 0\n')
+    assert cgroup2.mountpoint(mounts) == '/sys/fs/cgroup/unified'
+    write(mounts, 'proc /proc proc rw 0 0\n')
+    assert cgroup2.mountpoint(mounts) == cgroup2.CGROUP_ROOT
+    assert cgroup2.mountpoint(str(tmp_path / 'missing')) == \
+        cgroup2.CGROUP_ROOT
+
+
+def test_create_writes_limits(root, enabled):
+    cg = Cgroup.create('build', '/user.slice', root, {
+        'memory.max': '1G', 'cpu.max': '50000 100000'
+    })
+    assert cg.path == os.path.join(root, 'user.slice', 'build')
+    assert read(cg.path + '/memory.max') == '1G'
+    assert read(cg.path + '/cpu.max') == '50000 100000'
+    assert enabled == ['+cpu', '+memory']
+
+
+def test_create_without_limits_enables_accounting(root, enabled):
+    cg = Cgroup.create('plain', 'user.slice/', root)
+    assert os.path.isdir(cg.path)
+    # io is not available in the parent, pids is no accounting one
+    assert enabled == ['+cpu', '+memory']
+
+
+def test_accounting_controllers_are_optional(root, monkeypatch):
+    real_open = open
+
+    def busy_open(path, *args):
+        if path.endswith('subtree_control') and args and args[0] == 'w':
+            raise IOError(errno.EBUSY, os.strerror(errno.EBUSY))
+        return real_open(path, *args)
+
+    monkeypatch.setattr(cgroup2, 'open', busy_open, raising=False)
+    cg = Cgroup.create('plain', '/user.slice', root)
+    assert os.path.isdir(cg.path)
+    with pytest.raises(OSError) as e:
+        Cgroup.create('build', '/user.slice', root, {'memory.max': '1G'})
+    assert e.value.errno == errno.EBUSY
+
+
+def test_enable_skips_enabled(root):
+    parent = root + '/user.slice'
+    write(parent + '/cgroup.subtree_control', 'cpu memory\n')
+    enable(parent, ['memory', 'cpu'])
+    assert read(parent + '/cgroup.subtree_control') == 'cpu memory\n'
+
+
+def test_enable_missing_controller(root):
+    with pytest.raises(OSError) as e:
+        Cgroup.create('build', '/user.slice', root, {'io.max': '8:0 rbps=1'})
+    assert e.value.errno == errno.ENOTSUP
+    assert 'controller io is not available' in str(e.value)
+    assert not os.path.exists(root + '/user.slice/build')
+
+
+def test_enable_busy(root, monkeypatch):
+    real_open = open
+
+    def busy_open(path, *args):
+        if path.endswith('subtree_control') and args and args[0] == 'w':
+            raise IOError(errno.EBUSY, os.strerror(errno.EBUSY))
+        return real_open(path, *args)
+
+    monkeypatch.setattr(cgroup2, 'open', busy_open, raising=False)
+    with pytest.raises(OSError) as e:
+        enable(root + '/user.slice', ['memory'])
+    assert e.value.errno == errno.EBUSY
+    assert 'it has processes' in str(e.value)
+
+
+def test_create_removes_cgroup_on_failed_limit(root):
+    with pytest.raises(OSError):
+        Cgroup.create('build', '/user.slice', root, {'no/such.file': '1'})
+    assert not os.path.exists(root + '/user.slice/build')
+
+
+def test_add(tmp_path):
+    cg = Cgroup(str(tmp_path))
+    cg.add()
+    assert read(str(tmp_path / 'cgroup.procs')) == '0'
+    cg.add(42)
+    assert read(str(tmp_path / 'cgroup.procs')) == '42'
+
+
+def test_read_flat_and_nested(tmp_path):
+    write(str(tmp_path / 'cpu.stat'),
+          'usage_usec 1500000\nuser_usec 1000000\nsystem_usec 500000\n'
+          'garbage\n')
+    write(str(tmp_path / 'io.stat'),
+          '8:0 rbytes=4096 wbytes=8192 rios=1 wios=2\n'
+          '8:16 rbytes=100 wbytes=0\n\n')
+    assert read_flat(str(tmp_path / 'cpu.stat')) == {
+        'usage_usec': 1500000, 'user_usec': 1000000, 'system_usec': 500000
+    }
+    assert read_nested(str(tmp_path / 'io.stat')) == {
+        '8:0': {'rbytes': 4096, 'wbytes': 8192, 'rios': 1, 'wios': 2},
+        '8:16': {'rbytes': 100, 'wbytes': 0},
+    }
+
+
+def test_stats(tmp_path):
+    cg = Cgroup(str(tmp_path))
+    empty = cg.stats()
+    assert empty == {'cpu': {}, 'memory_peak': None, 'io': {}}
+    assert format_stats(empty) == "no accounting available"
+
+    write(str(tmp_path / 'cpu.stat'),
+          'usage_usec 1500000\nuser_usec 1000000\nsystem_usec 500000\n')
+    write(str(tmp_path / 'memory.peak'), '1048576\n')
+    write(str(tmp_path / 'io.stat'), '8:0 rbytes=4096 wbytes=8192\n')
+    stats = cg.stats()
+    assert stats['memory_peak'] == 1048576
+    assert format_stats(stats) == (
+        "cpu 1.500s (user 1.000s, system 0.500s), "
+        "memory peak 1048576 bytes, "
+        "io read 4096 bytes, written 8192 bytes"
+    )
+
+
+def test_remove(tmp_path):
+    cg = Cgroup(str(tmp_path / 'cg'))
+    os.mkdir(cg.path)
+    cg.remove()
+    assert not os.path.exists(cg.path)
+    # already gone
+    cg.remove()
+
+
+def test_remove_waits_for_busy(tmp_path, monkeypatch):
+    cg = Cgroup(str(tmp_path / 'cg'))
+    os.mkdir(cg.path)
+    calls = []
+    real_rmdir = os.rmdir
+
+    def rmdir(path):
+        calls.append(path)
+        if len(calls) < 3:
+            raise OSError(errno.EBUSY, os.strerror(errno.EBUSY))
+        real_rmdir(path)
+
+    monkeypatch.setattr(os, 'rmdir', rmdir)
+    cg.remove()
+    assert len(calls) == 3
+    assert not os.path.exists(cg.path)
+
+
+def test_remove_gives_up(tmp_path, monkeypatch):
+    def rmdir(path):
+        raise OSError(errno.EBUSY, os.strerror(errno.EBUSY))
+
+    monkeypatch.setattr(os, 'rmdir', rmdir)
+    with pytest.raises(OSError) as e:
+        Cgroup(str(tmp_path)).remove(timeout=0.05)
+    assert e.value.errno == errno.EBUSY
@@ -0,0 +1,144 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+
+from depindex import DependencyIndex, resolve_profile
+from elfdeps import Resolver
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def index(tmp_path):
+    ld_cache = str(tmp_path / 'ld.so.cache')
+    if not os.path.exists(ld_cache):
+        write(ld_cache, 'cache')
+    return DependencyIndex(str(tmp_path / 'db' / 'index.sqlite'), ld_cache)
+
+
+def test_lookup_and_store(tmp_path):
+    binary = str(tmp_path / 'bin')
+    lib = str(tmp_path / 'lib.so')
+    write(binary, 'binary')
+    write(lib, 'lib')
+    db = index(tmp_path)
+    assert db.lookup(binary) is None
+    db.store(binary, [lib], set(['libgone.so']))
+    db.close()
+
+    db = index(tmp_path)
+    assert db.lookup(binary) == ([lib], set(['libgone.so']))
+    # a changed dependency invalidates the entry
+    os.utime(lib, ns=(0, 0))
+    assert db.lookup(binary) is None
+    db.store(binary, [lib], set())
+    os.utime(binary, ns=(0, 0))
+    assert db.lookup(binary) is None
+    assert (db.hits, db.misses) == (1, 2)
+    db.close()
+
+
+def test_ld_cache_change_drops_entries(tmp_path):
+    binary = str(tmp_path / 'bin')
+    write(binary, 'binary')
+    db = index(tmp_path)
+    db.store(binary, [], set())
+    db.close()
+    write(str(tmp_path / 'ld.so.cache'), 'new cache')
+    os.utime(str(tmp_path / 'ld.so.cache'), ns=(0, 0))
+    db = index(tmp_path)
+    assert db.lookup(binary) is None
+    db.close()
+
+
+def test_resolver_uses_index(tmp_path):
+    db = index(tmp_path)
+    resolver = Resolver(index=db)
+    ls = resolver.which('ls')
+    deps = resolver.dependencies(ls)
+    assert db.misses == 1
+    assert Resolver(index=db).dependencies(ls) == deps
+    assert db.hits == 1
+    db.close()
+
+
+def test_containers_and_rdeps(tmp_path):
+    db = index(tmp_path)
+    db.record_container('a', '/lxc/a/rootfs', [
+        ('/usr/lib/libssl.so.3', '/usr/lib/libssl.so.3'),
+        ('/bin/ls', '/usr/bin/ls'),
+    ])
+    db.record_container('b', '/lxc/b/rootfs', [
+        ('/lib/libssl.so.3', '/usr/lib/libssl.so.3'),
+    ])
+    # a rebuild replaces the files of a container
+    db.record_container('b', '/lxc/b/rootfs', [('/bin/ls', '/usr/bin/ls')])
+    assert [c[:2] + c[3:] for c in db.containers()] == [
+        ('a', '/lxc/a/rootfs', 2), ('b', '/lxc/b/rootfs', 1)
+    ]
+    assert db.rdeps('libssl.so.3') == [
+        ('a', '/lxc/a/rootfs', '/usr/lib/libssl.so.3')
+    ]
+    assert [r[0] for r in db.rdeps('/usr/bin/ls')] == ['a', 'b']
+    db.close()
+
+
+def test_resolve_profile(tmp_path):
+    conf = tmp_path / 'conf'
+    conf.mkdir()
+    write(str(conf / 'a'), 'aaa')
+    resolver = Resolver()
+    closure = resolve_profile('ls,nosuchbinary', '%s,/nosuch' % conf, resolver)
+    assert closure['binaries'] == [resolver.which('ls')]
+    assert closure['not_found'] == ['nosuchbinary', '/nosuch']
+    assert closure['configs'] == [str(conf)]
+    assert closure['files'][0] == resolver.which('ls')
+    paths = [m['path'] for m in closure['members']]
+    assert str(conf) in paths and str(conf / 'a') in paths
+    assert all(m['sha256'] for m in closure['members'] if m['size'])
+
+
+def test_profile_cache(tmp_path):
+    conf = tmp_path / 'conf'
+    conf.mkdir()
+    write(str(conf / 'a'), 'aaa')
+    db = index(tmp_path)
+    resolver = Resolver()
+    first = db.profile('p', 'ls', str(conf), resolver)
+    assert db.profile('p', 'ls', str(conf), resolver) == first
+    assert (db.hits, db.misses) == (1, 1)
+    # new file in a config directory
+    write(str(conf / 'b'), 'bbb')
+    assert len(db.profile('p', 'ls', str(conf), resolver)['members']) == \
+        len(first['members']) + 1
+    # changed definition
+    db.profile('p', 'ls,cat', str(conf), resolver)
+    assert (db.hits, db.misses) == (1, 3)
+    assert list(db.profiles()) == ['p']
+    db.close()
@@ -0,0 +1,114 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from elfdeps import Resolver, read_elf
+
+
+def compile(cc, tmp_path, name, code, *options):
+    source = str(tmp_path / (name + '.c'))
+    with open(source, 'w') as f:
+        f.write(code)
+    out = str(tmp_path / name)
+    subprocess.check_call([cc, '-o', out, source] + list(options))
+    return out
+
+
+@pytest.fixture
+def cc():
+    cc = shutil.which('cc') or shutil.which('gcc')
+    if cc is None:
+        pytest.skip("no C compiler")
+    return cc
+
+
+def test_read_elf_of_non_elf(tmp_path):
+    path = str(tmp_path / 'script')
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\n')
+    assert read_elf(path) is None
+    assert Resolver().dependencies(path) == []
+
+
+def test_rpath_origin_and_missing(cc, tmp_path):
+    lib = tmp_path / 'lib'
+    lib.mkdir()
+    compile(cc, lib, 'libfoo.so', 'int foo(void) { return 1; }\n',
+            '-shared', '-fPIC')
+    compile(cc, lib, 'libbar.so', 'int bar(void) { return 2; }\n',
+            '-shared', '-fPIC')
+    prog = compile(
+        cc, tmp_path, 'prog',
+        'int foo(void); int bar(void);\n'
+        'int main(void) { return foo() + bar(); }\n',
+        '-L' + str(lib), '-lfoo', '-lbar', "-Wl,-rpath,$ORIGIN/lib"
+    )
+    os.unlink(str(lib / 'libbar.so'))
+
+    info = read_elf(prog)
+    assert info.needed[:2] == ['libfoo.so', 'libbar.so']
+    assert info.interp
+    resolver = Resolver()
+    deps = resolver.dependencies(prog)
+    assert deps[0] == str(tmp_path) + '/lib/libfoo.so'
+    assert deps[-1] == info.interp
+    assert any(os.path.basename(d).startswith('libc.so') for d in deps)
+    assert resolver.missing == set(['libbar.so'])
+
+
+def test_closure_lists_files_once():
+    resolver = Resolver()
+    paths = [resolver.which(b) for b in ('ls', 'cat', 'ls')]
+    files, redundant = resolver.closure(paths)
+    assert len(files) == len(set(files))
+    assert files[0] == paths[0]
+    assert redundant >= 1 + len(resolver.dependencies(paths[0]))
+
+
+def test_matches_ldd():
+    ldd = shutil.which('ldd')
+    if ldd is None:
+        pytest.skip("no ldd")
+    resolver = Resolver()
+    for name in ('ls', 'python3', 'sh'):
+        path = resolver.which(name)
+        if path is None:
+            continue
+        out = subprocess.check_output([ldd, path]).decode()
+        expected = set()
+        for line in out.splitlines():
+            words = line.split()
+            if '=>' in words:
+                expected.add(os.path.realpath(words[words.index('=>') + 1]))
+            elif words and words[0].startswith('/'):
+                expected.add(os.path.realpath(words[0]))
+        got = set(os.path.realpath(p) for p in resolver.dependencies(path))
+        assert got == expected, name
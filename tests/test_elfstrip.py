@@ -0,0 +1,102 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from elfstrip import layout, strip_file
+from fscopy import Copier
+from manifest import Manifest
+
+
+@pytest.fixture
+def program(tmp_path):
+    """unstripped executable built with debug info."""
+    cc = shutil.which('cc') or shutil.which('gcc')
+    if cc is None:
+        pytest.skip("no C compiler")
+    source = str(tmp_path / 'hello.c')
+    with open(source, 'w') as f:
+        f.write('#include <stdio.h>\n'
+                'int main(void) { puts("hello"); return 0; }\n')
+    path = str(tmp_path / 'hello')
+    subprocess.check_call([cc, '-g', '-o', path, source])
+    return path
+
+
+def run(path):
+    return subprocess.check_output([path]).decode()
+
+
+def test_strip_file(program, tmp_path):
+    dst = str(tmp_path / 'stripped')
+    saved = strip_file(program, dst)
+    assert saved > 0
+    assert os.path.getsize(dst) == os.path.getsize(program) - saved
+    assert os.stat(dst).st_mode == os.stat(program).st_mode
+    assert run(dst) == 'hello\n'
+    with open(dst, 'rb') as f:
+        assert layout(f) is None
+
+
+def test_strip_file_ignores_other_files(tmp_path):
+    src = str(tmp_path / 'text')
+    dst = str(tmp_path / 'dst')
+    for data in (b'plain text', b'\x7fELF', b'\x7fELF\x02\x01' + b'\0' * 20):
+        with open(src, 'wb') as f:
+            f.write(data)
+        assert strip_file(src, dst) is None
+        assert not os.path.exists(dst)
+
+
+def test_strip_rebuild_after_hardlink_build(program, tmp_path):
+    host = str(tmp_path / 'host')
+    rootfs = str(tmp_path / 'rootfs')
+    os.mkdir(host)
+    shutil.copy2(program, host + '/hello')
+    with open(host + '/conf', 'w') as f:
+        f.write('config')
+    size = os.path.getsize(host + '/hello')
+
+    copier = Copier(mode='hardlink', manifest=Manifest(rootfs))
+    copier.copy(host, rootfs + host)
+    assert copier.close() == []
+    copier.manifest.save()
+
+    # the variant changes, so everything is copied again
+    copier = Copier(strip=True, manifest=Manifest(rootfs, variant='strip'))
+    copier.copy(host, rootfs + host)
+    assert copier.close() == []
+    assert copier.stripped == 1
+    assert os.path.getsize(host + '/hello') == size
+    with open(host + '/conf') as f:
+        assert f.read() == 'config'
+    assert run(host + '/hello') == 'hello\n'
+    assert run(rootfs + host + '/hello') == 'hello\n'
+    assert os.path.getsize(rootfs + host + '/hello') == size - copier.saved
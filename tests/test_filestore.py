@@ -0,0 +1,122 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+
+from filestore import FileStore, file_hash
+from fscopy import Copier
+from manifest import Manifest
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def build(host, rootfs, store=None, mode='copy'):
+    copier = Copier(mode=mode, store=store, manifest=Manifest(rootfs))
+    copier.copy(host, rootfs + host)
+    errors = copier.close()
+    copier.manifest.save()
+    return errors
+
+
+def check_objects(store):
+    for obj in store.objects():
+        digest = os.path.basename(obj).split('-')[0]
+        assert file_hash(obj) == digest
+
+
+def test_rebuild_without_store_keeps_objects(tmp_path):
+    host = str(tmp_path / 'host')
+    r1 = str(tmp_path / 'r1')
+    r2 = str(tmp_path / 'r2')
+    os.mkdir(host)
+    write(host + '/lib', 'old')
+    store = FileStore(str(tmp_path / 'store'))
+    assert build(host, r1, store) == []
+    assert build(host, r2, store) == []
+    assert store.stats()['entries'] == 2
+
+    with open(host + '/lib', 'a') as f:
+        f.write(' and new')
+    for mode in ('copy', 'auto'):
+        assert build(host, r1, mode=mode) == []
+        assert read(r1 + host + '/lib') == read(host + '/lib')
+        with open(host + '/lib', 'a') as f:
+            f.write('!')
+    assert read(r2 + host + '/lib') == 'old'
+    check_objects(store)
+
+
+def test_reflink_store_replaces_entries(tmp_path):
+    src = str(tmp_path / 'src')
+    dst = str(tmp_path / 'dst')
+    write(src, 'data')
+    store = FileStore(str(tmp_path / 'store'), reflink=True)
+    obj = store.link(src, dst)
+    os.unlink(dst)
+    os.link(obj, dst)
+    write(src + '.new', 'other')
+    os.rename(src + '.new', src)
+    store.link(src, dst)
+    assert read(dst) == 'other'
+    assert read(obj) == 'data'
+    check_objects(store)
+
+
+def test_broken_object_is_replaced(tmp_path):
+    src = str(tmp_path / 'src')
+    write(src, 'data')
+    store = FileStore(str(tmp_path / 'store'))
+    obj = store.add(src)
+    # written through by an older build
+    write(obj, 'garbage')
+    assert FileStore(store.root).add(src) == obj
+    assert read(obj) == 'data'
+    assert [os.path.basename(o) for o in store.objects()] == \
+        [os.path.basename(obj)]
+
+
+def test_stats_and_gc(tmp_path):
+    src = str(tmp_path / 'src')
+    write(src, 'data')
+    store = FileStore(str(tmp_path / 'store'))
+    store.link(src, str(tmp_path / 'a'))
+    store.link(src, str(tmp_path / 'b'))
+    s = store.stats()
+    assert (s['objects'], s['entries'], s['bytes']) == (1, 2, 4)
+    assert s['saved_bytes'] == 4
+    assert store.gc() == 0
+    os.unlink(str(tmp_path / 'a'))
+    os.unlink(str(tmp_path / 'b'))
+    assert store.gc() == 1
+    assert list(store.objects()) == []
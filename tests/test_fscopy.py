@@ -0,0 +1,248 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+
+from fscopy import (
+    Copier, copy_file, covered, expand_braces, excluded, select,
+    split_list, unique, walk
+)
+from manifest import Manifest
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def build(host, rootfs, mode):
+    copier = Copier(mode=mode, manifest=Manifest(rootfs))
+    copier.copy(host, rootfs + host)
+    errors = copier.close()
+    copier.manifest.save()
+    return errors
+
+
+def test_copy_file_replaces_hardlinked_dst(tmp_path):
+    src = str(tmp_path / 'src')
+    shared = str(tmp_path / 'shared')
+    dst = str(tmp_path / 'dst')
+    write(src, 'new')
+    write(shared, 'old')
+    os.link(shared, dst)
+    for mode in ('copy', 'copy_file_range', 'auto'):
+        copy_file(src, dst, mode)
+        assert read(dst) == 'new'
+        assert read(shared) == 'old'
+        assert not os.path.samefile(dst, shared)
+        os.unlink(dst)
+        os.link(shared, dst)
+    assert sorted(os.listdir(str(tmp_path))) == ['dst', 'shared', 'src']
+
+
+def test_copy_file_leaves_no_temporary_file(tmp_path):
+    dst = str(tmp_path / 'dst')
+    try:
+        copy_file(str(tmp_path / 'missing'), dst)
+    except FileNotFoundError:
+        pass
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_rebuild_in_copy_mode_after_hardlink_build(tmp_path):
+    host = str(tmp_path / 'host')
+    rootfs = str(tmp_path / 'rootfs')
+    os.mkdir(host)
+    write(host + '/a', 'first')
+    write(host + '/b', 'kept')
+    assert build(host, rootfs, 'hardlink') == []
+    assert os.path.samefile(host + '/a', rootfs + host + '/a')
+
+    write(host + '/a.new', 'second')
+    os.rename(host + '/a.new', host + '/a')
+    with open(host + '/b', 'a') as f:
+        f.write(' and changed')
+    assert build(host, rootfs, 'copy') == []
+    assert read(host + '/a') == 'second'
+    assert read(host + '/b') == 'kept and changed'
+    assert read(rootfs + host + '/a') == 'second'
+    assert read(rootfs + host + '/b') == 'kept and changed'
+    assert not os.path.samefile(host + '/b', rootfs + host + '/b')
+
+
+def test_covered():
+    dirs = set(['/etc', '/usr/share/fonts'])
+    assert covered('/etc/passwd', dirs)
+    assert covered('/usr/share/fonts/a/b.ttf', dirs)
+    assert not covered('/etc', dirs)
+    assert not covered('/usr/share/font', dirs)
+    assert not covered('/etcetera/x', dirs)
+
+
+def test_unique(tmp_path):
+    d = str(tmp_path / 'conf')
+    os.mkdir(d)
+    write(d + '/a', '')
+    write(str(tmp_path / 'lib'), '')
+    files = [d + '/a', str(tmp_path / 'lib')]
+    configs = [d, d + '/', d + '/a', str(tmp_path / 'lib'), '']
+    files, configs, redundant = unique(files, configs)
+    assert files == []
+    assert configs == [d, str(tmp_path / 'lib')]
+    # d/ and d/a as configs, d/a and lib as files
+    assert redundant == 4
+
+
+def test_split_list():
+    assert split_list('/etc/a,,/etc/{b,c}.conf,/x') == \
+        ['/etc/a', '/etc/{b,c}.conf', '/x']
+    assert split_list('') == []
+
+
+def test_expand_braces():
+    assert expand_braces('/etc/{a,b}/{x,y}') == \
+        ['/etc/a/x', '/etc/a/y', '/etc/b/x', '/etc/b/y']
+    assert expand_braces('/etc/passwd') == ['/etc/passwd']
+
+
+def test_select(tmp_path):
+    root = str(tmp_path)
+    for name in ('a.conf', 'b.conf', 'c.txt'):
+        write(root + '/' + name, '')
+    paths, exclude = select([
+        root + '/*.conf', root + '/{c.txt,missing}', root + '/none*',
+        '!' + root + '/b.*',
+    ])
+    assert paths == [
+        root + '/a.conf', root + '/c.txt', root + '/missing',
+        root + '/none*',
+    ]
+    assert exclude == [root + '/b.*']
+    assert excluded(root + '/b.conf', exclude)
+    assert not excluded(root + '/a.conf', exclude)
+
+
+def test_walk(tmp_path):
+    top = str(tmp_path / 'top')
+    outside = str(tmp_path / 'outside')
+    os.makedirs(top + '/d')
+    os.mkdir(outside)
+    write(top + '/d/f', '')
+    write(top + '/skip.log', '')
+    write(outside + '/o', '')
+    os.symlink('d/f', top + '/inside')
+    os.symlink(outside, top + '/out')
+    os.symlink('nowhere', top + '/dangling')
+    items = list(walk(top, [top + '/*.log']))
+    assert items == [
+        (top, 'dir', None),
+        (top + '/d', 'dir', None),
+        (top + '/d/f', 'file', None),
+        (top + '/dangling', 'link', 'nowhere'),
+        (top + '/inside', 'link', 'd/f'),
+        # links out of the tree are followed
+        (top + '/out', 'dir', None),
+        (top + '/out/o', 'file', None),
+    ]
+
+
+def test_copy_excludes_and_keeps_links(tmp_path):
+    top = str(tmp_path / 'top')
+    rootfs = str(tmp_path / 'rootfs')
+    os.makedirs(top + '/d')
+    write(top + '/d/f', 'data')
+    write(top + '/d/skip.log', '')
+    os.symlink('d/f', top + '/link')
+    copier = Copier(jobs=2, exclude=[top + '/*.log'])
+    copier.copy(top, rootfs + top)
+    assert copier.close() == []
+    assert os.listdir(rootfs + top + '/d') == ['f']
+    assert os.readlink(rootfs + top + '/link') == 'd/f'
+    assert read(rootfs + top + '/link') == 'data'
+
+
+def tree(top):
+    result = {}
+    for path, kind, target in walk(top):
+        st = os.lstat(path)
+        data = read(path) if kind == 'file' else target
+        result[path[len(top):]] = (kind, oct(st.st_mode), data)
+    return result
+
+
+def test_jobs_copy_like_one_job(tmp_path):
+    top = str(tmp_path / 'top')
+    for i in range(20):
+        os.makedirs('%s/d%d/sub' % (top, i))
+        for j in range(5):
+            write('%s/d%d/sub/f%d' % (top, i, j), 'x' * i * j)
+        os.chmod('%s/d%d/sub/f0' % (top, i), 0o600)
+        os.chmod('%s/d%d' % (top, i), 0o555)
+    expected = tree(top)
+    for jobs in (1, 4):
+        rootfs = str(tmp_path / ('rootfs%d' % jobs))
+        copier = Copier(jobs=jobs)
+        copier.copy(top, rootfs + top)
+        copier.copyfiles([
+            (top + '/d1/sub/f1', rootfs + '/batch/a'),
+            (top + '/nosuch', rootfs + '/batch/b'),
+        ])
+        errors = copier.close()
+        assert [e[1] for e in errors] == [rootfs + '/batch/b']
+        assert tree(rootfs + top) == expected
+        assert read(rootfs + '/batch/a') == 'x'
+
+
+def test_walk_link_cycle(tmp_path):
+    top = str(tmp_path / 'top')
+    os.makedirs(top + '/a')
+    os.mkdir(str(tmp_path / 'b'))
+    write(top + '/a/f', '')
+    write(str(tmp_path / 'b' / 'g'), '')
+    os.symlink('../../b', top + '/a/tob')
+    os.symlink('../top/a', str(tmp_path / 'b' / 'toa'))
+    errors = []
+    items = list(walk(top + '/a', onerror=lambda p, e: errors.append(p)))
+    assert items == [
+        (top + '/a', 'dir', None),
+        (top + '/a/f', 'file', None),
+        (top + '/a/tob', 'dir', None),
+        (top + '/a/tob/g', 'file', None),
+        # back into a walked directory, kept as link
+        (top + '/a/tob/toa', 'link', '../top/a'),
+    ]
+    assert errors == []
+    rootfs = str(tmp_path / 'rootfs')
+    copier = Copier(jobs=2)
+    copier.copy(top, rootfs)
+    assert copier.close() == []
+    assert os.readlink(rootfs + '/a/tob/toa') == '../top/a'
+    assert sorted(os.listdir(rootfs + '/a/tob')) == ['g', 'toa']
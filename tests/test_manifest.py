@@ -0,0 +1,151 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+
+from fscopy import Copier
+from manifest import Manifest, manifest_path
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def build(host, rootfs, variant=None):
+    manifest = Manifest(rootfs, variant=variant)
+    copier = Copier(manifest=manifest)
+    copier.copy(host, rootfs + host)
+    assert copier.close() == []
+    stale = manifest.remove_stale()
+    manifest.save()
+    return manifest.unchanged, stale
+
+
+def test_manifest_path():
+    assert manifest_path('/var/lib/lxc/c/rootfs/') == \
+        '/var/lib/lxc/c/rootfs.manifest'
+
+
+def test_current(tmp_path):
+    src = str(tmp_path / 'src')
+    rootfs = str(tmp_path / 'rootfs')
+    dst = rootfs + '/src'
+    write(src, 'data')
+    os.mkdir(rootfs)
+    write(dst, 'data')
+    m = Manifest(rootfs)
+    assert not m.current(src, dst, os.stat(src))
+    m.add(src, dst)
+    m.save()
+
+    m = Manifest(rootfs)
+    assert m.current(src, dst, os.stat(src))
+    # touched, same content
+    os.utime(src, (0, 0))
+    assert m.current(src, dst, os.stat(src))
+    # same size, other content
+    write(src, 'DATA')
+    assert not m.current(src, dst, os.stat(src))
+    m.add(src, dst)
+    assert m.current(src, dst, os.stat(src))
+    os.chmod(src, 0o600)
+    assert not m.current(src, dst, os.stat(src))
+    m.add(src, dst)
+    # copy modified in rootfs
+    with open(dst, 'a') as f:
+        f.write('more')
+    assert not m.current(src, dst, os.stat(src))
+    write(dst, 'DATA')
+    m.add(src, dst)
+    os.unlink(dst)
+    assert not m.current(src, dst, os.stat(src))
+    m.discard(dst)
+    assert m.files == {}
+
+
+def test_variant_change_copies_everything(tmp_path):
+    src = str(tmp_path / 'src')
+    rootfs = str(tmp_path / 'rootfs')
+    write(src, 'data')
+    os.mkdir(rootfs)
+    write(rootfs + '/src', 'data')
+    m = Manifest(rootfs)
+    m.add(src, rootfs + '/src')
+    m.save()
+    assert Manifest(rootfs).current(src, rootfs + '/src', os.stat(src))
+    m = Manifest(rootfs, variant='strip')
+    assert m.changed
+    assert not m.current(src, rootfs + '/src', os.stat(src))
+
+
+def test_incremental_rebuild(tmp_path):
+    host = str(tmp_path / 'host')
+    rootfs = str(tmp_path / 'rootfs')
+    os.mkdir(host)
+    for name in ('a', 'b', 'c'):
+        write(host + '/' + name, name)
+    assert build(host, rootfs) == (0, [])
+    assert build(host, rootfs) == (3, [])
+
+    write(host + '/a', 'changed')
+    os.unlink(host + '/c')
+    unchanged, stale = build(host, rootfs)
+    assert (unchanged, stale) == (1, [host + '/c'])
+    assert not os.path.exists(rootfs + host + '/c')
+    with open(rootfs + host + '/a') as f:
+        assert f.read() == 'changed'
+
+
+def test_rebuild_replaces_corrupted_copies(tmp_path):
+    host = str(tmp_path / 'host')
+    rootfs = str(tmp_path / 'rootfs')
+    os.mkdir(host)
+    for name in ('a', 'b', 'c'):
+        write(host + '/' + name, name * 10)
+    build(host, rootfs)
+    with open(rootfs + host + '/a', 'a') as f:
+        f.write('appended')
+    os.truncate(rootfs + host + '/b', 1)
+    assert build(host, rootfs) == (1, [])
+    for name in ('a', 'b', 'c'):
+        with open(rootfs + host + '/' + name) as f:
+            assert f.read() == name * 10
+    assert build(host, rootfs) == (3, [])
+
+
+def test_stripped_copy_digest(tmp_path):
+    src = str(tmp_path / 'src')
+    rootfs = str(tmp_path / 'rootfs')
+    write(src, 'data with debug info')
+    os.mkdir(rootfs)
+    write(rootfs + '/src', 'data')
+    m = Manifest(rootfs, variant='strip')
+    m.add(src, rootfs + '/src')
+    e = m.files['/src']
+    assert (e['dst_size'], e['size']) == (4, 20)
+    assert e['dst_sha256'] != e['sha256']
+    assert m.current(src, rootfs + '/src', os.stat(src))
@@ -0,0 +1,157 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+import os
+import tarfile
+
+import pytest
+
+import rootfs_archive
+from rootfs_archive import ArchiveWriter
+
+
+def cpio_entries(data):
+    """parse newc stream into (name, mode, rdevmajor, body) tuples."""
+    entries = []
+    pos = 0
+    while True:
+        fields = [int(data[pos + 6 + i * 8:pos + 14 + i * 8], 16)
+                  for i in range(13)]
+        size, namesize = fields[6], fields[11]
+        pos += 110
+        name = data[pos:pos + namesize - 1].decode()
+        pos += namesize + (-(110 + namesize) % 4)
+        if name == 'TRAILER!!!':
+            return entries
+        entries.append((name, fields[1], fields[9], data[pos:pos + size]))
+        pos += size + (-size % 4)
+
+
+@pytest.fixture
+def host(tmp_path):
+    host = tmp_path / 'host'
+    (host / 'etc').mkdir(parents=True)
+    (host / 'etc' / 'hosts').write_text('127.0.0.1 localhost\n')
+    (host / 'etc' / 'skip.log').write_text('skip')
+    os.symlink('hosts', str(host / 'etc' / 'link'))
+    return str(host)
+
+
+@pytest.mark.parametrize('compress', ['none', 'gz', 'bz2', 'xz'])
+def test_tar(host, compress):
+    out = io.BytesIO()
+    writer = ArchiveWriter(out, compress=compress, uid=1000, gid=1000,
+                           exclude=['*.log'])
+    writer.add(host + '/etc', '/etc')
+    writer.add_node('/dev/null', 0o20666, 1, 3)
+    writer.add_data('/etc/hostname', 'box\n')
+    assert writer.close() == []
+    mode = 'r:' if compress == 'none' else 'r:' + compress
+    out.seek(0)
+    with tarfile.open(fileobj=out, mode=mode) as tar:
+        members = dict((m.name, m) for m in tar.getmembers())
+        assert sorted(members) == [
+            'dev', 'dev/null', 'etc', 'etc/hostname', 'etc/hosts', 'etc/link'
+        ]
+        assert tar.extractfile('etc/hosts').read() == b'127.0.0.1 localhost\n'
+        assert tar.extractfile('etc/hostname').read() == b'box\n'
+    assert members['etc/link'].issym()
+    assert members['etc/link'].linkname == 'hosts'
+    assert members['dev/null'].ischr()
+    null = members['dev/null']
+    assert (null.devmajor, null.devminor) == (1, 3)
+    assert all(m.uid == 1000 and m.gid == 1000 for m in members.values())
+    assert writer.files == 2
+
+
+def test_cpio(host):
+    out = io.BytesIO()
+    writer = ArchiveWriter(out, format='cpio', exclude=['*.log'])
+    writer.add(host + '/etc', '/etc')
+    writer.add_node('/dev/null', 0o20666, 1, 3)
+    assert writer.close() == []
+    entries = dict((e[0], e[1:]) for e in cpio_entries(out.getvalue()))
+    assert sorted(entries) == ['dev', 'dev/null', 'etc', 'etc/hosts',
+                               'etc/link']
+    assert entries['etc/hosts'][2] == b'127.0.0.1 localhost\n'
+    assert entries['etc/link'][2] == b'hosts'
+    assert entries['dev/null'][:2] == (0o20666, 1)
+
+
+def test_missing(host):
+    writer = ArchiveWriter(io.BytesIO())
+    writer.add(host + '/nosuch', '/nosuch')
+    with pytest.raises(IOError):
+        writer.add_file(host + '/nosuch', '/nosuch')
+    assert writer.close() == []
+    assert writer.files == 0
+
+
+@pytest.mark.parametrize('format', ['tar', 'cpio'])
+def test_file_shrinking_while_archived(host, monkeypatch, format):
+    big = host + '/etc/big'
+    size = 3 * 1024 * 1024
+    with open(big, 'wb') as f:
+        f.write(b'b' * size)
+    real_open = open
+
+    def shrinking_open(path, *args):
+        f = real_open(path, *args)
+        if path == big:
+            real_read = f.read
+
+            def read(n=-1):
+                data = real_read(n)
+                os.truncate(path, 10)
+                return data
+            f.read = read
+        return f
+
+    monkeypatch.setattr(rootfs_archive, 'open', shrinking_open,
+                        raising=False)
+    out = io.BytesIO()
+    writer = ArchiveWriter(out, format=format)
+    writer.add_file(host + '/etc/hosts', '/etc/hosts')
+    writer.add(big, '/etc/big')
+    writer.add_file(host + '/etc/hosts', '/etc/hosts2')
+    errors = writer.close()
+    assert [e[1] for e in errors] == ['/etc/big']
+    assert 'shrank' in str(errors[0][2])
+    if format == 'tar':
+        out.seek(0)
+        with tarfile.open(fileobj=out, mode='r:') as tar:
+            data = tar.extractfile('etc/big').read()
+            assert tar.extractfile('etc/hosts2').read() == \
+                b'127.0.0.1 localhost\n'
+    else:
+        entries = dict((e[0], e[3]) for e in cpio_entries(out.getvalue()))
+        data = entries['etc/big']
+        assert entries['etc/hosts2'] == b'127.0.0.1 localhost\n'
+    # padded to the size in the header
+    assert len(data) == size
+    assert data.startswith(b'b')
+    assert data.endswith(b'\0' * 1024)
@@ -0,0 +1,83 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import shutil
+
+import pytest
+
+import rootfs_trace
+from elfdeps import Resolver
+from rootfs_trace import minimal, trace
+
+
+@pytest.mark.parametrize('seccomp', [True, False])
+def test_trace(tmp_path, seccomp):
+    out = str(tmp_path / 'out')
+    accessed, executed, status = trace(
+        ['sh', '-c', 'cat /etc/hostname > %s; cat %s' % (out, out)],
+        seccomp=seccomp
+    )
+    assert status == 0
+    assert '/etc/hostname' in accessed
+    # written by the program, not host data
+    assert out not in accessed
+    real = set(os.path.realpath(p) for p in executed)
+    assert os.path.realpath(shutil.which('cat')) in real
+    assert os.path.realpath(shutil.which('sh')) in real
+
+
+def test_trace_status():
+    assert trace(['sh', '-c', 'exit 3'])[2] == 3
+    assert trace(['sh', '-c', 'kill -TERM $$'])[2] == -15
+    assert trace(['/nonexistent'])[2] == 127
+
+
+def test_minimal(tmp_path, monkeypatch):
+    home = str(tmp_path / 'home')
+    os.makedirs(home + '/user/.ssh')
+    for path in (home + '/user/.ssh/id_rsa', str(tmp_path / 'app.conf')):
+        with open(path, 'w') as f:
+            f.write('')
+    script = str(tmp_path / 'script')
+    with open(script, 'w') as f:
+        f.write('#!/bin/sh\ncat /etc/hostname\n')
+    monkeypatch.setattr(rootfs_trace, 'virtual_dirs', ('/proc',))
+    monkeypatch.setattr(rootfs_trace, 'private_dirs', (home,))
+    cat = shutil.which('cat')
+    resolver = Resolver()
+    libs = [p for p in resolver.closure([cat])[0] if p != cat]
+    assert libs
+    binaries, configs = minimal(
+        set([
+            '/etc/hostname', '/etc', '/nonexistent', '/proc/self/status',
+            home + '/user/.ssh/id_rsa', str(tmp_path / 'app.conf'),
+            script, cat,
+        ] + libs),
+        set([script, cat]), resolver
+    )
+    assert binaries == sorted([cat, '/bin/sh', script])
+    assert configs == sorted(['/etc/hostname', str(tmp_path / 'app.conf')])
@@ -0,0 +1,80 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+
+from fscopy import Copier
+from manifest import Manifest
+from rootfs_verify import Verifier, drifted
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def build(host, rootfs):
+    manifest = Manifest(rootfs)
+    copier = Copier(manifest=manifest)
+    copier.copy(host, rootfs + host)
+    assert copier.close() == []
+    manifest.save()
+
+
+def test_rootfs_tampering_is_drift(tmp_path):
+    host = str(tmp_path / 'host')
+    rootfs = str(tmp_path / 'rootfs')
+    os.mkdir(host)
+    for name in ('a', 'b', 'c', 'd'):
+        write(host + '/' + name, name * 10)
+    build(host, rootfs)
+    assert not drifted(Verifier().verify(rootfs))
+    with open(rootfs + host + '/a', 'a') as f:
+        f.write('appended')
+    # same size, other content
+    write(rootfs + host + '/b', 'B' * 10)
+    # touched only
+    os.utime(rootfs + host + '/c', (0, 0))
+    result = Verifier(jobs=2).verify(rootfs)
+    assert result['changed'] == [host + '/a', host + '/b']
+    assert result['checked'] == 4
+    # source changed too, reported once
+    write(host + '/b', 'b' * 20)
+    assert Verifier().verify(rootfs)['changed'] == [host + '/a', host + '/b']
+
+
+def test_stripped_copy(tmp_path):
+    src = str(tmp_path / 'src')
+    rootfs = str(tmp_path / 'rootfs')
+    write(src, 'data with debug info')
+    os.mkdir(rootfs)
+    write(rootfs + '/bin', 'data')
+    manifest = Manifest(rootfs, variant='strip')
+    manifest.add(src, rootfs + '/bin')
+    manifest.save()
+    assert not drifted(Verifier().verify(rootfs))
+    write(rootfs + '/bin', 'DATA')
+    assert Verifier().verify(rootfs)['changed'] == ['/bin']
@@ -0,0 +1,94 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import stat
+
+import pytest
+
+import skeleton
+
+
+def entries():
+    return skeleton.spec(
+        structure=['/etc', '/usr', '/usr/lib'],
+        links=[('/lib', 'usr/lib')],
+        files=[('/etc/fstab', 'none\n', 0o644)]
+    )
+
+
+def test_apply_creates_and_reapplies(tmp_path):
+    rootfs = str(tmp_path / 'rootfs')
+    assert skeleton.apply(rootfs, entries()) == 6
+    assert os.readlink(rootfs + '/lib') == 'usr/lib'
+    with open(rootfs + '/etc/fstab') as f:
+        assert f.read() == 'none\n'
+    assert stat.S_IMODE(os.stat(rootfs + '/etc/fstab').st_mode) == 0o644
+    # only the file is written again
+    assert skeleton.apply(rootfs, entries()) == 1
+    assert sorted(os.listdir(rootfs + '/etc')) == ['fstab']
+
+
+def test_file_replaces_hardlink(tmp_path):
+    rootfs = str(tmp_path / 'rootfs')
+    host = str(tmp_path / 'fstab')
+    with open(host, 'w') as f:
+        f.write('host\n')
+    os.makedirs(rootfs + '/etc')
+    os.link(host, rootfs + '/etc/fstab')
+    skeleton.apply(rootfs, entries())
+    with open(host) as f:
+        assert f.read() == 'host\n'
+    with open(rootfs + '/etc/fstab') as f:
+        assert f.read() == 'none\n'
+
+
+def test_link_replaces_file(tmp_path):
+    rootfs = str(tmp_path / 'rootfs')
+    os.mkdir(rootfs)
+    with open(rootfs + '/lib', 'w') as f:
+        f.write('in the way')
+    skeleton.apply(rootfs, entries())
+    assert os.readlink(rootfs + '/lib') == 'usr/lib'
+
+
+def test_link_conflicts_with_directory(tmp_path):
+    rootfs = str(tmp_path / 'rootfs')
+    os.makedirs(rootfs + '/lib')
+    with pytest.raises(OSError) as e:
+        skeleton.apply(rootfs, entries())
+    assert 'directory /lib is in the way' in str(e.value)
+
+
+def test_symlink_can_not_redirect_to_host(tmp_path):
+    rootfs = str(tmp_path / 'rootfs')
+    host = str(tmp_path / 'host')
+    os.makedirs(rootfs)
+    os.mkdir(host)
+    os.symlink(host, rootfs + '/etc')
+    with pytest.raises(OSError):
+        skeleton.apply(rootfs, entries())
+    assert os.listdir(host) == []
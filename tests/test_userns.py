@@ -0,0 +1,146 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+import userns
+from bench_userns import percentile, startup_latency
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# allowed start to exec time of userns_child_exec.py over that of a bare
+# interpreter, in milliseconds; it was about 20 before the launcher
+# became a module and is about 5 now, 10 is a sensible budget.
+# Timing is noisy on loaded machines, so it is checked only when set
+BUDGET = os.environ.get('USERNS_STARTUP_BUDGET_MS')
+
+
+def imported(code):
+    """modules a fresh interpreter imports for code."""
+    out = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys\n'
+        'before = set(sys.modules)\n'
+        '%s\n'
+        'print(" ".join(sorted(set(sys.modules) - before)))' % code
+    ], cwd=HERE)
+    return set(out.decode().split())
+
+
+def test_import_does_no_work():
+    modules = imported('import userns')
+    for name in ('argparse', 'logging', 'ctypes', 'shutil', 'signal', 're'):
+        assert name not in modules
+
+
+def test_wrapper_import_does_no_work():
+    modules = imported('import userns_child_exec')
+    assert 'argparse' not in modules
+    assert 'logging' not in modules
+
+
+def test_spawn(maps):
+    pid = userns.spawn(['true'], ('user', 'pid'), maps[0], maps[1])
+    assert os.waitpid(pid, 0)[1] == 0
+    with pytest.raises(ValueError):
+        userns.spawn(['true'], ('user', 'bogus'))
+
+
+
+@pytest.mark.parametrize('backend', ['clone3', 'fork', 'clone'])
+def test_backends(maps, backend):
+    r, w = os.pipe()
+    try:
+        pid = userns.spawn(
+            ['sh', '-c', 'id -u; echo $$; readlink /proc/self/ns/user'],
+            ('user', 'pid'), maps[0], maps[1], backend=backend,
+            stdio=(0, w)
+        )
+    except OSError as e:
+        pytest.skip("%s backend: %s" % (backend, e))
+    finally:
+        os.close(w)
+    with os.fdopen(r) as f:
+        uid, child, ns = f.read().split()
+    assert os.waitpid(pid, 0)[1] == 0
+    assert (uid, child) == ('0', '1')
+    assert ns != os.readlink('/proc/self/ns/user')
+
+
+def test_parse_args():
+    args = userns.parse_args(['-Uzp', '-B', 'fork', '--', 'ls', '-l'])
+    assert (args.newuser, args.map_zero, args.newpid) == (True, True, True)
+    assert args.backend == 'fork'
+    assert args.argv == ['ls', '-l']
+    args = userns.parse_args(['-M', '0 1000 1', '--cgroup=t', 'sh'])
+    assert args.uid_map == '0 1000 1'
+    assert args.cgroup == 't'
+    assert args.argv == ['sh']
+
+
+def test_main(maps, capsys):
+    assert userns.main(['-U', '-z', '--', 'true']) == 0
+    # maps need a user namespace
+    assert userns.main(['-z', 'true']) == 1
+    assert 'usage:' in capsys.readouterr().out
+
+
+def bare_latency():
+    """seconds from interpreter start until it execs echo."""
+    r, w = os.pipe()
+    start = time.perf_counter()
+    p = subprocess.Popen([
+        sys.executable, '-c',
+        'import os; os.execvp("echo", ["echo", "x"])'
+    ], stdout=w)
+    os.close(w)
+    os.read(r, 1)
+    latency = time.perf_counter() - start
+    os.close(r)
+    p.wait()
+    return latency
+
+
+@pytest.mark.skipif(
+    BUDGET is None, reason="set USERNS_STARTUP_BUDGET_MS to time startup"
+)
+def test_startup_budget(maps):
+    budget = float(BUDGET)
+    for i in range(3):
+        bare_latency()
+        startup_latency(['-U', '-z'])
+    bare = [bare_latency() for i in range(20)]
+    launcher = [startup_latency(['-U', '-z']) for i in range(20)]
+    overhead = (percentile(launcher, 50) - percentile(bare, 50)) * 1e3
+    assert overhead < budget, \
+        "start to exec takes %.1fms over bare python, budget %.1fms" % (
+            overhead, budget
+        )
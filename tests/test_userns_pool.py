@@ -0,0 +1,138 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import signal
+import select
+
+import pytest
+
+import userns
+from userns_pool import NamespacePool, NamespaceSet
+
+FLAGS = userns.CLONE_NEWUSER | userns.CLONE_NEWPID
+
+
+def run(pool, argv):
+    """spawn argv, return (exit code, output)."""
+    r, w = os.pipe()
+    try:
+        pid = pool.spawn(argv, (None, w))
+    finally:
+        os.close(w)
+    with os.fdopen(r) as f:
+        output = f.read()
+    return os.waitstatus_to_exitcode(pool.wait(pid)), output
+
+
+def script(argv):
+    return ['sh', '-c', argv]
+
+
+@pytest.fixture
+def pool(maps):
+    pools = []
+
+    def make(size):
+        pools.append(NamespacePool(size, FLAGS, maps[0], maps[1]))
+        return pools[-1]
+    yield make
+    for p in pools:
+        p.close()
+
+
+def test_warm_spawn(pool):
+    p = pool(2)
+    p.fill(10.0)
+    assert run(p, script('id -u; echo $$; exit 3')) == (3, '0\n2\n')
+    assert (p.warm, p.cold) == (1, 0)
+
+
+def test_cold_fallback(pool):
+    p = pool(0)
+    # launched directly, the command is PID 1
+    assert run(p, script('id -u; echo $$')) == (0, '0\n1\n')
+    assert (p.warm, p.cold) == (0, 1)
+
+
+def test_refill_after_spawns(pool):
+    p = pool(2)
+    for i in range(3):
+        p.fill(10.0)
+        assert run(p, ['true'])[0] == 0
+        assert run(p, ['true'])[0] == 0
+    assert (p.warm, p.cold) == (6, 0)
+
+
+def test_dead_holder_is_skipped(pool):
+    p = pool(1)
+    p.fill(10.0)
+    ns = p._ready[0]
+    os.kill(ns.pid, signal.SIGKILL)
+    # pid may be the relay of the holder, which dies right after it
+    poll = select.poll()
+    poll.register(ns._sock, select.POLLHUP)
+    assert poll.poll(10000)
+    assert run(p, ['true'])[0] == 0
+    assert (p.warm, p.cold) == (0, 1)
+
+
+def test_signal_reaches_command(pool):
+    p = pool(1)
+    p.fill(10.0)
+    r, w = os.pipe()
+    try:
+        pid = p.spawn(script(
+            'trap "exit 7" TERM; echo ready; while :; do sleep 0.05; done'
+        ), (None, w))
+    finally:
+        os.close(w)
+    with os.fdopen(r) as f:
+        assert f.readline() == 'ready\n'
+        os.kill(pid, signal.SIGTERM)
+        assert os.waitstatus_to_exitcode(p.wait(pid)) == 7
+        # the whole PID namespace is gone with it
+        assert f.read() == ''
+    assert p.warm == 1
+
+
+def test_close_reaps_holders(maps):
+    p = NamespacePool(3, FLAGS, maps[0], maps[1])
+    p.fill(10.0)
+    holders = [ns.pid for ns in p._ready]
+    assert len(holders) == 3
+    p.close()
+    for pid in holders:
+        with pytest.raises(ChildProcessError):
+            os.waitpid(pid, os.WNOHANG)
+    assert not p._thread.is_alive()
+
+
+def test_unused_set_exits(maps):
+    ns = NamespaceSet(FLAGS, maps[0], maps[1])
+    ns.close()
+    with pytest.raises(ChildProcessError):
+        os.waitpid(ns.pid, os.WNOHANG)
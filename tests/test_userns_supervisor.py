@@ -0,0 +1,82 @@
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import time
+import asyncio
+
+import pytest
+
+import userns
+from userns_supervisor import Supervisor
+
+
+def collect(lines):
+    def output(child, name, line):
+        lines.append((name, line))
+    return output
+
+
+@pytest.mark.parametrize('pool_size', [0, 1])
+@pytest.mark.parametrize('flags', [
+    userns.CLONE_NEWUSER,
+    userns.CLONE_NEWUSER | userns.CLONE_NEWPID,
+])
+@pytest.mark.parametrize('backend', ['fork', 'auto'])
+def test_timeout_kills_command(maps, tmp_path, backend, flags, pool_size):
+    marker = str(tmp_path / 'marker')
+    sv = Supervisor(flags, maps[0], maps[1], backend, pool_size)
+    if sv.pool is not None:
+        sv.pool.fill(10.0)
+    try:
+        child = asyncio.run(sv.run(
+            ['sh', '-c', 'sleep 0.5; touch %s' % marker], timeout=0.1
+        ))
+    finally:
+        sv.close()
+    assert child.timed_out
+    assert child.returncode == -9
+    time.sleep(0.8)
+    assert not os.path.exists(marker)
+
+
+def test_run_all(maps):
+    lines = []
+    sv = Supervisor(userns.CLONE_NEWUSER | userns.CLONE_NEWPID,
+                    maps[0], maps[1], jobs=2, output=collect(lines))
+    try:
+        children = asyncio.run(sv.run_all([
+            ['sh', '-c', 'echo $$'],
+            ['sh', '-c', 'echo err >&2; exit 3'],
+            ['id', '-u'],
+        ]))
+    finally:
+        sv.close()
+    assert [c.returncode for c in children] == [0, 3, 0]
+    assert not any(c.timed_out for c in children)
+    assert sorted(lines) == [
+        ('stderr', b'err\n'), ('stdout', b'0\n'), ('stdout', b'1\n')
+    ]
@@ -0,0 +1,720 @@
+# coding=utf-8
+"""
+Licensed under GNU General Public License v2 or later
+
+Start commands in new namespace(s), allow UID and GID mappings
+  to be specified when creating a user namespace.
+This is the library behind userns_child_exec.py, see there
+  for an example session and links.
+
+Translated to Python: Filipp Kucheryavy aka Frizzy
+"""
+
+# NOTE: start a shell in new user and PID namespaces, as root inside:
+"""import os, userns
+pid = userns.spawn(['bash'], ('user', 'pid'), '0 1000 1', '0 1000 1')
+os.waitpid(pid, 0)"""
+
+
+import os
+import sys
+import errno
+import _thread
+# signal without the enums of the signal module, which cost
+# more to import than the rest of this module
+import _signal as signal
+
+# Importing does nothing else: ctypes and libc are loaded by the
+# first launch, logging is set up and arguments are parsed by main().
+
+ctypes = None
+"""ctypes module, imported by _load()"""
+
+libc = None
+"""Import libc.so.6 as libc, see _load()"""
+
+libc_gil = None
+"""libc called without releasing the GIL, as os.fork() does"""
+
+clone_args = None
+"""struct clone_args, see _load()"""
+
+_launch_lock = _thread.allocate_lock()
+"""children wait for the maps pipe to be closed by all its holders,
+so no other launch may fork until ours has closed it"""
+
+STACK_SIZE = 1024 * 1024
+"""#define STACK_SIZE (1024 * 1024)"""
+
+flags = 0
+"""
+The low byte of flags contains the number of the termination signal
+  sent to the parent when the child dies.  If this signal is specified
+  as anything other than SIGCHLD, then the parent process must specify
+  the __WALL or __WCLONE options when waiting for the child with
+  wait(2).  If no signal is specified, then the parent process is not
+  signaled when the child terminates.
+
+flags may also be bitwise-or'ed with zero or more of the
+  constants, in order to specify what is shared between the calling
+  process and the child process
+
+"""
+
+CLONE_NEWIPC = 0x08000000
+"""New ipc namespace constant"""
+CLONE_NEWNS = 0x00020000
+"""New mount namespace group constant"""
+CLONE_NEWNET = 0x40000000
+"""New network namespace constant"""
+CLONE_NEWPID = 0x20000000
+"""New pid namespace constant"""
+CLONE_NEWUTS = 0x04000000
+"""New utsname namespace constant"""
+CLONE_NEWUSER = 0x10000000
+"""New user namespace constant"""
+CLONE_INTO_CGROUP = 0x200000000
+"""clone3 only: start the child in the cgroup given by descriptor"""
+
+SYS_clone3 = 435
+"""clone3 syscall number, the same on all architectures"""
+
+PR_SET_PDEATHSIG = 1
+"""prctl option: signal sent to us when our parent dies"""
+
+FORWARDED = (signal.SIGHUP, signal.SIGINT, signal.SIGQUIT,
+             signal.SIGTERM, signal.SIGUSR1, signal.SIGUSR2)
+"""signals the relay of the fork backend passes on to the command"""
+
+BACKENDS = ('auto', 'clone3', 'fork', 'clone')
+"""
+Ways to start the child:
+  clone3 - raw clone3 syscall, forks straight into the new namespaces
+  fork   - fork, then unshare in the child; with a new PID namespace
+           the child forks once more, so the command gets PID 1,
+           and stays as a relay which forwards FORWARDED signals
+           to it and takes it down when killed
+  clone  - glibc clone with a Python callback on a 1 MiB stack,
+           the original implementation, kept for comparison
+  auto   - clone3, or fork where clone3 is not available
+           or other threads are running
+"""
+
+
+NAMESPACES = {
+    'ipc': CLONE_NEWIPC,
+    'mnt': CLONE_NEWNS,
+    'net': CLONE_NEWNET,
+    'pid': CLONE_NEWPID,
+    'uts': CLONE_NEWUTS,
+    'user': CLONE_NEWUSER,
+}
+"""flags of namespaces by their names in /proc/PID/ns, for spawn()"""
+
+
+def _load():
+    """import ctypes and load libc on first use."""
+    global ctypes, libc, libc_gil, clone_args
+    if libc_gil is not None:
+        return
+    import ctypes as c
+
+    class args(c.Structure):
+        """struct clone_args from linux/sched.h (CLONE_ARGS_SIZE_VER2),
+        older kernels accept it while the new fields are zero"""
+        _fields_ = [("flags", c.c_uint64),
+                    ("pidfd", c.c_uint64),
+                    ("child_tid", c.c_uint64),
+                    ("parent_tid", c.c_uint64),
+                    ("exit_signal", c.c_uint64),
+                    ("stack", c.c_uint64),
+                    ("stack_size", c.c_uint64),
+                    ("tls", c.c_uint64),
+                    ("set_tid", c.c_uint64),
+                    ("set_tid_size", c.c_uint64),
+                    ("cgroup", c.c_uint64)]
+
+    gil = c.PyDLL("libc.so.6", use_errno=True)
+    gil.syscall.restype = c.c_long
+    gil.syscall.argtypes = [c.c_long, c.c_void_p, c.c_size_t]
+    gil.execve.argtypes = [c.c_char_p, c.c_void_p, c.c_void_p]
+    c.pythonapi.PyOS_BeforeFork.restype = None
+    c.pythonapi.PyOS_AfterFork_Parent.restype = None
+    c.pythonapi.PyOS_AfterFork_Child.restype = None
+    ctypes, clone_args = c, args
+    libc = c.CDLL("libc.so.6", use_errno=True)
+    libc_gil = gil
+
+
+def which(name):
+    """path of executable name like shutil.which(),
+    without importing shutil."""
+    if '/' in name:
+        return name
+    for d in os.environ.get('PATH', os.defpath).split(os.pathsep):
+        path = os.path.join(d or '.', name)
+        if os.access(path, os.X_OK) and not os.path.isdir(path):
+            return path
+    return None
+
+
+def update_map(mapping, map_file):
+    """
+
+    Update the mapping file 'map_file', with the value provided in
+    'mapping', a string that defines a UID or GID mapping. A UID or
+    GID mapping consists of one or more newline-delimited records
+    of the form:
+
+        ID_inside-ns    ID-outside-ns   length
+
+    Requiring the user to supply a string that contains newlines is
+    of course inconvenient for command-line use. Thus, we permit the
+    use of commas to delimit records in this string, and replace them
+    with newlines before writing the string to the file.
+
+    """
+    #Replace commas in mapping string with newlines
+    mapping = mapping.replace(',', '\n')
+
+    try:
+        with open(map_file, 'w') as f:
+            f.write(mapping)
+    except IOError as e:
+        import logging
+        logging.error("Can not write %s", map_file)
+        logging.error(e)
+
+
+def unshare(flags):
+    """os.unshare() for Pythons which do not have it."""
+    if hasattr(os, 'unshare'):
+        return os.unshare(flags)
+    _load()
+    if libc.unshare(flags) == -1:
+        e = ctypes.get_errno()
+        raise OSError(e, os.strerror(e))
+
+
+def clone3(flags, after_fork=True, cgroup_fd=None):
+    """fork into new namespaces with raw clone3 syscall.
+
+    Works like os.fork(): no stack is needed, the child
+      continues on a copy of ours, and the interpreter
+      is prepared and fixed up by the same hooks.
+    With after_fork False the child is not fixed up, which
+      saves most of the time of a launch; such child may only
+      call libc_gil and exec or _exit, see raw_exec().
+    Unlike os.fork() the child runs some bytecode before it could
+      be fixed up, so it must not be used while we have other
+      threads: one of them may have asked for the GIL, and the
+      child would wait for it to be taken forever.
+    With cgroup_fd the child starts in that cgroup.
+    Return 0 in the child and pid of the child in the parent.
+
+    """
+    _load()
+    cl_args = clone_args(flags=flags, exit_signal=signal.SIGCHLD)
+    if cgroup_fd is not None:
+        cl_args.flags |= CLONE_INTO_CGROUP
+        cl_args.cgroup = cgroup_fd
+    ctypes.pythonapi.PyOS_BeforeFork()
+    pid = libc_gil.syscall(
+        SYS_clone3, ctypes.byref(cl_args), ctypes.sizeof(cl_args)
+    )
+    if pid == 0:
+        if after_fork:
+            ctypes.pythonapi.PyOS_AfterFork_Child()
+        return 0
+    e = ctypes.get_errno()
+    ctypes.pythonapi.PyOS_AfterFork_Parent()
+    if pid == -1:
+        raise OSError(e, os.strerror(e))
+    return pid
+
+
+def child_exec(argv, pipe_fd, stdio=None):
+    """Start function for child, never returns.
+
+    Wait until the parent has updated the UID and GID mappings.
+    See the comment in launch(). We wait for end of file on a
+      pipe that will be closed by the parent process once it has
+      updated the mappings.
+
+    """
+    # Close our descriptor for the write
+    # end of the pipe so that we see EOF
+    # when parent closes its descriptor
+    try:
+        if pipe_fd is not None:
+            os.close(pipe_fd[1])
+            if os.read(pipe_fd[0], 1):
+                import logging
+                logging.error("Failure in child: parent doesn't close its descriptor")
+                os._exit(1)
+            os.close(pipe_fd[0])
+
+        for i, fd in enumerate(stdio or ()):
+            if fd is not None and fd != i:
+                os.dup2(fd, i)
+
+        # Execute a shell command
+        os.execvp(argv[0], argv)
+    except BaseException as e:
+        import logging
+        logging.error("Can not exec %s: %s", argv[0], e)
+    os._exit(127)
+
+
+def raw_exec(argv, pipe_fd, stdio=None):
+    """prepare child_exec() for a child which was not fixed up.
+
+    Everything that may allocate or look around is done here,
+      in the parent: the executable is found in PATH and argv
+      and environment are converted to C arrays. The returned
+      function only calls libc through libc_gil, so the child
+      never releases the GIL and never touches locks which
+      other threads of the parent could have held, just like
+      the child of subprocess.
+
+    """
+    _load()
+    path = os.fsencode(which(argv[0]) or argv[0])
+    c_argv = (ctypes.c_char_p * (len(argv) + 1))(
+        *[os.fsencode(a) for a in argv]
+    )
+    environ = ctypes.c_void_p.in_dll(libc, 'environ')
+    buf = ctypes.create_string_buffer(1)
+
+    def child():
+        if pipe_fd is not None:
+            libc_gil.close(pipe_fd[1])
+            if libc_gil.read(pipe_fd[0], buf, 1) != 0:
+                libc_gil._exit(1)
+            libc_gil.close(pipe_fd[0])
+        for i, fd in enumerate(stdio or ()):
+            if fd is not None and fd != i:
+                libc_gil.dup2(fd, i)
+        libc_gil.execve(path, c_argv, environ)
+        libc_gil._exit(127)
+
+    return child
+
+
+def fork_child(argv, flags, pipe_fd, stdio=None, cgroup=None):
+    """fork, unshare and exec; return pid of the child.
+
+    The parent may write maps only after the child has
+      unshared its user namespace, so the child tells it
+      by closing the ready pipe.
+    The child moves itself into cgroup before anything else.
+    With CLONE_NEWPID the returned pid is of a relay, see
+      BACKENDS; the ready pipe is closed only once the command
+      is set up to die with it, so killing the pid at any
+      time kills the command.
+
+    """
+    ready = os.pipe()
+    pid = os.fork()
+    if pid:
+        os.close(ready[1])
+        os.read(ready[0], 1)
+        os.close(ready[0])
+        return pid
+    try:
+        os.close(ready[0])
+        if cgroup is not None:
+            cgroup.add()
+        unshare(flags)
+        if not flags & CLONE_NEWPID:
+            os.close(ready[1])
+            child_exec(argv, pipe_fd, stdio)
+        # unshare moves only our children into the new PID namespace
+        _load()
+        child = os.fork()
+        if child == 0:
+            if libc.prctl(PR_SET_PDEATHSIG, signal.SIGKILL) == -1:
+                os._exit(1)
+            os.close(ready[1])
+            child_exec(argv, pipe_fd, stdio)
+
+        def forward(sig, frame):
+            try:
+                os.kill(child, sig)
+            except OSError:
+                pass
+
+        for sig in FORWARDED:
+            signal.signal(sig, forward)
+        # we never exec, so drop every descriptor of the parent,
+        # pipes and sockets must see end of file without us
+        os.closerange(3, os.sysconf('SC_OPEN_MAX'))
+        status = os.waitpid(child, 0)[1]
+        code = os.waitstatus_to_exitcode(status)
+        os._exit(code if code >= 0 else 128 - code)
+    except BaseException as e:
+        import logging
+        logging.error("Failure in child: %s", e)
+    os._exit(1)
+
+
+def clone_child(argv, flags, pipe_fd, stdio=None, cgroup=None):
+    """start child with glibc clone(), return its pid.
+
+    The child runs a Python callback on a fresh 1 MiB stack
+      without the interpreter knowing it was forked.
+
+    """
+    def child_func():
+        if cgroup is not None:
+            try:
+                cgroup.add()
+            except BaseException as e:
+                import logging
+                logging.error("Can not enter cgroup: %s", e)
+                os._exit(127)
+        child_exec(argv, pipe_fd, stdio)
+        return 0
+
+    _load()
+    child_func = ctypes.CFUNCTYPE(ctypes.c_int)(child_func)
+    child_stack = ctypes.create_string_buffer(STACK_SIZE)
+    child_stack_pointer = ctypes.c_void_p(
+        ctypes.addressof(child_stack) + STACK_SIZE
+    )
+    pid = libc.clone(child_func, child_stack_pointer, flags | signal.SIGCHLD)
+    if pid == -1:
+        e = ctypes.get_errno()
+        raise OSError(e, os.strerror(e))
+    return pid
+
+
+def launch(argv, flags, uid_map=None, gid_map=None, backend='auto',
+           verbose=False, stdio=None, cgroup=None):
+    """start argv in new namespace(s), return pid of the child.
+
+    uid_map and gid_map are map strings like -M and -G,
+      they are written before the child executes argv.
+    backend is one of BACKENDS.
+    stdio is a sequence of up to three descriptors which
+      become stdin, stdout and stderr of the child,
+      None keeps ours.
+    cgroup is a cgroup2.Cgroup, the child is in it before exec.
+    With CLONE_NEWPID the command is PID 1 of its namespace,
+      which gets only the signals it handles and SIGKILL
+      from outside.
+
+    """
+    with _launch_lock:
+        return _launch(argv, flags, uid_map, gid_map, backend, verbose,
+                       stdio, cgroup)
+
+
+def _launch(argv, flags, uid_map, gid_map, backend, verbose, stdio, cgroup):
+    # We use a pipe to synchronize the parent and child, in order to
+    # ensure that the parent sets the UID and GID maps before the child
+    # calls execve(). This ensures that the child maintains its
+    # capabilities during the execve() in the common case where we
+    # want to map the child's effective user ID to 0 in the new user
+    # namespace. Without this synchronization, the child would lose
+    # its capabilities if it performed an execve() with nonzero
+    # user IDs (see the capabilities(7) man page for details of the
+    # transformation of a process's capabilities during execve()).
+    # Without maps there is nothing to wait for.
+    pipe_fd = os.pipe() if uid_map or gid_map else None
+    cgroup_fd = None
+    try:
+        if backend in ('auto', 'clone3'):
+            child = raw_exec(argv, pipe_fd, stdio)
+            if cgroup is not None:
+                cgroup_fd = cgroup.open()
+            try:
+                # without threading imported there are no other threads
+                threading = sys.modules.get('threading')
+                if threading is not None and threading.active_count() > 1:
+                    # see clone3()
+                    raise OSError(errno.EPERM, "other threads are running")
+                pid = clone3(flags, after_fork=False, cgroup_fd=cgroup_fd)
+                if pid == 0:
+                    child()
+            except OSError as e:
+                # old kernel, or clone3 filtered by seccomp;
+                # E2BIG: kernel before 5.7 without CLONE_INTO_CGROUP
+                if backend != 'auto' or e.errno not in (
+                        errno.ENOSYS, errno.EPERM, errno.E2BIG):
+                    raise
+                backend = 'fork'
+        if backend == 'fork':
+            pid = fork_child(argv, flags, pipe_fd, stdio, cgroup)
+        elif backend == 'clone':
+            pid = clone_child(argv, flags, pipe_fd, stdio, cgroup)
+
+        # Update the UID and GID maps in the child
+        if uid_map:
+            update_map(uid_map, "/proc/%s/uid_map" % pid)
+        if gid_map:
+            update_map(gid_map, "/proc/%s/gid_map" % pid)
+        if verbose:
+            import logging
+            logging.info("About to exec %s\n", argv[0])
+    finally:
+        # Close the write end of the pipe, to signal to the child that we
+        # have updated the UID and GID maps
+        if pipe_fd is not None:
+            os.close(pipe_fd[0])
+            os.close(pipe_fd[1])
+        if cgroup_fd is not None:
+            os.close(cgroup_fd)
+    return pid
+
+
+def spawn(argv, namespaces=('user',), uid_map=None, gid_map=None,
+          **options):
+    """start argv in new namespaces, return pid of the child.
+
+    namespaces are names from /proc/PID/ns, see NAMESPACES;
+      other options are those of launch().
+
+    """
+    flags = 0
+    for name in namespaces:
+        if name not in NAMESPACES:
+            raise ValueError("unknown namespace %s" % name)
+        flags |= NAMESPACES[name]
+    return launch(argv, flags, uid_map, gid_map, **options)
+
+
+def setup_logging():
+    import logging
+    logging.basicConfig(
+        format=u'%(asctime)s  %(name)s\t%(levelname)-8s\t%(message)s',
+        datefmt='%d %b %Y %H:%M:%S',
+        stream=sys.stdout, # will be replacing by filename
+        level=logging.INFO,
+    )
+    return logging
+
+
+# command line options: option, dest, metavar or None for switches, help
+cli_options = [
+    ('-i', 'newipc', None, 'New IPC namespace'),
+    ('-m', 'newns', None, 'New mount namespace'),
+    ('-n', 'newnet', None, 'New network namespace'),
+    ('-p', 'newpid', None, 'New PID namespace'),
+    ('-u', 'newuts', None, 'New UTS namespace'),
+    ('-U', 'newuser', None, 'New user namespace'),
+    ('-M', 'uid_map', 'MAP', 'Specify UID map for user namespace'),
+    ('-G', 'gid_map', 'MAP', 'Specify GID map for user namespace'),
+    ('-z', 'map_zero', None,
+     'Map user\'s UID and GID to 0 in user namespace '
+     '(equivalent to: -M \'0 <uid> 1\' -G \'0 <gid> 1\')'),
+    ('-B', 'backend', 'BACKEND',
+     'How to create the child: %s (default: auto)' % ", ".join(BACKENDS)),
+    ('-v', 'verbose', None, 'Display verbose messages'),
+    ('--cgroup', 'cgroup', 'NAME',
+     'Run the child in new cgroup v2 of this name '
+     'and report its usage on exit'),
+    ('--cgroup-parent', 'cgroup_parent', 'PATH',
+     'Parent of the new cgroup below cgroup2 mount, our own by default'),
+    ('--cpu-max', 'cpu_max', 'MAX',
+     'cpu.max of the new cgroup, like "50000 100000"'),
+    ('--memory-max', 'memory_max', 'MAX',
+     'memory.max of the new cgroup, like 512M'),
+    ('--io-max', 'io_max', 'MAX',
+     'io.max of the new cgroup, like "8:0 wbps=1048576"'),
+]
+
+
+def build_parser():
+    """argparse parser of cli_options, for help and usage only."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="""
+Create a child process that executes a shell
+command in a new user namespace,
+and possibly also other new namespace(s).""",
+        epilog="""
+If -z, -M, or -G is specified, -U is required.
+It is not permitted to specify both -z and either -M or -G.
+
+Map strings for -M and -G consist of records of the form:
+
+    ID-inside-ns   ID-outside-ns   len
+
+A map string can contain multiple records, separated
+ by commas;
+the commas are replaced by newlines before writing
+ to map files.
+""",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    aa = parser.add_argument
+    aa('argv', type=str, nargs='*', default=[],
+       help='Command with options for executing')
+    for option, dest, metavar, help in cli_options:
+        if metavar is None:
+            aa(option, action='store_true', dest=dest, help=help)
+        else:
+            aa(option, type=str, dest=dest, metavar=metavar, help=help)
+    return parser
+
+
+class Arguments(object):
+    """parsed command line, like argparse.Namespace."""
+
+    def __init__(self):
+        for option, dest, metavar, help in cli_options:
+            setattr(self, dest, None if metavar else False)
+        self.backend = 'auto'
+        self.argv = []
+
+
+def parse_args(argv):
+    """parse command line by cli_options.
+
+    argparse alone takes longer to import than a launch,
+      so it is only used for --help and errors.
+    Options end at the first argument which is not one,
+      or at --; the rest is the command.
+
+    """
+    table = dict((o[0], o) for o in cli_options)
+    args = Arguments()
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == '--':
+            i += 1
+            break
+        if arg in ('-h', '--help'):
+            build_parser().print_help()
+            sys.exit(0)
+        if not arg.startswith('-') or arg == '-':
+            break
+        if arg.startswith('--'):
+            name, eq, value = arg.partition('=')
+            option = table.get(name)
+            if option is None:
+                build_parser().error("unrecognized option %s" % name)
+            if option[2] is None:
+                value = True
+            elif not eq:
+                i += 1
+                if i == len(argv):
+                    build_parser().error("%s expects a value" % name)
+                value = argv[i]
+            setattr(args, option[1], value)
+        else:
+            # cluster of short options, like -Uzp or -M'0 1000 1'
+            for j in range(1, len(arg)):
+                option = table.get('-' + arg[j])
+                if option is None:
+                    build_parser().error("unrecognized option -%s" % arg[j])
+                if option[2] is None:
+                    setattr(args, option[1], True)
+                    continue
+                value = arg[j + 1:]
+                if not value:
+                    i += 1
+                    if i == len(argv):
+                        build_parser().error("-%s expects a value" % arg[j])
+                    value = argv[i]
+                setattr(args, option[1], value)
+                break
+        i += 1
+    args.argv = argv[i:]
+    if args.backend not in BACKENDS:
+        build_parser().error("-B must be one of %s" % ", ".join(BACKENDS))
+    return args
+
+
+def main(argv=None):
+    """command line wrapper of launch()."""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    # -M or -G without -U is nonsensical
+    if (((args.uid_map or args.gid_map or args.map_zero)
+       and not args.newuser)
+       or (args.map_zero and (args.uid_map or args.gid_map))
+       or not args.argv
+       ):
+        build_parser().print_usage()
+        return 1
+
+    flags = 0
+    if args.newipc:
+        flags |= CLONE_NEWIPC
+    if args.newns:
+        flags |= CLONE_NEWNS
+    if args.newnet:
+        flags |= CLONE_NEWNET
+    if args.newpid:
+        flags |= CLONE_NEWPID
+    if args.newuts:
+        flags |= CLONE_NEWUTS
+    if args.newuser:
+        flags |= CLONE_NEWUSER
+
+    if args.map_zero:
+        args.uid_map = "0 %d 1" % os.getuid()
+        args.gid_map = "0 %d 1" % os.getgid()
+
+    # logging is not needed before the exec unless asked for
+    if args.verbose:
+        setup_logging()
+
+    cgroup = None
+    limits = {}
+    for key, value in (('cpu.max', args.cpu_max),
+                       ('memory.max', args.memory_max),
+                       ('io.max', args.io_max)):
+        if value:
+            limits[key] = value
+    if args.cgroup or args.cgroup_parent or limits:
+        from cgroup2 import Cgroup
+        try:
+            cgroup = Cgroup.create(
+                args.cgroup or 'userns_child_exec-%d' % os.getpid(),
+                args.cgroup_parent, limits=limits
+            )
+        except (IOError, OSError) as e:
+            setup_logging().error("Can not create cgroup: %s", e)
+            return 1
+
+    # Create the child in new namespace(s)
+    try:
+        child_pid = launch(
+            args.argv, flags, args.uid_map, args.gid_map,
+            args.backend, args.verbose, cgroup=cgroup
+        )
+    except OSError as e:
+        setup_logging().error("Can not execute clone: %s", e)
+        if cgroup is not None:
+            cgroup.remove()
+        return 1
+
+    # Parent falls through to here
+    logging = setup_logging()
+
+    if args.verbose:
+        logging.info("PID of child created by %s is %ld\n",
+                     args.backend, child_pid)
+
+    # Wait for child
+    pid, status = os.waitpid(child_pid, 0)
+    logging.info("Child returned: pid %s, status %s", pid, status)
+
+    if cgroup is not None:
+        from cgroup2 import format_stats
+        logging.info("Cgroup %s: %s", cgroup.path, format_stats(cgroup.stats()))
+        try:
+            cgroup.remove()
+        except OSError as e:
+            logging.error("Can not remove cgroup: %s", e)
+
+    if args.verbose:
+        logging.info("terminating")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
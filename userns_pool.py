@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# NOTE: run many short commands, one per line, each in its own
+# warm user, mount and PID namespaces:
+"""python userns_pool.py -N 8 -U -z -p -m < commands.txt"""
+
+import os
+import sys
+import json
+import shlex
+import socket
+import logging
+import argparse
+import threading
+from collections import deque
+
+import userns
+
+# init of a warm set: say we are ready, wait for one command, start it
+# inside our namespaces, reap orphans while it runs and exit with
+# its status, which kills whatever is left in the PID namespace.
+# The command is killed with us and gets the signals we can catch,
+# so our pid stands for it; PR_SET_PDEATHSIG is 1 in linux/prctl.h
+HOLDER = """
+import os, sys, json, signal, socket, ctypes
+libc = ctypes.CDLL(None, use_errno=True)
+sock = socket.socket(fileno=int(sys.argv[1]))
+sock.send(b"1")
+data, fds, flags, addr = socket.recv_fds(
+    sock, 1 << 20, 3, socket.MSG_CMSG_CLOEXEC
+)
+if not data:
+    os._exit(0)
+argv, cwd, env = json.loads(data)
+holder = os.getpid()
+pid = os.fork()
+if pid == 0:
+    try:
+        if libc.prctl(1, signal.SIGKILL) or os.getppid() != holder:
+            os._exit(1)
+        os.chdir(cwd)
+        for i, fd in enumerate(fds):
+            os.dup2(fd, i)
+        os.execvpe(argv[0], argv, env)
+    except OSError as e:
+        sys.stderr.write("can not exec %s: %s\\n" % (argv[0], e))
+    os._exit(127)
+for fd in fds:
+    os.close(fd)
+def forward(sig, frame):
+    try:
+        os.kill(pid, sig)
+    except OSError:
+        pass
+for sig in (signal.SIGHUP, signal.SIGINT, signal.SIGQUIT,
+            signal.SIGTERM, signal.SIGUSR1, signal.SIGUSR2):
+    signal.signal(sig, forward)
+while True:
+    p, status = os.wait()
+    if p == pid:
+        code = os.waitstatus_to_exitcode(status)
+        os._exit(code if code >= 0 else 128 - code)
+"""
+
+
+class NamespaceSet(object):
+    """namespaces created in advance and held by a holder process.
+
+    The holder is launched like any userns.launch() command,
+      so namespaces exist and uid and gid maps are written
+      before it is used; it is PID 1 of the PID namespace.
+    spawn() hands it one command, the holder starts it
+      and exits with its status.
+    The holder passes SIGHUP, SIGINT, SIGQUIT, SIGTERM, SIGUSR1
+      and SIGUSR2 on to the command, and the command is killed
+      when the holder dies, so signals sent to pid reach the
+      command even though the holder is PID 1 of its namespace.
+
+    """
+
+    def __init__(self, flags, uid_map=None, gid_map=None, backend='auto'):
+        self._sock, theirs = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_SEQPACKET
+        )
+        theirs.set_inheritable(True)
+        try:
+            self.pid = userns.launch(
+                [sys.executable, '-S', '-E', '-c', HOLDER,
+                 str(theirs.fileno())],
+                flags, uid_map, gid_map, backend
+            )
+        except BaseException:
+            self._sock.close()
+            raise
+        finally:
+            theirs.close()
+        # the holder has started when it says so
+        if not self._sock.recv(1):
+            self.close()
+            raise OSError("holder %d has exited" % self.pid)
+
+    def spawn(self, argv, stdio=None):
+        """start argv with our cwd, environment and stdio."""
+        fds = [0, 1, 2]
+        for i, fd in enumerate(stdio or ()):
+            if fd is not None:
+                fds[i] = fd
+        data = json.dumps([argv, os.getcwd(), dict(os.environ)])
+        socket.send_fds(self._sock, [data.encode()], fds)
+        self._sock.close()
+
+    def close(self):
+        """stop unused holder."""
+        if self._sock.fileno() != -1:
+            self._sock.close()
+            try:
+                os.waitpid(self.pid, 0)
+            except ChildProcessError:
+                pass
+
+
+class NamespacePool(object):
+    """keep `size` warm namespace sets and run commands in them.
+
+    Creating namespaces and writing uid and gid maps is the
+      slow part of a launch, so a background thread does it
+      in advance; spawn() only passes the command to a ready set.
+    Every set is used by one command. spawn() returns pid of its
+      holder, which exits with the status of the command, so it
+      can be waited for and signalled like a child, see
+      NamespaceSet. When no set is ready,
+      the command is launched in fresh namespaces like
+      userns_child_exec does.
+
+    """
+
+    def __init__(self, size=4, flags=userns.CLONE_NEWUSER, uid_map=None,
+                 gid_map=None, backend='auto'):
+        self.size = size
+        self.flags = flags
+        self.uid_map = uid_map
+        self.gid_map = gid_map
+        self.backend = backend
+        self.warm = 0
+        self.cold = 0
+        self._ready = deque()
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._refill)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _refill(self):
+        while True:
+            with self._cond:
+                while len(self._ready) >= self.size and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            try:
+                ns = NamespaceSet(
+                    self.flags, self.uid_map, self.gid_map, self.backend
+                )
+            except OSError as e:
+                logging.error("Can not create namespaces: %s", e)
+                with self._cond:
+                    self._cond.wait(1.0)
+                continue
+            with self._cond:
+                if self._closed:
+                    ns.close()
+                    return
+                self._ready.append(ns)
+                self._cond.notify_all()
+
+    def fill(self, timeout=None):
+        """wait until all sets are ready."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: len(self._ready) >= self.size or self._closed,
+                timeout
+            )
+
+    def _take(self):
+        with self._cond:
+            return self._ready.popleft() if self._ready else None
+
+    def _wake(self):
+        # refill after the spawn, not to compete with it
+        with self._cond:
+            self._cond.notify_all()
+
+    def spawn(self, argv, stdio=None):
+        """start argv in warm namespaces, return pid to wait for.
+
+        stdio is like that of userns.launch().
+
+        """
+        ns = self._take()
+        while ns is not None:
+            try:
+                ns.spawn(argv, stdio)
+            except OSError as e:
+                # the holder is gone, try the next one
+                logging.error("Can not use namespaces: %s", e)
+                ns.close()
+                ns = self._take()
+                continue
+            self.warm += 1
+            self._wake()
+            return ns.pid
+        self.cold += 1
+        self._wake()
+        return userns.launch(
+            argv, self.flags, self.uid_map, self.gid_map, self.backend,
+            stdio=stdio
+        )
+
+    def wait(self, pid):
+        """wait for spawned pid, return status like os.waitpid()."""
+        return os.waitpid(pid, 0)[1]
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        while self._ready:
+            self._ready.popleft().close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="""
+Run commands, one per line of standard input, each in its own
+set of namespaces taken from a pool of warm ones.""",
+        epilog="Options are the same as of userns_child_exec.py.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    aa = parser.add_argument
+    aa('-i', action='store_true', dest='newipc',
+       help='New IPC namespace')
+    aa('-m', action='store_true', dest='newns',
+       help='New mount namespace')
+    aa('-n', action='store_true', dest='newnet',
+       help='New network namespace')
+    aa('-p', action='store_true', dest='newpid',
+       help='New PID namespace')
+    aa('-u', action='store_true', dest='newuts',
+       help='New UTS namespace')
+    aa('-U', action='store_true', dest='newuser',
+       help='New user namespace')
+    aa('-M', type=str, dest='uid_map',
+       help='Specify UID map for user namespace')
+    aa('-G', type=str, dest='gid_map',
+       help='Specify GID map for user namespace')
+    aa('-z', action='store_true', dest='map_zero',
+       help='Map user\'s UID and GID to 0 in user namespace')
+    aa('-B', type=str, dest='backend', choices=userns.BACKENDS,
+       default='auto', help='How to create namespaces')
+    aa('-N', type=int, dest='size', default=4,
+       help='Number of warm namespace sets')
+    aa('-j', type=int, dest='jobs', default=1,
+       help='Number of commands running at once')
+    aa('-v', action='store_true', dest='verbose',
+       help='Display verbose messages')
+    args = parser.parse_args()
+    userns.setup_logging()
+
+    if (((args.uid_map or args.gid_map or args.map_zero)
+       and not args.newuser)
+       or (args.map_zero and (args.uid_map or args.gid_map))
+       ):
+        parser.print_usage()
+        sys.exit(1)
+
+    flags = 0
+    for enabled, flag in ((args.newipc, userns.CLONE_NEWIPC),
+                          (args.newns, userns.CLONE_NEWNS),
+                          (args.newnet, userns.CLONE_NEWNET),
+                          (args.newpid, userns.CLONE_NEWPID),
+                          (args.newuts, userns.CLONE_NEWUTS),
+                          (args.newuser, userns.CLONE_NEWUSER)):
+        if enabled:
+            flags |= flag
+
+    if args.map_zero:
+        args.uid_map = "0 %d 1" % os.getuid()
+        args.gid_map = "0 %d 1" % os.getgid()
+
+    pool = NamespacePool(
+        args.size, flags, args.uid_map, args.gid_map, args.backend
+    )
+    pool.fill(10.0)
+    running = {}
+    failed = 0
+    try:
+        for line in sys.stdin:
+            argv = shlex.split(line)
+            if not argv:
+                continue
+            while len(running) >= args.jobs:
+                pid, status = os.wait()
+                if running.pop(pid, None) is not None:
+                    failed += status != 0
+            try:
+                pid = pool.spawn(argv)
+            except OSError as e:
+                logging.error("Can not run %s: %s", argv[0], e)
+                failed += 1
+                continue
+            running[pid] = argv
+            if args.verbose:
+                logging.info("PID of %s is %d", argv[0], pid)
+        for pid in list(running):
+            failed += pool.wait(pid) != 0
+    finally:
+        pool.close()
+    if args.verbose:
+        logging.info("%d warm and %d cold launches, %d failed",
+                     pool.warm, pool.cold, failed)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# NOTE: run commands of a file, 100 at once, each in its own user and
+# PID namespaces, kill those running longer than a minute:
+"""python userns_supervisor.py -U -z -p -j 100 -t 60 < commands.txt
+
+import asyncio
+import userns
+from userns_supervisor import Supervisor
+sv = Supervisor(userns.CLONE_NEWUSER | userns.CLONE_NEWPID,
+                "0 1000 1", "0 1000 1")
+child = asyncio.run(sv.run(['make', 'check'], timeout=600))
+sv.close()
+print(child.returncode, child.timed_out)"""
+
+import os
+import sys
+import shlex
+import signal
+import asyncio
+import logging
+import argparse
+
+import userns
+from userns_pool import NamespacePool
+
+
+class Child(object):
+    """one command run by Supervisor."""
+
+    def __init__(self, argv):
+        self.argv = argv
+        self.pid = None
+        self.returncode = None
+        self.timed_out = False
+
+
+def write_output(child, name, line):
+    """default output callback: lines go to our stdout or stderr,
+    prefixed by pid of the child."""
+    stream = sys.stdout if name == 'stdout' else sys.stderr
+    stream.buffer.write(b"%d: %s" % (child.pid, line))
+    stream.flush()
+
+
+class Supervisor(object):
+    """run many commands in new namespaces from one asyncio loop.
+
+    Every child is reaped through its pidfd, which is readable
+      once it exits, or by the SIGCHLD handler where pidfds
+      are not supported; there is no thread per child.
+    stdout and stderr of children are read line by line
+      and given to the output callback.
+    At most `jobs` children run at once. With pool_size
+      the namespaces are taken from a NamespacePool.
+
+    """
+
+    def __init__(self, flags=userns.CLONE_NEWUSER, uid_map=None,
+                 gid_map=None, backend='auto', pool_size=0, jobs=64,
+                 output=write_output):
+        self.flags = flags
+        self.uid_map = uid_map
+        self.gid_map = gid_map
+        self.backend = backend
+        self.jobs = jobs
+        self.output = output
+        self.pool = None
+        if pool_size:
+            self.pool = NamespacePool(
+                pool_size, flags, uid_map, gid_map, backend
+            )
+        self._slots = None
+        self._waiters = {}
+
+    def _spawn(self, argv, stdio):
+        if self.pool is not None:
+            return self.pool.spawn(argv, stdio)
+        return userns.launch(
+            argv, self.flags, self.uid_map, self.gid_map, self.backend,
+            stdio=stdio
+        )
+
+    def _exited(self, pid):
+        """future of the exit code of child pid."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            fd = os.pidfd_open(pid)
+        except (AttributeError, OSError):
+            self._waiters[pid] = future
+            loop.add_signal_handler(signal.SIGCHLD, self._reap)
+            # it could exit before the handler was set
+            self._reap()
+            return future
+
+        def ready():
+            loop.remove_reader(fd)
+            os.close(fd)
+            status = os.waitpid(pid, 0)[1]
+            future.set_result(os.waitstatus_to_exitcode(status))
+
+        loop.add_reader(fd, ready)
+        return future
+
+    def _reap(self):
+        for pid in list(self._waiters):
+            p, status = os.waitpid(pid, os.WNOHANG)
+            if p == 0:
+                continue
+            future = self._waiters.pop(pid)
+            future.set_result(os.waitstatus_to_exitcode(status))
+
+    async def _read(self, child, name, fd):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader),
+            os.fdopen(fd, 'rb', 0)
+        )
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.output(child, name, line)
+        finally:
+            transport.close()
+
+    async def run(self, argv, timeout=None):
+        """run argv, return its Child once it has exited.
+
+        A child still running after timeout seconds
+          is killed and marked as timed out; its pid may be
+          of a relay or pool holder, which takes the command
+          down with it.
+
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.jobs)
+        async with self._slots:
+            child = Child(argv)
+            out_r, out_w = os.pipe()
+            err_r, err_w = os.pipe()
+            try:
+                child.pid = self._spawn(argv, (None, out_w, err_w))
+            except BaseException:
+                for fd in (out_r, err_r):
+                    os.close(fd)
+                raise
+            finally:
+                os.close(out_w)
+                os.close(err_w)
+            readers = [
+                asyncio.ensure_future(self._read(child, 'stdout', out_r)),
+                asyncio.ensure_future(self._read(child, 'stderr', err_r)),
+            ]
+            exited = self._exited(child.pid)
+            try:
+                child.returncode = await asyncio.wait_for(
+                    asyncio.shield(exited), timeout
+                )
+            except asyncio.TimeoutError:
+                child.timed_out = True
+                os.kill(child.pid, signal.SIGKILL)
+                child.returncode = await exited
+            # children of the child may keep the pipes open
+            done, pending = await asyncio.wait(readers, timeout=1.0)
+            for task in pending:
+                task.cancel()
+            return child
+
+    async def run_all(self, commands, timeout=None):
+        """run argv lists of commands, return their Children in order."""
+        return await asyncio.gather(*[
+            self.run(argv, timeout) for argv in commands
+        ])
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="""
+Run commands, one per line of standard input, concurrently,
+each in its own set of namespaces.""",
+        epilog="Namespace options are the same as of userns_child_exec.py.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    aa = parser.add_argument
+    aa('-i', action='store_true', dest='newipc',
+       help='New IPC namespace')
+    aa('-m', action='store_true', dest='newns',
+       help='New mount namespace')
+    aa('-n', action='store_true', dest='newnet',
+       help='New network namespace')
+    aa('-p', action='store_true', dest='newpid',
+       help='New PID namespace')
+    aa('-u', action='store_true', dest='newuts',
+       help='New UTS namespace')
+    aa('-U', action='store_true', dest='newuser',
+       help='New user namespace')
+    aa('-M', type=str, dest='uid_map',
+       help='Specify UID map for user namespace')
+    aa('-G', type=str, dest='gid_map',
+       help='Specify GID map for user namespace')
+    aa('-z', action='store_true', dest='map_zero',
+       help='Map user\'s UID and GID to 0 in user namespace')
+    aa('-B', type=str, dest='backend', choices=userns.BACKENDS,
+       default='auto', help='How to create namespaces')
+    aa('-N', type=int, dest='size', default=0,
+       help='Number of warm namespace sets, 0 for no pool')
+    aa('-j', type=int, dest='jobs', default=64,
+       help='Number of commands running at once')
+    aa('-t', type=float, dest='timeout', default=None,
+       help='Kill commands running longer, in seconds')
+    aa('-v', action='store_true', dest='verbose',
+       help='Display verbose messages')
+    args = parser.parse_args()
+    userns.setup_logging()
+
+    if (((args.uid_map or args.gid_map or args.map_zero)
+       and not args.newuser)
+       or (args.map_zero and (args.uid_map or args.gid_map))
+       ):
+        parser.print_usage()
+        sys.exit(1)
+
+    flags = 0
+    for enabled, flag in ((args.newipc, userns.CLONE_NEWIPC),
+                          (args.newns, userns.CLONE_NEWNS),
+                          (args.newnet, userns.CLONE_NEWNET),
+                          (args.newpid, userns.CLONE_NEWPID),
+                          (args.newuts, userns.CLONE_NEWUTS),
+                          (args.newuser, userns.CLONE_NEWUSER)):
+        if enabled:
+            flags |= flag
+
+    if args.map_zero:
+        args.uid_map = "0 %d 1" % os.getuid()
+        args.gid_map = "0 %d 1" % os.getgid()
+
+    commands = [argv for argv in map(shlex.split, sys.stdin) if argv]
+    supervisor = Supervisor(
+        flags, args.uid_map, args.gid_map, args.backend,
+        args.size, args.jobs
+    )
+    if supervisor.pool is not None:
+        supervisor.pool.fill(10.0)
+    try:
+        children = asyncio.run(supervisor.run_all(commands, args.timeout))
+    finally:
+        supervisor.close()
+    failed = 0
+    for child in children:
+        if child.timed_out:
+            logging.error("%s timed out", " ".join(child.argv))
+        elif child.returncode:
+            logging.error("%s exited with %d",
+                          " ".join(child.argv), child.returncode)
+        failed += child.timed_out or child.returncode != 0
+    if args.verbose:
+        logging.info("%d commands, %d failed", len(children), failed)
+    if failed:
+        sys.exit(1)